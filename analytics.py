@@ -0,0 +1,202 @@
+"""Totals, histograms, and averages over the whole tasklog, with NumPy.
+
+Analytics copies the entries' dates, minutes, and task names into arrays
+once, and then answers each question with whole-array operations instead
+of a loop over Entry objects: minutes-range filters, totals for each day,
+week, month, year, or task, a histogram of how long tasks take, and a
+rolling average of the minutes worked each day.
+
+NumPy is optional. Without it, the same columns are kept in the standard
+library's compact arrays, and the same answers are worked out in plain
+Python, which is slower but gives identical results.
+"""
+
+
+from array import array
+from bisect import bisect_right
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    # Without NumPy, everything below falls back to plain Python
+    numpy = None
+
+
+from report import period_keys, total_rows
+
+
+# Upper bounds (exclusive) of the duration histogram's bins, in minutes.
+# The last bin holds everything from the last bound up.
+DURATION_EDGES = (15, 30, 60, 120, 240, 480)
+ROLLING_DAYS = 7
+
+DATE_PERIODS = ("day", "week", "month", "year")
+
+
+class Analytics:
+    """Column arrays of a list of entries, for fast aggregates.
+
+    The columns are a snapshot: build a new Analytics after the entries
+    change (EntryStore.analytics() does this).
+
+    :param entries: a list of Entry objects.
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        codes = {}
+        days = (item.date_ordinal for item in entries)
+        minutes = (item.mins_spent for item in entries)
+        tasks = (codes.setdefault(item.task_name, len(codes))
+                 for item in entries)
+        if numpy is not None:
+            count = len(entries)
+            self.days = numpy.fromiter(days, numpy.int64, count)
+            self.minutes = numpy.fromiter(minutes, numpy.int64, count)
+            self.tasks = numpy.fromiter(tasks, numpy.int64, count)
+        else:
+            self.days = array("q", days)
+            self.minutes = array("q", minutes)
+            self.tasks = array("q", tasks)
+        # The task names, in the order of their codes in self.tasks
+        self.task_names = list(codes)
+
+    def minutes_between(self, low, high):
+        """Returns the entries which took between low and high minutes,
+        inclusive, in their original order."""
+        if numpy is not None:
+            rows = numpy.flatnonzero((self.minutes >= low)
+                                     & (self.minutes <= high)).tolist()
+        else:
+            rows = [row for row, mins in enumerate(self.minutes)
+                    if low <= mins <= high]
+        return [self.entries[row] for row in rows]
+
+    def day_totals(self):
+        """Returns (ordinal, entries, minutes) for each day with entries,
+        in order. Entries without a valid date are under ordinal 0."""
+        if numpy is not None:
+            days, inverse = numpy.unique(self.days, return_inverse=True)
+            counts = numpy.bincount(inverse, minlength=len(days))
+            minutes = numpy.bincount(inverse, weights=self.minutes,
+                                     minlength=len(days))
+            return list(zip(days.tolist(), counts.tolist(),
+                            numpy.rint(minutes).astype(numpy.int64).tolist()))
+        totals = {}
+        for day, mins in zip(self.days, self.minutes):
+            group = totals.get(day)
+            if group is None:
+                totals[day] = [1, mins]
+            else:
+                group[0] += 1
+                group[1] += mins
+        return [(day, count, mins)
+                for day, (count, mins) in sorted(totals.items())]
+
+    def task_totals(self):
+        """Returns {task name: (entries, minutes)}."""
+        if numpy is not None:
+            size = len(self.task_names)
+            counts = numpy.bincount(self.tasks, minlength=size).tolist()
+            minutes = numpy.rint(numpy.bincount(
+                self.tasks, weights=self.minutes, minlength=size)).astype(
+                    numpy.int64).tolist()
+        else:
+            counts = [0] * len(self.task_names)
+            minutes = [0] * len(self.task_names)
+            for code, mins in zip(self.tasks, self.minutes):
+                counts[code] += 1
+                minutes[code] += mins
+        return {name: (counts[code], minutes[code])
+                for code, name in enumerate(self.task_names)}
+
+    def period_rows(self, period):
+        """Returns the totals for a period ("day", "week", "month", "year",
+        or "task") as rows, in the same form as Summary.rows().
+
+        Only the day totals come from the arrays. Weeks, months, and years
+        are then added up from those, which is one step per day rather
+        than one per entry.
+        """
+        if period == "task":
+            return total_rows(period, self.task_totals())
+        position = DATE_PERIODS.index(period)
+        groups = {}
+        for day, count, mins in self.day_totals():
+            key = period_keys(day)[position]
+            total = groups.get(key, (0, 0))
+            groups[key] = (total[0] + count, total[1] + mins)
+        return total_rows(period, groups)
+
+    def duration_histogram(self, edges=DURATION_EDGES):
+        """Counts the entries in each range of minutes spent.
+
+        :param edges: the ascending upper bounds of each range but the
+                last, which has no upper bound.
+
+        :return: a list of dicts with the keys "minutes" (like "30-59") and
+                "entries".
+        """
+        if numpy is not None:
+            bins = numpy.searchsorted(numpy.asarray(edges), self.minutes,
+                                      side="right")
+            counts = numpy.bincount(bins, minlength=len(edges) + 1).tolist()
+        else:
+            counts = [0] * (len(edges) + 1)
+            for mins in self.minutes:
+                counts[bisect_right(edges, mins)] += 1
+        labels = ["under {}".format(edges[0])]
+        labels.extend("{}-{}".format(low, high - 1)
+                      for low, high in zip(edges, edges[1:]))
+        labels.append("{}+".format(edges[-1]))
+        return [{"minutes": label, "entries": count}
+                for label, count in zip(labels, counts)]
+
+    def rolling_average(self, window=ROLLING_DAYS):
+        """Averages the minutes worked per day over a trailing window.
+
+        Every day from the first dated entry to the last is included, with
+        days off counting as 0 minutes. The first few days average over as
+        many days as there are so far.
+
+        :param window: how many days to average over.
+
+        :return: a list of dicts with the keys "date" (MM/DD/YYYY),
+                "minutes" (worked that day), and "average".
+        """
+        if numpy is not None:
+            dated = self.days > 0
+            if not dated.any():
+                return []
+            first = int(self.days[dated].min())
+            daily = numpy.rint(numpy.bincount(
+                self.days[dated] - first, weights=self.minutes[dated])
+            ).astype(numpy.int64)
+            running = numpy.concatenate(([0], numpy.cumsum(daily)))
+            ends = numpy.arange(1, len(daily) + 1)
+            starts = numpy.maximum(ends - window, 0)
+            averages = (running[ends] - running[starts]) / (ends - starts)
+            daily = daily.tolist()
+            averages = averages.tolist()
+        else:
+            totals = {}
+            for day, mins in zip(self.days, self.minutes):
+                if day > 0:
+                    totals[day] = totals.get(day, 0) + mins
+            if not totals:
+                return []
+            first = min(totals)
+            daily = [totals.get(day, 0)
+                     for day in range(first, max(totals) + 1)]
+            averages = []
+            running = 0
+            for position, mins in enumerate(daily):
+                running += mins
+                if position >= window:
+                    running -= daily[position - window]
+                averages.append(running / min(position + 1, window))
+        return [{
+            "date": date.fromordinal(first + offset).strftime("%m/%d/%Y"),
+            "minutes": mins,
+            "average": round(average, 1)
+        } for offset, (mins, average) in enumerate(zip(daily, averages))]
@@ -0,0 +1,419 @@
+"""Benchmarks for the worklog.
+
+Usage:
+    python benchmark.py suite [--sizes N ...] [--output FILE] [--compare FILE]
+    python benchmark.py memory [--rows N]
+    python benchmark.py dates
+    python benchmark.py merge [--rows N] [--matches M]
+    python benchmark.py parallel [--rows N] [--workers N ...]
+
+Each benchmark builds synthetic entries shaped like the real tasklog, so
+nothing here touches "tasklog.csv". The suite times the main load, save,
+search, and backup paths at several sizes and prints the results as JSON.
+Saving one run with --output and passing it to a later run with --compare
+flags anything which got slower.
+"""
+
+
+import argparse
+from datetime import date, datetime, timedelta
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+from analytics import Analytics
+from entry import Entry
+from index import DateIndex, TextIndex
+from patterns import SEARCH_BUDGET, parallel_filter
+from snapshots import SnapshotStore
+from store import ChangeSet, read_entries, write_entries
+import worklog
+
+
+TASK_NAMES = ["Accounts Payable", "Accounts Receivable", "Worklog",
+              "Accounts Payable Assistant", "Emails", "Reconciliation",
+              "Vendor Setup", "Month End Close"]
+WORDS = ["went", "through", "emails,", "checked", "invoice", "vendor",
+         "approvers", "bill.com", "status", "past-due", "amounts", "updated",
+         "the", "and", "for", "report", "collections", "handled", "\"SOP\"",
+         "in", "Slack", "--", "(Not", "sure)", "messaged", "it."]
+SUITE_SIZES = (10000, 100000, 1000000)
+
+
+class PlainEntry:
+    """The Entry layout from before __slots__, kept for comparison."""
+    def __init__(self, en, entry_date, task_name="N/A", mins_spent=0, notes=""):
+        self.entry_ID = en
+        self.entry_date = entry_date
+        self.task_name = task_name.title()
+        self.mins_spent = mins_spent
+        self.notes = notes
+
+
+def synthetic_rows(count, seed=0, note_words=60):
+    """Generates CSV-style rows (dicts of strings) like those in tasklog.csv.
+
+    :param count: how many rows to generate.
+    :param seed: the random seed, so runs can be compared.
+    :param note_words: the longest note to generate, in words.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        minutes = rng.randint(5, 240)
+        start = datetime(2017, 1, 1, 8) + timedelta(minutes=rng.randint(0, 480))
+        finish = start + timedelta(minutes=minutes)
+        yield {
+            "entry_date": "{:02}/{:02}/{:02}".format(
+                rng.randint(1, 12), rng.randint(1, 28), rng.randint(10, 25)),
+            "task_name": rng.choice(TASK_NAMES),
+            "mins_spent": str(minutes),
+            "notes": start.strftime("(%I:%M%p - ") +
+                     finish.strftime("%I:%M%p) ") +
+                     " ".join(rng.choice(WORDS)
+                              for _ in range(rng.randint(note_words // 12,
+                                                         note_words)))
+        }
+
+
+def bytes_per_entry(build, rows):
+    """Measures the memory allocated by build(rows), divided per row."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    return (after - before) / len(rows)
+
+
+def bench_memory(count):
+    """Compares the per-entry memory of each way of holding the tasklog.
+
+    The row strings are created up front, so only the memory added on top
+    of the raw CSV text is counted.
+    """
+    rows = list(synthetic_rows(count))
+
+    def plain(rows):
+        return [PlainEntry(number, row["entry_date"], row["task_name"],
+                           row["mins_spent"], row["notes"])
+                for number, row in enumerate(rows, 1)]
+
+    def slotted(rows):
+        return [Entry(number, row["entry_date"], row["task_name"],
+                      row["mins_spent"], row["notes"])
+                for number, row in enumerate(rows, 1)]
+
+    entries = slotted(rows)
+    return {
+        "rows": count,
+        "plain_entry": bytes_per_entry(plain, rows),
+        "slotted_entry": bytes_per_entry(slotted, rows),
+        "columns": bytes_per_entry(Analytics, entries)
+    }
+
+
+def iter_synthetic_entries(count, seed=0, note_words=60):
+    """Yields Entry objects built from synthetic_rows()."""
+    for number, row in enumerate(synthetic_rows(count, seed, note_words), 1):
+        yield Entry(number, row["entry_date"], row["task_name"],
+                    row["mins_spent"], row["notes"])
+
+
+def synthetic_entries(count, seed=0, note_words=60):
+    """Returns a list of Entry objects built from synthetic_rows()."""
+    return list(iter_synthetic_entries(count, seed, note_words))
+
+
+def best_time(function, repeat):
+    """Runs a function `repeat` times, and returns the fastest in seconds."""
+    fastest = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        if fastest is None or elapsed < fastest:
+            fastest = elapsed
+    return fastest
+
+
+def take_snapshot(entries, directory):
+    """Takes and prunes a snapshot, like backup_csv() does."""
+    snapshots = SnapshotStore(directory)
+    snapshots.create(entries)
+    snapshots.prune()
+
+
+def bench_suite(sizes=SUITE_SIZES, repeat=3):
+    """Times the load, save, search, and backup paths of the worklog.
+
+    For each size, a synthetic "tasklog.csv" is written to a temporary
+    folder, which is the working directory while the timings run. load_csv
+    times a load through the binary cache, which the first load writes, and
+    parse_csv times parsing the CSV itself. The searches time the filtering
+    done after each menu's prompts, through the same DateIndex, Analytics,
+    and TextIndex the menus get from the store. The store builds those once
+    and keeps them, so building them isn't timed. backup_csv times the
+    snapshot backup_csv() takes, without its prompts, into an empty backup
+    folder, and backup_unchanged times taking another one when nothing has
+    changed.
+
+    :return: a dict of {size: {operation: seconds}}, with the fastest of
+            `repeat` runs for each.
+    """
+    results = {}
+    first_date = date(2015, 1, 1)
+    last_date = date(2015, 3, 31)
+    regex = re.compile(r"invoice\s+\w+", re.IGNORECASE)
+    phrase = "past-due amounts"
+    new_item = Entry(0, "02/20/17", "Worklog", 10, "Benchmark entry")
+
+    original_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            for count in sizes:
+                write_entries("tasklog.csv", iter_synthetic_entries(count))
+                entries = worklog.load_csv()
+                date_index = DateIndex(entries)
+                analytics = Analytics(entries)
+                text_index = TextIndex(entries)
+                take_snapshot(entries, "backups")
+                results[str(count)] = {
+                    "load_csv": best_time(worklog.load_csv, repeat),
+                    "parse_csv": best_time(
+                        lambda: read_entries("tasklog.csv"), repeat),
+                    "save_csv": best_time(
+                        lambda: worklog.save_csv(entries), repeat),
+                    "append_csv": best_time(
+                        lambda: worklog.append_csv(new_item), repeat),
+                    "date_filter": best_time(
+                        lambda: date_index.between(first_date, last_date),
+                        repeat),
+                    "minutes_filter": best_time(
+                        lambda: analytics.minutes_between(30, 60), repeat),
+                    "regex_filter": best_time(
+                        lambda: worklog.text_search(entries, regex,
+                                                    text_index,
+                                                    SEARCH_BUDGET), repeat),
+                    "string_filter": best_time(
+                        lambda: worklog.phrase_search(entries, phrase,
+                                                      text_index), repeat),
+                    "backup_csv": best_time(
+                        lambda: take_snapshot(entries,
+                                              tempfile.mkdtemp(dir=".")),
+                        repeat),
+                    "backup_unchanged": best_time(
+                        lambda: take_snapshot(entries, "backups"), repeat)
+                }
+                del entries, date_index, analytics, text_index
+        finally:
+            os.chdir(original_folder)
+    return results
+
+
+def compare_runs(previous, current, threshold):
+    """Prints how each timing changed since a previous suite run.
+
+    :param previous: the results dict from an earlier run.
+    :param current: the results dict from this run.
+    :param threshold: how many times slower counts as a regression.
+
+    :return: True if anything regressed.
+    """
+    regressed = False
+    print("{:>9} {:<16} {:>10} {:>10} {:>7}".format(
+        "rows", "operation", "before", "after", "ratio"))
+    for size, timings in current.items():
+        for operation, seconds in timings.items():
+            before = previous.get(size, {}).get(operation)
+            if not before:
+                continue
+            ratio = seconds / before
+            flag = ""
+            if ratio > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print("{:>9} {:<16} {:>10.4f} {:>10.4f} {:>6.2f}x{}".format(
+                size, operation, before, seconds, ratio, flag))
+    return regressed
+
+
+def bench_dates(sizes=(10000, 100000, 1000000), queries=200):
+    """Times month-long date range queries, by scan and by DateIndex.
+
+    The scan checks every entry, as date_filter() used to. Times are the
+    average per query, in milliseconds.
+    """
+    results = []
+    rng = random.Random(1)
+    for count in sizes:
+        entries = synthetic_entries(count, note_words=0)
+        started = time.perf_counter()
+        date_index = DateIndex(entries)
+        build_ms = (time.perf_counter() - started) * 1000
+        ranges = []
+        for _ in range(queries):
+            first_date = date(2010, 1, 1) + timedelta(days=rng.randint(0, 5000))
+            ranges.append((first_date, first_date + timedelta(days=30)))
+
+        started = time.perf_counter()
+        for first_date, last_date in ranges[:10]:
+            low = first_date.toordinal()
+            high = last_date.toordinal()
+            [item for item in entries if low <= item.date_ordinal <= high]
+        scan_ms = (time.perf_counter() - started) * 1000 / 10
+
+        started = time.perf_counter()
+        for first_date, last_date in ranges:
+            date_index.between(first_date, last_date)
+        index_ms = (time.perf_counter() - started) * 1000 / queries
+
+        results.append({"rows": count, "build_ms": build_ms,
+                        "scan_ms": scan_ms, "index_ms": index_ms})
+    return results
+
+
+def old_merge(complete_list, filtered_list, deleted_ids):
+    """The way search_menu() used to merge search edits into the full list."""
+    for item in complete_list:
+        if item.entry_ID in deleted_ids:
+            complete_list.remove(item)
+            continue
+        for inner_item in filtered_list:
+            if item.entry_ID == inner_item.entry_ID:
+                item.entry_date = inner_item.entry_date
+                item.task_name = inner_item.task_name.capitalize()
+                item.mins_spent = inner_item.mins_spent
+                item.notes = inner_item.notes
+                continue
+
+
+def bench_merge(count, matches):
+    """Times merging the results of a search back into the full list.
+
+    A search matches `matches` entries, and 1% of those are edited and 1%
+    deleted. Times are in milliseconds.
+    """
+    rng = random.Random(2)
+    entries = synthetic_entries(count, note_words=5)
+    filtered_list = rng.sample(entries, matches)
+    changes = ChangeSet()
+    for item in filtered_list[:matches // 100]:
+        item.mins_spent += 1
+        changes.edit(item)
+    for item in filtered_list[-(matches // 100):]:
+        changes.delete(item)
+    kept_list = [item for item in filtered_list
+                 if item.entry_ID not in changes.deleted]
+
+    started = time.perf_counter()
+    old_merge(list(entries), kept_list, list(changes.deleted))
+    old_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    changes.apply_to(list(entries))
+    change_set_ms = (time.perf_counter() - started) * 1000
+    return {"rows": count, "matches": matches, "old_ms": old_ms,
+            "change_set_ms": change_set_ms}
+
+
+def bench_parallel(count, worker_counts, repeat):
+    """Times a regex search of count entries with different numbers of
+    worker processes. One worker is the plain serial search.
+
+    :return: a list of dicts with "workers", "seconds", and "speedup"
+            (compared to one worker).
+    """
+    entries = synthetic_entries(count)
+    test = worklog.text_matcher(re.compile(r"invoice\s+\w+", re.IGNORECASE))
+    results = []
+    for workers in worker_counts:
+        seconds = best_time(
+            lambda: parallel_filter(test, entries, workers, min_entries=0),
+            repeat)
+        results.append({"workers": workers, "seconds": seconds,
+                        "speedup": results[0]["seconds"] / seconds
+                        if results else 1.0})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worklog benchmarks")
+    parser.add_argument("benchmark",
+                        choices=["suite", "memory", "dates", "merge",
+                                 "parallel"])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--matches", type=int, default=10000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES,
+                        help="tasklog sizes for the suite")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of each suite timing (the best is kept)")
+    parser.add_argument("--output", help="save the suite's JSON to a file")
+    parser.add_argument("--compare",
+                        help="a saved suite run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio counted as a regression")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="worker counts for the parallel benchmark "
+                             "(default: 1 up to the number of CPUs)")
+    args = parser.parse_args()
+
+    if args.benchmark == "suite":
+        run = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "results": bench_suite(args.sizes, args.repeat)
+        }
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(run, file, indent=2)
+        else:
+            print(json.dumps(run, indent=2))
+        if args.compare:
+            with open(args.compare) as file:
+                previous = json.load(file)
+            if compare_runs(previous["results"], run["results"],
+                            args.threshold):
+                sys.exit(1)
+    elif args.benchmark == "memory":
+        results = bench_memory(args.rows)
+        print("Bytes per entry ({} rows):".format(results["rows"]))
+        print("  Plain Entry (__dict__): {:8.1f}".format(results["plain_entry"]))
+        print("  Entry with __slots__:   {:8.1f}".format(
+            results["slotted_entry"]))
+        print("  Analytics columns:      {:8.1f}".format(results["columns"]))
+    elif args.benchmark == "dates":
+        print("Month-long date range query (ms per query):")
+        print("{:>9} {:>10} {:>10} {:>10}".format(
+            "rows", "build", "scan", "index"))
+        for result in bench_dates():
+            print("{rows:>9} {build_ms:>10.2f} {scan_ms:>10.3f} "
+                  "{index_ms:>10.4f}".format(**result))
+    elif args.benchmark == "merge":
+        results = bench_merge(args.rows, args.matches)
+        print("Merging {matches} search results into {rows} entries:".format(
+            **results))
+        print("  Nested loop: {:10.1f} ms".format(results["old_ms"]))
+        print("  ChangeSet:   {:10.1f} ms".format(results["change_set_ms"]))
+    elif args.benchmark == "parallel":
+        worker_counts = args.workers or range(1, (os.cpu_count() or 1) + 1)
+        print("Regex search of {} entries ({} CPUs):".format(
+            args.rows, os.cpu_count()))
+        print("{:>8} {:>10} {:>8}".format("workers", "seconds", "speedup"))
+        for result in bench_parallel(args.rows, worker_counts, args.repeat):
+            print("{workers:>8} {seconds:>10.3f} {speedup:>7.2f}x".format(
+                **result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""A binary cache of a CSV tasklog, kept beside it, so it loads quickly.
+
+The cache ("tasklog.csv.cache") has a header, a fixed-width record for each
+entry, and a heap of UTF-8 text. Each record holds the minutes spent, and
+where the date, task name, and notes are in the heap. Dates and task names
+repeat a lot, so each distinct one is only stored (and decoded) once.
+
+Loading from the cache maps the file into memory and builds the entries
+straight from the records, without any CSV parsing. Notes aren't decoded
+until something uses them (see CachedEntry), so browsing or searching by
+date never decodes most of them.
+
+The CSV is always the source of truth. The header records the CSV's size,
+modification time, and hash, and the cache is only used when all three
+match. Otherwise it's rebuilt from the CSV the next time it's loaded.
+"""
+
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+
+from entry import Entry, parse_date
+
+
+CACHE_SUFFIX = ".cache"
+# Bumped whenever the layout changes, so older caches are rebuilt
+MAGIC = b"WLC2"
+
+# The magic number, the CSV's size, modification time and SHA-1, and the
+# number of entries
+HEADER = struct.Struct("<4sQq20sQ")
+# The minutes, then the (start, length) in the heap of the date, task name,
+# and notes. The heap can be bigger than 4 GiB, so these are 64-bit.
+RECORD = struct.Struct("<qQQQQQQ")
+
+
+class CachedEntry(Entry):
+    """An entry loaded from the cache, whose notes are only decoded from the
+    cache file the first time they're used."""
+    __slots__ = ("_heap", "_notes_start", "_notes_stop")
+
+    @property
+    def notes(self):
+        if self._notes is None:
+            self._notes = self._heap[self._notes_start:
+                                     self._notes_stop].decode()
+            self._heap = None
+        return self._notes
+
+    @notes.setter
+    def notes(self, value):
+        self._notes = value
+        self._heap = None
+        self._folded_text = None
+
+
+def cache_path(path):
+    """Returns the path of the cache for a CSV tasklog."""
+    return path + CACHE_SUFFIX
+
+
+def csv_source(data, stat):
+    """Returns what a cache records about its CSV file, to tell whether it's
+    still current.
+
+    :param data: the CSV file's contents, as bytes.
+    :param stat: the CSV file's os.stat() result.
+    """
+    return stat.st_size, stat.st_mtime_ns, hashlib.sha1(data).digest()
+
+
+def read_cache(path, source):
+    """Loads the entries from a CSV tasklog's cache, if it's current.
+
+    :param path: the CSV file (not the cache).
+    :param source: the CSV's csv_source().
+
+    :return: a list of CachedEntry objects, numbered from 1, or None if
+            there's no cache or it doesn't match the CSV.
+    """
+    try:
+        with open(cache_path(path), "rb") as file:
+            heap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # No cache, or an empty one (which can't be mapped)
+        return None
+    if len(heap) < HEADER.size:
+        return None
+    magic, size, mtime_ns, digest, count = HEADER.unpack_from(heap)
+    if magic != MAGIC or (size, mtime_ns, digest) != source:
+        return None
+    heap_start = HEADER.size + count * RECORD.size
+    if len(heap) < heap_start:
+        return None
+
+    dates = {}
+    tasks = {}
+    entries = []
+    new_entry = CachedEntry.__new__
+    records = RECORD.iter_unpack(heap[HEADER.size:heap_start])
+    for entry_ID, record in enumerate(records, 1):
+        mins_spent, date_start, date_length, task_start, task_length, \
+            notes_start, notes_length = record
+        entry_date = dates.get(date_start)
+        if entry_date is None:
+            text = heap[heap_start + date_start:
+                        heap_start + date_start + date_length].decode()
+            parsed_date = parse_date(text)
+            entry_date = dates[date_start] = (
+                text, parsed_date,
+                0 if parsed_date is None else parsed_date.toordinal())
+        task_name = tasks.get(task_start)
+        if task_name is None:
+            task_name = tasks[task_start] = sys.intern(heap[
+                heap_start + task_start:
+                heap_start + task_start + task_length].decode())
+
+        # The fields are set directly, rather than through Entry's setters,
+        # since the cache already holds them in their final form
+        item = new_entry(CachedEntry)
+        item.entry_ID = entry_ID
+        item._entry_date, item.parsed_date, item.date_ordinal = entry_date
+        item._task_name = task_name
+        item.mins_spent = mins_spent
+        item._folded_text = None
+        if notes_length:
+            item._notes = None
+            item._heap = heap
+            item._notes_start = heap_start + notes_start
+            item._notes_stop = heap_start + notes_start + notes_length
+        else:
+            item._notes = ""
+            item._heap = None
+        entries.append(item)
+    return entries
+
+
+def write_cache(path, entries, source):
+    """Writes the cache for a CSV tasklog.
+
+    The cache is written to a temporary file and renamed into place, so a
+    process reading the old one is never left with half a file. If it can't
+    be written (say the folder is read-only, or an entry's minutes don't
+    fit in 64 bits), the tasklog simply loads without one.
+
+    :param path: the CSV file (not the cache).
+    :param entries: the entries read from the CSV.
+    :param source: the CSV's csv_source() when they were read.
+    """
+    heap = bytearray()
+    starts = {}
+
+    def place(text):
+        # Returns where some text is in the heap, adding it if need be
+        span = starts.get(text)
+        if span is None:
+            encoded = text.encode()
+            span = starts[text] = (len(heap), len(encoded))
+            heap.extend(encoded)
+        return span
+
+    records = bytearray()
+    try:
+        for item in entries:
+            notes = item.notes.encode()
+            records.extend(RECORD.pack(
+                item.mins_spent, *place(item.entry_date),
+                *place(item.task_name), len(heap), len(notes)))
+            heap.extend(notes)
+    except struct.error:
+        return
+
+    size, mtime_ns, digest = source
+    temp_path = "{}.{}.tmp".format(cache_path(path), os.getpid())
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, size, mtime_ns, digest,
+                                   len(records) // RECORD.size))
+            file.write(records)
+            file.write(heap)
+        os.replace(temp_path, cache_path(path))
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
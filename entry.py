@@ -1,4 +1,57 @@
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
+import sys
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """Turns an MM/DD/YY (or MM/DD/YYYY) date string into a date.
+
+    This is the one place dates are parsed. The fixed MM/DD/YY layout used
+    in the CSV is read by slicing, and anything else with three parts
+    separated by slashes (like 2/7/17) falls back to splitting. ISO dates
+    (YYYY-MM-DD) are read too. Two-digit years are in the 2000s. Results are
+    cached, since a log has far fewer distinct dates than entries.
+
+    :return: a date, or None if the text isn't a valid date.
+    """
+    try:
+        if len(text) == 8 and text[2] == "/" and text[5] == "/":
+            return date(2000 + int(text[6:8]), int(text[0:2]),
+                        int(text[3:5]))
+        if len(text) == 10 and text[2] == "/" and text[5] == "/":
+            return date(int(text[6:10]), int(text[0:2]), int(text[3:5]))
+        if len(text) == 10 and text[4] == "-" and text[7] == "-":
+            return date(int(text[0:4]), int(text[5:7]), int(text[8:10]))
+        month, day, year = (int(part) for part in text.split("/"))
+        if year < 100:
+            year += 2000
+        return date(year, month, day)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def date_ordinal(entry_date):
+    """Turns an MM/DD/YY (or MM/DD/YYYY) date string into a day number.
+
+    :return: the date's proleptic Gregorian ordinal, or 0 if the string
+            isn't a valid date.
+    """
+    parsed = parse_date(entry_date)
+    if parsed is None:
+        return 0
+    return parsed.toordinal()
+
+
+def format_entry_date(day):
+    """Formats a date the way the CSV stores them (MM/DD/YY).
+
+    Two-digit years are read back as 20YY, so dates in other centuries keep
+    the whole year (MM/DD/YYYY).
+    """
+    if 2000 <= day.year <= 2099:
+        return day.strftime("%m/%d/%y")
+    return "{:02}/{:02}/{:04}".format(day.month, day.day, day.year)
 
 
 class Entry:
@@ -7,29 +60,73 @@ class Entry:
     Each entry has an id number, a date, a task name, the minutes spent, and
     any additional notes. The ID number isn't recorded in the CSV, nor
     displayed, but is assigned for ease of editing/removing specific records.
+
+    Entries use __slots__ to keep large logs small in memory. The minutes are
+    always stored as an int. Setting entry_date parses it once, and keeps
+    the result as a date (parsed_date, or None if it isn't valid) and as an
+    ordinal (date_ordinal, or 0), so filters can compare plain numbers.
+    Task names are title-cased and interned whenever they're set.
     """
+    __slots__ = ("entry_ID", "_entry_date", "parsed_date", "date_ordinal",
+                 "_task_name", "mins_spent", "_notes", "_folded_text")
+
     def __init__(self, en, entry_date, task_name="N/A", mins_spent=0, notes=""):
         self.entry_ID = en
         self.entry_date = entry_date
-        self.task_name = task_name.title()
-        self.mins_spent = mins_spent
+        self.task_name = task_name
+        self.mins_spent = int(mins_spent)
         self.notes = notes
-        
+
+    @property
+    def entry_date(self):
+        return self._entry_date
+
+    @entry_date.setter
+    def entry_date(self, value):
+        self._entry_date = value
+        self.parsed_date = parse_date(value)
+        if self.parsed_date is None:
+            self.date_ordinal = 0
+        else:
+            self.date_ordinal = self.parsed_date.toordinal()
+
+    @property
+    def task_name(self):
+        return self._task_name
+
+    @task_name.setter
+    def task_name(self, value):
+        self._task_name = sys.intern(value.title())
+        self._folded_text = None
+
+    @property
+    def notes(self):
+        return self._notes
+
+    @notes.setter
+    def notes(self, value):
+        self._notes = value
+        self._folded_text = None
+
+    @property
+    def folded_text(self):
+        """The task name and notes on two lines, case-folded, for quick
+        case-insensitive phrase searches. It's made the first time it's
+        needed, and kept until the task name or notes change."""
+        if self._folded_text is None:
+            self._folded_text = "{}\n{}".format(self._task_name,
+                                                self.notes).casefold()
+        return self._folded_text
+
     def get_readable_date(self):
         """Returns a readable version of the entry_date datetime (MM/DD/YYYY)
         This method was created because of the CSV format on dates in Excel,
         where they wouldn't show up as MM/DD/YYYY. With good data, this could
         be completely deprecated.
-        :return: a MM/DD/YYYY string representing the entry date.
+        :return: a MM/DD/YYYY string representing the entry date, or the
+                entry_date as-is if it couldn't be parsed.
         """
-        try:
-            disp_day = self.entry_date[3:5]
-            disp_month = self.entry_date[0:2]
-            disp_year = self.entry_date[6:8]
-            if int(disp_year) > datetime.now().year:
-                disp_year = str(19) + str(disp_year)
-            else:
-                disp_year = str(20) + str(disp_year)
-            return "{}/{}/{}".format(disp_month, disp_day, disp_year)
-        except:
+        if self.parsed_date is None:
             return self.entry_date
+        return self.parsed_date.strftime("%m/%d/%Y")
+
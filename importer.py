@@ -0,0 +1,282 @@
+"""Bulk import of entries exported from other time trackers.
+
+An import reads a CSV file (with a header row), a JSON lines file (one
+object per line), or a JSON file holding an array of objects, and streams
+it through three steps:
+
+1. Rows are validated and normalized BATCH_ROWS at a time. Each distinct
+   date and minutes value in a batch is parsed once, since exports repeat
+   them a lot. Dates can be MM/DD/YY, MM/DD/YYYY, or ISO (YYYY-MM-DD, with
+   or without a time after it), and are stored as MM/DD/YY. Minutes can be
+   a number or H:MM.
+2. Each entry is hashed, and dropped if the same entry is already in the
+   tasklog or earlier in the file. Only the hashes are kept in memory.
+3. The new entries are appended with a single write (see the backends'
+   append_many()), rather than one write per entry.
+
+Columns can use the tasklog's names (entry_date, task_name, mins_spent,
+notes) or the shorter ones in ALIASES. Rows which can't be read are
+skipped, and reported with their line numbers (or, in a JSON array, their
+item numbers).
+"""
+
+
+import csv
+import hashlib
+from itertools import islice
+import json
+import math
+import os
+
+
+from entry import Entry, format_entry_date, parse_date
+from profiling import stage
+
+
+BATCH_ROWS = 10000
+MAX_ERRORS = 20
+
+ALIASES = {
+    "date": "entry_date",
+    "day": "entry_date",
+    "task": "task_name",
+    "name": "task_name",
+    "minutes": "mins_spent",
+    "mins": "mins_spent",
+    "duration": "mins_spent",
+    "note": "notes",
+    "description": "notes"
+}
+
+JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson")
+
+
+class ImportResult:
+    """What an import did: how many rows were read, added, skipped as
+    duplicates, and skipped as invalid, plus the first MAX_ERRORS errors.
+    """
+    def __init__(self):
+        self.read = 0
+        self.added = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def error(self, where, message):
+        """Records a row which couldn't be imported.
+
+        :param where: where the row is, like "line 3".
+        """
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append("{}: {}".format(where, message))
+
+
+def read_records(path, file_format=None):
+    """Yields (where, record) for each row of a CSV, JSON lines, or JSON
+    file, where `where` is like "line 3".
+
+    CSV and JSON lines files are read one row at a time. A JSON file which
+    holds an array is read all at once, and its rows are numbered as items
+    of the array. A JSON file which doesn't start with "[" is read as JSON
+    lines, since some tools write those with a .json extension.
+
+    :param file_format: "csv", "jsonl", or "json", or None to go by the
+            extension.
+
+    :return: records are dicts, except for lines which aren't valid JSON,
+            which are yielded as they are, to be reported as errors.
+    :raises ValueError: if a JSON array isn't valid JSON.
+    """
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        if extension in JSON_LINES_EXTENSIONS:
+            file_format = "jsonl"
+        elif extension == ".json":
+            file_format = "json"
+        else:
+            file_format = "csv"
+    with open(path, newline="") as file:
+        if file_format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield "line {}".format(reader.line_num), row
+            return
+        if file_format == "json":
+            start = file.read(4096).lstrip()
+            file.seek(0)
+            if start.startswith("["):
+                records = json.load(file)
+                for number, record in enumerate(records, 1):
+                    yield "item {}".format(number), record
+                return
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield "line {}".format(number), json.loads(line)
+            except ValueError:
+                yield "line {}".format(number), line
+
+
+def normalize_date(value):
+    """Returns a date in the tasklog's MM/DD/YY form (see
+    entry.format_entry_date()), or None if it isn't a valid date."""
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    if len(text) > 10 and text[10] in "T ":
+        # An ISO timestamp, like 2017-02-07T09:30:00
+        text = text[:10]
+    parsed = parse_date(text)
+    if parsed is None:
+        return None
+    return format_entry_date(parsed)
+
+
+def normalize_minutes(value):
+    """Returns a number of minutes as a positive int, or None if it isn't
+    one. Numbers, numeric strings, and H:MM (with MM from 00 to 59) are
+    accepted."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        hours, colon, minutes = text.partition(":")
+        try:
+            if colon:
+                if not (hours.isdigit() and len(minutes) == 2
+                        and minutes.isdigit() and int(minutes) < 60):
+                    return None
+                value = int(hours) * 60 + int(minutes)
+            else:
+                value = float(text)
+        except ValueError:
+            return None
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        value = round(value)
+    if not isinstance(value, int) or value < 1:
+        return None
+    return value
+
+
+def canonical_fields(record):
+    """Returns a record's fields under the tasklog's column names."""
+    fields = {}
+    for key, value in record.items():
+        if key is None:
+            # Extra CSV columns without a header
+            continue
+        name = key.strip().lower()
+        fields[ALIASES.get(name, name)] = value
+    return fields
+
+
+def normalize_batch(batch, result):
+    """Turns a batch of (where, record) pairs into entries.
+
+    :param result: the ImportResult to record invalid rows in.
+
+    :return: a list of Entry objects for the valid rows, numbered 0.
+    """
+    rows = [(where, canonical_fields(record) if isinstance(record, dict)
+             else None) for where, record in batch]
+    valid = [fields for where, fields in rows if fields is not None]
+
+    dates = {value: normalize_date(value) for value in
+             {fields.get("entry_date") for fields in valid
+              if isinstance(fields.get("entry_date"), str)}}
+    minutes = {value: normalize_minutes(value) for value in
+               {fields.get("mins_spent") for fields in valid
+                if isinstance(fields.get("mins_spent"), str)}}
+
+    entries = []
+    for where, fields in rows:
+        if fields is None:
+            result.error(where, "not a JSON object")
+            continue
+        value = fields.get("entry_date")
+        entry_date = dates.get(value) if isinstance(value, str) else None
+        if entry_date is None:
+            result.error(where, "entry_date {!r} is not a date".format(
+                value))
+            continue
+        value = fields.get("mins_spent")
+        if isinstance(value, str):
+            mins_spent = minutes[value]
+        else:
+            mins_spent = normalize_minutes(value)
+        if mins_spent is None:
+            result.error(where, "mins_spent {!r} is not a number of minutes "
+                                "greater than 0".format(value))
+            continue
+        task_name = fields.get("task_name")
+        if not isinstance(task_name, str) or not task_name.strip():
+            result.error(where, "task_name is missing")
+            continue
+        notes = fields.get("notes") or ""
+        if not isinstance(notes, str):
+            notes = str(notes)
+        entries.append(Entry(0, entry_date, task_name.strip(), mins_spent,
+                             notes))
+    return entries
+
+
+def entry_key(item):
+    """Returns a hash identifying an entry's contents, for spotting
+    duplicates. Dates are compared as days, so 02/07/17 and 02/07/2017
+    are the same."""
+    text = "\x1f".join((str(item.date_ordinal or item.entry_date),
+                        item.task_name, str(item.mins_spent), item.notes))
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def new_entries(records, seen, result):
+    """Yields the valid entries from a stream of records which aren't in
+    seen, adding their hashes to it.
+
+    :param records: (where, record) pairs, from read_records().
+    :param seen: a set of entry_key() hashes.
+    :param result: the ImportResult to count everything in.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, BATCH_ROWS))
+        if not batch:
+            return
+        result.read += len(batch)
+        for item in normalize_batch(batch, result):
+            key = entry_key(item)
+            if key in seen:
+                result.duplicates += 1
+                continue
+            seen.add(key)
+            result.added += 1
+            yield item
+
+
+def import_entries(backend, records, dry_run=False):
+    """Imports records into a tasklog.
+
+    The tasklog is locked for the whole import, so other processes can't
+    add the same entries in the meantime.
+
+    :param backend: the tasklog's backend, from store.open_backend().
+    :param records: (where, record) pairs, from read_records().
+    :param dry_run: True to validate and count everything without writing.
+
+    :return: an ImportResult.
+    """
+    result = ImportResult()
+    with backend.lock(), stage("import") as timing:
+        seen = {entry_key(item) for item in backend.stream()}
+        entries = new_entries(records, seen, result)
+        if dry_run:
+            for item in entries:
+                pass
+        else:
+            backend.append_many(entries)
+        timing.rows = result.read
+    return result
@@ -0,0 +1,242 @@
+"""Indexes which speed up searching the tasklog.
+
+Indexes are built once from a list of entries, and can be kept up to date
+as entries are added, edited, and deleted, so a search doesn't need to scan
+every entry.
+"""
+
+
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from heapq import merge
+from operator import attrgetter
+import re
+
+
+class SortedIndex:
+    """Entries kept sorted by one of their fields.
+
+    The field values are kept in a sorted list alongside the entries, so a
+    lookup is a binary search for each end of the range, plus the cost of
+    copying out the matches. Entries with the same value stay in the order
+    they were added.
+
+    :param entries: the entries to index.
+    :param key: a function returning the field to sort on.
+    """
+    def __init__(self, entries=(), key=None):
+        self.key = key
+        self.entries = sorted(entries, key=key)
+        self.keys = [key(item) for item in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, item):
+        """Adds one entry, after any others with the same value."""
+        position = bisect_right(self.keys, self.key(item))
+        self.keys.insert(position, self.key(item))
+        self.entries.insert(position, item)
+
+    def apply(self, changes):
+        """Brings the index up to date with a ChangeSet.
+
+        Deleted and edited entries are dropped in one pass, then the edited
+        ones are merged back in at their new places.
+        """
+        changed_ids = changes.deleted | changes.edited.keys()
+        kept = [item for item in self.entries
+                if item.entry_ID not in changed_ids]
+        edited = sorted(changes.edited.values(), key=self.key)
+        self.entries = list(merge(kept, edited, key=self.key))
+        self.keys = [self.key(item) for item in self.entries]
+
+    def _range(self, low, high):
+        return self.entries[bisect_left(self.keys, low):
+                            bisect_right(self.keys, high)]
+
+
+class DateIndex(SortedIndex):
+    """Entries sorted by date, for fast lookups of a day or range of days."""
+    def __init__(self, entries=()):
+        super().__init__(entries, attrgetter("date_ordinal"))
+
+    def between(self, first_date, last_date):
+        """Returns the entries dated from first_date to last_date, inclusive.
+
+        :param first_date: the earliest date to include (a date object).
+        :param last_date: the latest date to include (a date object).
+
+        :return: a list of entries, sorted by date.
+        """
+        return self._range(first_date.toordinal(), last_date.toordinal())
+
+    def on(self, ordinal):
+        """Returns the entries on a single day, given as an ordinal."""
+        return self._range(ordinal, ordinal)
+
+    def dates(self):
+        """Returns each distinct entry_date once, in date order."""
+        unique_dates = []
+        last_ordinal = None
+        for ordinal, item in zip(self.keys, self.entries):
+            if ordinal != last_ordinal:
+                unique_dates.append(item.entry_date)
+                last_ordinal = ordinal
+        return unique_dates
+
+
+class MinutesIndex(SortedIndex):
+    """Entries sorted by minutes spent, for fast lookups of a range."""
+    def __init__(self, entries=()):
+        super().__init__(entries, attrgetter("mins_spent"))
+
+    def between(self, low, high):
+        """Returns the entries which took from low to high minutes.
+
+        :return: a list of entries, in the order they were added.
+        """
+        return sorted(self._range(low, high), key=attrgetter("entry_ID"))
+
+
+WORD_PATTERN = re.compile(r"\w+")
+WORD_CHARS = set("abcdefghijklmnopqrstuvwxyz0123456789_")
+
+
+def required_words(regex):
+    """Finds words which must appear in any text the regex matches.
+
+    Only plain letters and digits outside of groups, character classes,
+    and escapes are used. Anything made optional by ?, * or {} is dropped,
+    and a pattern with | alternatives gives no words at all, since any one
+    branch could match. The words are case-folded to match a TextIndex.
+
+    :param regex: a compiled pattern.
+
+    :return: a list of words. Any text matching the regex contains each of
+            them, though maybe as part of a longer word. An empty list
+            means no words are certain.
+    """
+    return list(pattern_words(regex.pattern, regex.flags))
+
+
+@lru_cache(maxsize=256)
+def pattern_words(pattern, flags):
+    """Does the work for required_words(), and caches it by pattern, since
+    the same pattern is often searched for again.
+
+    :return: a tuple of words.
+    """
+    if not isinstance(pattern, str) or "|" in pattern or flags & re.VERBOSE:
+        return ()
+
+    words = []
+    current = ""
+    depth = 0
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "\\":
+            position += 2
+            char = ""
+        elif char == "[":
+            # Skip to the end of the character class
+            position += 1
+            if pattern[position:position + 1] == "^":
+                position += 1
+            if pattern[position:position + 1] == "]":
+                position += 1
+            while position < len(pattern) and pattern[position] != "]":
+                if pattern[position] == "\\":
+                    position += 1
+                position += 1
+            position += 1
+            char = ""
+        else:
+            position += 1
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char in "?*{":
+                # The character before this one might not appear at all
+                current = current[:-1]
+                if char == "{" and "}" in pattern[position:]:
+                    position = pattern.index("}", position) + 1
+
+        char = char.casefold()
+        if depth == 0 and char and char in WORD_CHARS:
+            current += char
+        else:
+            if current:
+                words.append(current)
+            current = ""
+    if current:
+        words.append(current)
+    return tuple(words)
+
+
+class TextIndex:
+    """An inverted index of the words in each entry's task name and notes.
+
+    Each case-folded word maps to the IDs of the entries which contain it.
+    Searches use the index to narrow down which entries could possibly
+    match, and the caller then checks just those with the real pattern.
+
+    Removing or editing an entry doesn't clear its old words out of the
+    index. They only cause a few extra candidates, which the real pattern
+    then rules out.
+    """
+    def __init__(self, entries=()):
+        self.postings = {}
+        self.entries = {}
+        for item in entries:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, item):
+        """Indexes the words of a new or edited entry."""
+        self.entries[item.entry_ID] = item
+        text = "{} {}".format(item.task_name, item.notes).casefold()
+        for word in set(WORD_PATTERN.findall(text)):
+            self.postings.setdefault(word, set()).add(item.entry_ID)
+
+    update = add
+
+    def apply(self, changes):
+        """Brings the index up to date with a ChangeSet."""
+        for entry_ID in changes.deleted:
+            self.entries.pop(entry_ID, None)
+        for item in changes.edited.values():
+            self.update(item)
+
+    def candidates(self, regex):
+        """Returns the entries which could match a compiled regex.
+
+        A word from the pattern can match part of a longer word in the text,
+        so each one is looked up in every indexed word which contains it.
+
+        :return: a list of entries in the order they were added, or None if
+                the pattern has no words the index can use.
+        """
+        words = sorted(set(required_words(regex)), key=len, reverse=True)
+        if not words:
+            return None
+
+        matching_ids = None
+        for word in words:
+            word_ids = set()
+            for indexed_word, entry_ids in self.postings.items():
+                if word in indexed_word:
+                    word_ids.update(entry_ids)
+            if matching_ids is None:
+                matching_ids = word_ids
+            else:
+                matching_ids &= word_ids
+            if not matching_ids:
+                break
+
+        return [self.entries[entry_ID] for entry_ID in sorted(matching_ids)
+                if entry_ID in self.entries]
@@ -0,0 +1,155 @@
+"""Named timers for logging how long tasks take.
+
+Each timer is named after the task it's timing (or left unnamed), and
+several can run at once. They're kept in one small JSON file of full
+start timestamps, so a timer left running overnight (or for days) still
+gives the right number of minutes.
+
+The file is read once and cached. Before each use, a quick stat() checks
+whether another worklog changed it, the same way the EntryStore checks
+the tasklog. Changes are made under the file's lock, and written to a
+temporary file which is renamed into place, so readers never see half a
+file.
+"""
+
+
+from datetime import datetime, timedelta
+import json
+import os
+
+
+from store import FileLock, write_text
+
+
+MARKER_FILE = "time_markers.json"
+# Where older versions kept their single marker, as an "%I:%M%p" time
+LEGACY_FILE = "time_marker.txt"
+
+
+def timer_name(task_name):
+    """Returns the name a task's timer goes by, which matches how the task
+    name is stored in entries (see Entry.task_name)."""
+    return task_name.strip().title()
+
+
+def elapsed_minutes(started, now=None):
+    """Returns the whole minutes between a start time and now."""
+    now = now or datetime.now()
+    return int((now - started).total_seconds() // 60)
+
+
+def marker_label(name, started, now=None):
+    """Describes a timer, like "Accounts Payable since 02/07 09:30AM (45
+    minutes)"."""
+    return "{} since {} ({} minutes)".format(
+        name or "Unnamed timer", started.strftime("%m/%d %I:%M%p"),
+        elapsed_minutes(started, now))
+
+
+class MarkerStore:
+    """The running timers, cached from the marker file.
+
+    :param path: the marker file.
+    """
+    def __init__(self, path=MARKER_FILE):
+        self.path = path
+        self.file_lock = FileLock(path)
+        self._stamp = None
+        self._timers = {}
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """Reads the file again if it changed since it was last read.
+
+        If there's no file yet, but an older version left a marker, it's
+        converted into the file straight away, so its start time is only
+        worked out once.
+        """
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        if stamp is None:
+            self._timers = {}
+            self._stamp = None
+            if not os.path.exists(LEGACY_FILE):
+                return
+            with self.file_lock.hold():
+                if self._file_stamp() is None:
+                    self._timers = self._legacy_timers()
+                    if self._timers:
+                        self._write()
+                    return
+            stamp = self._file_stamp()
+        with open(self.path) as file:
+            self._timers = {
+                name: datetime.fromisoformat(started)
+                for name, started in json.load(file)["timers"].items()}
+        self._stamp = stamp
+
+    def _legacy_timers(self):
+        """Reads the marker an older version left behind, as an unnamed
+        timer. Only the time was kept, so it's taken to be the last time
+        the clock read that."""
+        try:
+            with open(LEGACY_FILE) as file:
+                marked = datetime.strptime(file.read().strip(), "%I:%M%p")
+        except (OSError, ValueError):
+            return {}
+        now = datetime.now()
+        started = now.replace(hour=marked.hour, minute=marked.minute,
+                              second=0, microsecond=0)
+        if started > now:
+            started -= timedelta(days=1)
+        return {"": started}
+
+    def _write(self):
+        write_text(self.path, json.dumps({"timers": {
+            name: started.isoformat(timespec="seconds")
+            for name, started in self._timers.items()}}, indent=1))
+        self._stamp = self._file_stamp()
+        try:
+            os.remove(LEGACY_FILE)
+        except FileNotFoundError:
+            pass
+
+    def timers(self):
+        """Returns {name: start time} for the running timers, oldest
+        first."""
+        self._refresh()
+        return dict(sorted(self._timers.items(), key=lambda item: item[1]))
+
+    def start(self, task_name, when=None):
+        """Starts (or restarts) a task's timer.
+
+        :param when: the start time, or None for now.
+        :return: the start time.
+        """
+        name = timer_name(task_name)
+        with self.file_lock.hold():
+            self._refresh()
+            self._timers[name] = when or datetime.now().replace(
+                microsecond=0)
+            self._write()
+        return self._timers[name]
+
+    def stop(self, task_name, when=None):
+        """Stops a task's timer.
+
+        :param when: the stop time, or None for now.
+        :return: the whole minutes it ran, or None if it wasn't running
+                (say another worklog stopped it first).
+        """
+        name = timer_name(task_name)
+        with self.file_lock.hold():
+            self._refresh()
+            started = self._timers.pop(name, None)
+            if started is None:
+                return None
+            self._write()
+        return elapsed_minutes(started, when)
@@ -0,0 +1,223 @@
+"""A cursor for browsing entries one at a time.
+
+Browsing never copies the entries it's given. A list is read in place, and
+a stream (like the tasklog itself, when Browse is picked from the main
+menu) is only read a page at a time, as far as the user has browsed.
+Deleting an entry leaves a tombstone behind instead of removing it, so
+nothing after it has to move.
+
+If a stream can be opened again, only the pages near the cursor are kept,
+so browsing a long tasklog doesn't fill up memory. Going back to a page
+which was dropped reads the stream again from the start, up to that page.
+"""
+
+
+from itertools import islice
+
+
+PAGE_SIZE = 100
+
+# How many pages either side of the cursor are kept, when a stream can be
+# opened again
+WINDOW = 2
+
+
+class EntryCursor:
+    """A position in a list or stream of entries.
+
+    :param entries: a list (or anything else with len() and indexing) to
+            browse in place, or any other iterable, which is pulled
+            page_size entries at a time.
+    :param page_size: how many entries to read from a stream at once.
+    :param reopen: a function which returns the stream's entries again,
+            from the start. Without one, every page read is kept.
+    :param window: how many pages either side of the cursor to keep, when
+            the stream can be reopened.
+    """
+    def __init__(self, entries, page_size=PAGE_SIZE, reopen=None,
+                 window=WINDOW):
+        if hasattr(entries, "__getitem__") and hasattr(entries, "__len__"):
+            self.entries = entries
+            self.stream = None
+            self.count = len(entries)
+        else:
+            self.entries = None
+            self.stream = iter(entries)
+            self.count = None
+        self.page_size = page_size
+        self.reopen = reopen
+        self.window = window
+        # Pages read from a stream, by their number from 0
+        self.pages = {}
+        # How many entries have been read from the stream so far
+        self.read = 0
+        # Entries which were edited, by position, so their changes are still
+        # shown if their page is dropped and read again
+        self.kept = {}
+        self.deleted = set()
+        self.position = self._live_from(0, 1)
+
+    def _read_page(self, near):
+        """Reads the next page from the stream, and drops the pages which
+        are too far from page number near (if the stream can be reopened).
+        """
+        number = self.read // self.page_size
+        page = list(islice(self.stream, self.page_size))
+        self.read += len(page)
+        if len(page) < self.page_size:
+            self.stream = None
+            self.count = self.read
+        if page:
+            self.pages[number] = page
+        if self.reopen is not None:
+            for far in [far for far in self.pages
+                        if abs(far - near) > self.window]:
+                del self.pages[far]
+
+    def _rewind(self, number):
+        """Opens the stream again, and skips ahead to the given page."""
+        start = number * self.page_size
+        self.stream = iter(self.reopen())
+        self.read = sum(1 for item in islice(self.stream, start))
+        if self.read < start:
+            self.stream = None
+            self.count = self.read
+
+    def _fetch(self, position):
+        """Reads the page holding position, if it isn't already loaded.
+
+        :return: True if there is an entry at position.
+        """
+        if position < 0 or self.count is not None and position >= self.count:
+            return False
+        if self.entries is not None:
+            return True
+        number = position // self.page_size
+        if number not in self.pages and position < self.read:
+            self._rewind(number)
+        while number not in self.pages and self.stream is not None:
+            self._read_page(number)
+        page = self.pages.get(number, ())
+        return position - number * self.page_size < len(page)
+
+    def _entry(self, position):
+        """Returns the entry at a position which _fetch() has found."""
+        if position in self.kept:
+            return self.kept[position]
+        if self.entries is not None:
+            return self.entries[position]
+        self._fetch(position)
+        return self.pages[position // self.page_size][
+            position % self.page_size]
+
+    def _live_from(self, position, step):
+        """Finds the first position from position (stepping by 1 or -1)
+        which holds an entry that hasn't been deleted.
+
+        :return: the position, or None if there isn't one.
+        """
+        while self._fetch(position):
+            if position not in self.deleted:
+                return position
+            position += step
+        return None
+
+    def _last(self):
+        """Reads to the end of the stream, and returns the last live
+        position. If the stream can be reopened, only the last few pages are
+        kept."""
+        while self.count is None:
+            self._fetch(self.read)
+        return self._live_from(self.count - 1, -1)
+
+    def is_empty(self):
+        """Returns True once every entry has been deleted (or if there were
+        none to begin with)."""
+        return self.position is None
+
+    def current(self):
+        """Returns the entry at the cursor, or None if there are none left."""
+        if self.position is None:
+            return None
+        return self._entry(self.position)
+
+    def keep(self):
+        """Holds on to the entry at the cursor, so that changes made to it
+        are still there if its page is dropped and read again."""
+        if self.position is not None:
+            self.kept[self.position] = self.current()
+
+    def number(self):
+        """Returns the cursor's place among the live entries, from 1."""
+        return self.position + 1 - sum(1 for position in self.deleted
+                                       if position < self.position)
+
+    def total(self):
+        """Returns how many live entries there are, as a string. A "+" is
+        added if part of the stream hasn't been read yet."""
+        if self.count is not None:
+            return str(self.count - len(self.deleted))
+        return str(self.read - len(self.deleted)) + "+"
+
+    def next(self):
+        """Moves to the next entry, going back to the first after the last.
+        """
+        if self.position is None:
+            return
+        position = self._live_from(self.position + 1, 1)
+        if position is None:
+            position = self._live_from(0, 1)
+        self.position = position
+
+    def previous(self):
+        """Moves to the previous entry, going round to the last after the
+        first (which reads the rest of a stream)."""
+        if self.position is None:
+            return
+        position = self._live_from(self.position - 1, -1)
+        if position is None:
+            position = self._last()
+        self.position = position
+
+    def delete(self):
+        """Leaves a tombstone for the entry at the cursor, and moves to the
+        entry before it (or after it, if it was the first)."""
+        if self.position is None:
+            return
+        self.deleted.add(self.position)
+        position = self._live_from(self.position - 1, -1)
+        if position is None:
+            position = self._live_from(self.position + 1, 1)
+        self.position = position
+
+    def jump(self, number):
+        """Moves to the live entry with the given number (from 1).
+
+        :return: True if there is such an entry, and False if not (in which
+                case the cursor doesn't move).
+        """
+        if number < 1:
+            return False
+        position = number - 1
+        for deleted in sorted(self.deleted):
+            if deleted <= position:
+                position += 1
+        if not self._fetch(position):
+            return False
+        self.position = position
+        return True
+
+    def jump_to_date(self, ordinal):
+        """Moves to the first live entry dated on a day, given as an ordinal.
+
+        :return: True if one was found, and False if not (in which case the
+                cursor doesn't move).
+        """
+        position = 0
+        while self._fetch(position):
+            if position not in self.deleted \
+                    and self._entry(position).date_ordinal == ordinal:
+                self.position = position
+                return True
+            position += 1
+        return False
@@ -0,0 +1,193 @@
+"""Compiling and running the patterns users search for.
+
+Compiled regexes are cached, so searching for the same thing again doesn't
+compile it again. Exact phrases don't use a regex at all: they're found
+with a plain substring search in each entry's case-folded text (see
+Entry.folded_text), so special characters in them mean nothing.
+
+A badly written regex can take practically forever on long notes, so
+searches with one are given a time budget. Where processes can be forked,
+the search runs in a child process, which can be killed when the budget
+runs out (or when the user presses Ctrl+C), even in the middle of a single
+match.
+
+Large searches can also be split into chunks of rows and run across a pool
+of processes, one per CPU (see parallel_filter()). Smaller ones stay in a
+single process, where starting the pool would take longer than the search.
+"""
+
+
+from functools import lru_cache
+import multiprocessing
+import os
+import re
+import signal
+import time
+
+
+SEARCH_BUDGET = 10
+PARALLEL_MIN_ENTRIES = 50000
+
+# The test and candidates for the current parallel_filter(), which forked
+# pool workers inherit instead of having them pickled
+_shared = None
+
+
+class SearchAborted(Exception):
+    """Raised when a search runs out of time or is stopped with Ctrl+C."""
+
+
+@lru_cache(maxsize=64)
+def compile_regex(pattern):
+    """Compiles a case-insensitive regex, or returns the cached one.
+
+    :raises re.error: if the pattern isn't valid.
+    """
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def phrase_regex(phrase):
+    """Returns a regex matching a phrase exactly (ignoring case), for the
+    indexes which take regexes."""
+    return compile_regex(re.escape(phrase))
+
+
+def phrase_matcher(phrase):
+    """Returns a test for entries whose task name or notes contain a phrase,
+    ignoring case."""
+    folded = phrase.casefold()
+    return lambda item: folded in item.folded_text
+
+
+def timed_filter(test, candidates, budget=SEARCH_BUDGET):
+    """Returns the candidates which pass a test, within a time budget.
+
+    :param test: a function taking an entry, like text_matcher() returns.
+    :param candidates: a list of entries.
+    :param budget: the most seconds the search may take.
+
+    :return: a list of the entries which passed, in their original order.
+    :raises SearchAborted: if the budget ran out or Ctrl+C was pressed.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return filter_until(test, candidates, time.monotonic() + budget)
+
+    # A forked child shares the candidates without copying them, and only
+    # sends back the positions of the ones which passed.
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    worker = context.Process(target=send_matches,
+                             args=(test, candidates, sender), daemon=True)
+    worker.start()
+    sender.close()
+    try:
+        if not receiver.poll(budget):
+            raise SearchAborted("The search took more than {} seconds, so it "
+                                "was stopped.".format(budget))
+        positions = receiver.recv()
+    except EOFError:
+        # The worker died without an answer, so search here instead, where
+        # any error will show
+        return filter_until(test, candidates, time.monotonic() + budget)
+    except KeyboardInterrupt:
+        raise SearchAborted("The search was stopped.")
+    finally:
+        worker.terminate()
+        worker.join()
+        receiver.close()
+    return [candidates[position] for position in positions]
+
+
+def ignore_interrupts():
+    """Leaves Ctrl+C to the parent, which then stops its worker processes."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def send_matches(test, candidates, sender):
+    """Runs in the worker process for timed_filter()."""
+    ignore_interrupts()
+    sender.send([position for position, item in enumerate(candidates)
+                 if test(item)])
+    sender.close()
+
+
+def filter_until(test, candidates, deadline):
+    """Returns the candidates which pass a test, checking the time between
+    entries (but not during one).
+
+    :param deadline: a time.monotonic() time to give up at.
+    """
+    matches = []
+    for count, item in enumerate(candidates):
+        if not count % 1000 and time.monotonic() > deadline:
+            raise SearchAborted("The search took too long, so it was "
+                                "stopped.")
+        if test(item):
+            matches.append(item)
+    return matches
+
+
+def partition(total, parts):
+    """Splits range(total) into about `parts` (start, stop) chunks of rows.
+    """
+    size = max(1, -(-total // parts))
+    return [(start, min(start + size, total))
+            for start in range(0, total, size)]
+
+
+def match_range(rows):
+    """Runs in a pool worker for parallel_filter(), and returns the
+    positions of the matches in one chunk of rows."""
+    test, candidates = _shared
+    start, stop = rows
+    return [position for position in range(start, stop)
+            if test(candidates[position])]
+
+
+def parallel_filter(test, candidates, workers=None, budget=None,
+                    min_entries=PARALLEL_MIN_ENTRIES):
+    """Returns the candidates which pass a test, using several processes.
+
+    The candidates are split into chunks of rows (four per worker, so an
+    uneven chunk doesn't hold up the rest), and a pool of forked workers
+    tests them. The matches come back as positions, which are put back
+    together in their original order.
+
+    Without fork, with fewer than two workers, or with fewer than
+    min_entries candidates, the test runs as a single process instead
+    (through timed_filter() if there's a budget).
+
+    :param workers: how many processes to use, or None for one per CPU.
+    :param budget: the most seconds the search may take, or None for no
+            limit.
+
+    :return: a list of the entries which passed, in their original order.
+    :raises SearchAborted: if the budget ran out or Ctrl+C was pressed.
+    """
+    global _shared
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 2 or len(candidates) < min_entries \
+            or "fork" not in multiprocessing.get_all_start_methods():
+        if budget is None:
+            return list(filter(test, candidates))
+        return timed_filter(test, candidates, budget)
+
+    context = multiprocessing.get_context("fork")
+    _shared = test, candidates
+    pool = context.Pool(workers, initializer=ignore_interrupts)
+    try:
+        result = pool.map_async(match_range,
+                                partition(len(candidates), workers * 4))
+        position_lists = result.get(budget)
+    except multiprocessing.TimeoutError:
+        raise SearchAborted("The search took more than {} seconds, so it "
+                            "was stopped.".format(budget))
+    except KeyboardInterrupt:
+        raise SearchAborted("The search was stopped.")
+    finally:
+        pool.terminate()
+        pool.join()
+        _shared = None
+    return [candidates[position] for positions in position_lists
+            for position in positions]
@@ -0,0 +1,198 @@
+"""Opt-in timing of the worklog's slow paths.
+
+Profiling is off unless $WORKLOG_PROFILE is set (or the --profile option is
+given to a command). While it's on, each stage below records how many
+times it ran, the total wall time, how many rows it handled, and the peak
+memory allocated while it ran. A summary is printed to stderr when the
+program exits. Peak memory comes from tracemalloc, which slows down every
+allocation, so the times are only worth comparing with each other.
+
+    load        reading the whole tasklog (EntryStore.refresh())
+    read cache  loading entries from the binary cache (see cache.py)
+    parse csv   turning CSV rows into Entry objects
+    stream      reading entries one at a time, as the search command does
+    save        writing changes or the whole tasklog
+    append      adding an entry
+    filter: *   each of the searches, with the rows they looked through
+
+Setting $WORKLOG_PROFILE to anything other than "1" (or giving --profile a
+file name) also runs cProfile, and writes its stats to that file, which
+"python -m pstats FILE" can read. That shows per-function detail, such as
+the time spent in Entry() or get_readable_date().
+
+When profiling is off, stage() hands back one shared do-nothing context
+manager, so the instrumented code pays for little more than a function
+call.
+"""
+
+
+import atexit
+import cProfile
+import os
+import sys
+import time
+import tracemalloc
+
+
+ENV_VAR = "WORKLOG_PROFILE"
+
+# {stage name: [calls, seconds, rows, peak bytes]}, or None while profiling
+# is off
+_totals = None
+# The stages currently running, innermost last
+_running = []
+_profiler = None
+
+
+class Stage:
+    """Times one run of a stage, for a with block.
+
+    Set rows inside the block if the number isn't known beforehand.
+
+    :param name: the stage's name in the summary.
+    :param rows: how many rows the stage handles, if known.
+    """
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.peak = 0
+        self.started = None
+
+    def __enter__(self):
+        # The peak is reset for each stage, so a stage inside another one
+        # passes the peak so far up to it first
+        if _running:
+            _running[-1].note_peak()
+        tracemalloc.reset_peak()
+        _running.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def note_peak(self):
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        self.note_peak()
+        _running.pop()
+        if _running:
+            _running[-1].peak = max(_running[-1].peak, self.peak)
+        totals = _totals.setdefault(self.name, [0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] += self.rows or 0
+        totals[3] = max(totals[3], self.peak)
+        return False
+
+
+class NoStage:
+    """What stage() returns while profiling is off."""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_STAGE = NoStage()
+
+
+class StreamStage:
+    """Times reading a stream of rows as a stage, for a for loop.
+
+    Only the time spent getting each row is counted, not the time the loop
+    spends on it, so a stream which is filtered and printed as it's read
+    still shows how long the reading took. Each stream counts as one call,
+    with no peak memory.
+
+    :param name: the stage's name in the summary.
+    :param items: the stream.
+    """
+    def __init__(self, name, items):
+        self.items = iter(items)
+        self.rows = 0
+        self.totals = _totals.setdefault(name, [0, 0.0, 0, 0])
+        self.totals[0] += 1
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            item = next(self.items)
+        finally:
+            self.totals[1] += time.perf_counter() - started
+        self.rows += 1
+        self.totals[2] += 1
+        return item
+
+
+def stage(name, rows=None):
+    """Returns a context manager timing a stage, or NO_STAGE if profiling
+    is off.
+
+    :param name: the stage's name in the summary.
+    :param rows: how many rows the stage handles, if known.
+    """
+    if _totals is None:
+        return NO_STAGE
+    return Stage(name, rows)
+
+
+def stream_stage(name, items):
+    """Returns a stream of rows, timed as a stage if profiling is on (see
+    StreamStage), or the stream itself if it's off."""
+    if _totals is None:
+        return items
+    return StreamStage(name, items)
+
+
+def enable(profile_path=None):
+    """Starts recording stages, and prints the summary at exit.
+
+    :param profile_path: a file to write cProfile stats to at exit, or None
+            to only time the stages.
+    """
+    global _totals, _profiler
+    if _totals is not None:
+        return
+    _totals = {}
+    tracemalloc.start()
+    if profile_path:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        atexit.register(dump_stats, profile_path)
+    atexit.register(print_summary)
+
+
+def enable_from_env():
+    """Turns profiling on if $WORKLOG_PROFILE is set."""
+    value = os.environ.get(ENV_VAR, "")
+    if value:
+        enable(None if value == "1" else value)
+
+
+def dump_stats(profile_path):
+    """Stops cProfile and writes its stats."""
+    _profiler.disable()
+    _profiler.dump_stats(profile_path)
+    print("Profile written to {} (read it with python -m pstats)".format(
+        profile_path), file=sys.stderr)
+
+
+def print_summary(output=None):
+    """Prints the totals for each stage, slowest first."""
+    output = output or sys.stderr
+    print("{:<20} {:>6} {:>10} {:>10} {:>10} {:>12} {:>9}".format(
+        "stage", "calls", "seconds", "ms/call", "rows", "rows/s", "peak MB"),
+        file=output)
+    for name, (calls, seconds, rows, peak) in sorted(
+            _totals.items(), key=lambda item: -item[1][1]):
+        print("{:<20} {:>6} {:>10.4f} {:>10.3f} {:>10} {:>12} "
+              "{:>9.1f}".format(
+            name, calls, seconds, seconds / calls * 1000, rows,
+            "{:.0f}".format(rows / seconds) if rows and seconds else "-",
+            peak / 1024 / 1024), file=output)
@@ -0,0 +1,262 @@
+"""A small query language for searching the tasklog.
+
+A query is a list of terms, all of which an entry has to match:
+
+    date:02/01/2017..02/28/2017 task:"accounts payable" mins:>=20
+    notes:/invoice \\d+/
+
+date:   a day (MM/DD/YYYY or YYYY-MM-DD), a range like FIRST..LAST (either
+        end can be left off), or a day with >=, <=, > or < in front.
+mins:   a number of minutes, in the same forms as a date.
+task:   text to find in the task name, ignoring case, or a /regex/.
+notes:  text or a /regex/ to find in the notes.
+
+Text or a /regex/ without a field is looked for in the task name and the
+notes. Values with spaces go in double quotes.
+
+A query is compiled into a single test, which checks the cheap date and
+minutes ranges before running any regexes. When indexes are given, the
+narrowest one picks out the candidates, so only those get tested.
+"""
+
+
+from datetime import date
+from operator import attrgetter
+import re
+import sys
+
+
+from entry import parse_date
+from patterns import compile_regex, parallel_filter, phrase_regex
+from profiling import stage
+
+
+TERM_PATTERN = re.compile(r"""
+    (?:(?P<field>[A-Za-z]+):)?
+    (?: "(?P<quoted>(?:[^"\\]|\\.)*)"
+      | /(?P<regex>(?:[^/\\]|\\.)*)/(?=\s|$)
+      | (?P<word>\S+) )
+""", re.VERBOSE)
+
+FIELDS = {
+    "date": "date",
+    "mins": "mins",
+    "minutes": "mins",
+    "task": "task_name",
+    "notes": "notes"
+}
+
+
+class QueryError(Exception):
+    """Raised for a query which can't be understood."""
+
+
+def parse_bounds(text, convert):
+    """Reads a value or range, like "20", ">=20", "<20", or "10..30".
+
+    :param convert: turns a single value into an int, raising ValueError
+            if it isn't valid.
+
+    :return: (low, high), inclusive. Either can be None for no limit.
+    """
+    for operator in (">=", "<=", ">", "<", "="):
+        if text.startswith(operator):
+            value = convert(text[len(operator):])
+            return {
+                ">=": (value, None),
+                "<=": (None, value),
+                ">": (value + 1, None),
+                "<": (None, value - 1),
+                "=": (value, value)
+            }[operator]
+    if ".." in text:
+        low, high = text.split("..", 1)
+        return (convert(low) if low else None,
+                convert(high) if high else None)
+    value = convert(text)
+    return value, value
+
+
+def day_number(text):
+    """Turns a date into an ordinal, for parse_bounds()."""
+    parsed = parse_date(text)
+    if parsed is None:
+        raise ValueError(text)
+    return parsed.toordinal()
+
+
+def narrow(bounds, low, high):
+    """Combines a (low, high) range with another, keeping the overlap."""
+    if low is not None and (bounds[0] is None or low > bounds[0]):
+        bounds[0] = low
+    if high is not None and (bounds[1] is None or high < bounds[1]):
+        bounds[1] = high
+
+
+class Query:
+    """A compiled query.
+
+    days and minutes are [low, high] ranges (inclusive, with None for no
+    limit), and texts is a list of (field, regex) pairs, where the field is
+    "task_name", "notes", or None for both.
+
+    :param text: the query, as described at the top of this module.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.days = [None, None]
+        self.minutes = [None, None]
+        self.texts = []
+
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            term = TERM_PATTERN.match(text, position)
+            position = term.end()
+            while position < len(text) and text[position].isspace():
+                position += 1
+            self._add_term(term)
+
+    def _add_term(self, term):
+        name = term.group("field")
+        field = None
+        if name is not None:
+            field = FIELDS.get(name.lower())
+            if field is None:
+                raise QueryError("Unknown field {!r}. Use date, mins, task or"
+                                 " notes.".format(name))
+
+        if term.group("regex") is not None:
+            value = term.group("regex").replace("\\/", "/")
+            try:
+                regex = compile_regex(value)
+            except re.error as error:
+                raise QueryError("{!r} is not a valid regex ({})".format(
+                    value, error))
+        elif term.group("quoted") is not None:
+            value = term.group("quoted").replace('\\"', '"')
+            regex = phrase_regex(value)
+        else:
+            value = term.group("word")
+            regex = phrase_regex(value)
+
+        if field == "date":
+            try:
+                narrow(self.days, *parse_bounds(value, day_number))
+            except ValueError:
+                raise QueryError("{!r} is not a date or range of dates "
+                                 "(MM/DD/YYYY)".format(value))
+            # Entries without a valid date never match a date term
+            narrow(self.days, 1, date.max.toordinal())
+        elif field == "mins":
+            try:
+                narrow(self.minutes, *parse_bounds(value, int))
+            except ValueError:
+                raise QueryError("{!r} is not a number or range of "
+                                 "minutes".format(value))
+        else:
+            self.texts.append((field, regex))
+
+    def matcher(self):
+        """Returns a single test for entries matching the whole query.
+
+        The date and minutes are compared first, then the task names, and
+        the notes last, since they're the longest text to search.
+        """
+        first_day, last_day = self.days
+        low, high = self.minutes
+        task_regexes = [regex for field, regex in self.texts
+                        if field == "task_name"]
+        note_regexes = [regex for field, regex in self.texts
+                        if field == "notes"]
+        any_regexes = [regex for field, regex in self.texts if field is None]
+
+        def matches(item):
+            if first_day is not None and item.date_ordinal < first_day:
+                return False
+            if last_day is not None and item.date_ordinal > last_day:
+                return False
+            if low is not None and item.mins_spent < low:
+                return False
+            if high is not None and item.mins_spent > high:
+                return False
+            for regex in task_regexes:
+                if regex.search(item.task_name) is None:
+                    return False
+            for regex in note_regexes:
+                if regex.search(item.notes) is None:
+                    return False
+            for regex in any_regexes:
+                if regex.search(item.task_name) is None \
+                        and regex.search(item.notes) is None:
+                    return False
+            return True
+        return matches
+
+    def search(self, entries, date_index=None, minutes_index=None,
+               text_index=None, budget=None):
+        """Finds the entries which match the query.
+
+        :param budget: the most seconds the search may take, or None for no
+                limit.
+
+        :return: a list of matching entries, in their original order.
+        :raises SearchAborted: if the budget runs out.
+        """
+        return self.filter(self.candidates(entries, date_index,
+                                           minutes_index, text_index),
+                           budget)
+
+    def candidates(self, entries, date_index=None, minutes_index=None,
+                   text_index=None):
+        """Picks out the entries which could match the query.
+
+        If the query has a date range and there's a date index, that picks
+        out the entries to test. Failing that, a minutes index is used for
+        a minutes range, then a text index for the regexes. Otherwise every
+        entry is a candidate.
+
+        :return: a list of entries, in their original order.
+        """
+        candidates = None
+        if self.days != [None, None] and date_index is not None:
+            first_day, last_day = self.days
+            if first_day > last_day:
+                return []
+            candidates = sorted(
+                date_index.between(date.fromordinal(first_day),
+                                   date.fromordinal(last_day)),
+                key=attrgetter("entry_ID"))
+        elif self.minutes != [None, None] and minutes_index is not None:
+            low, high = self.minutes
+            candidates = minutes_index.between(
+                -sys.maxsize if low is None else low,
+                sys.maxsize if high is None else high)
+        elif text_index is not None:
+            for field, regex in self.texts:
+                candidates = text_index.candidates(regex)
+                if candidates is not None:
+                    break
+        if candidates is None:
+            candidates = entries
+        return candidates
+
+    def filter(self, candidates, budget=None):
+        """Returns the candidates which match the query.
+
+        :param budget: the most seconds the search may take, or None for no
+                limit. With a budget, a large search is spread across the
+                CPUs (see patterns.parallel_filter()).
+
+        :raises SearchAborted: if the budget runs out.
+        """
+        with stage("filter: query", len(candidates)):
+            if budget is not None:
+                return parallel_filter(self.matcher(), candidates,
+                                       budget=budget)
+            return list(filter(self.matcher(), candidates))
+
+
+def compile_query(text):
+    """Compiles a query, raising QueryError if it isn't valid."""
+    return Query(text)
@@ -0,0 +1,101 @@
+"""Summaries of the time worked, by period and by task.
+
+A Summary totals up the entries and minutes for each day, week, month,
+year, and task name in a single pass over the entries, and can take in new
+entries as they're added without starting over.
+"""
+
+
+from datetime import date
+
+
+PERIODS = ("day", "week", "month", "year", "task")
+
+
+def format_minutes(minutes):
+    """Formats a number of minutes as hours and minutes, like "2:24"."""
+    return "{}:{:02}".format(minutes // 60, minutes % 60)
+
+
+def totals_line(label, count, minutes):
+    """Formats totals like "02/14/17 (3 entries, 2:24 worked)"."""
+    return "{} ({} {}, {} worked)".format(
+        label, count, "entry" if count == 1 else "entries",
+        format_minutes(minutes))
+
+
+def period_keys(ordinal):
+    """Returns the (day, week, month, year) keys for a date ordinal.
+
+    Weeks are ISO weeks, keyed by (year, week number). Entries without a
+    valid date (an ordinal of 0) get keys which sort before any real date.
+    """
+    if ordinal < 1:
+        return 0, (0, 0), (0, 0), 0
+    day = date.fromordinal(ordinal)
+    return ordinal, tuple(day.isocalendar()[:2]), (day.year, day.month), \
+        day.year
+
+
+def total_rows(period, groups):
+    """Turns {key: (entries, minutes)} totals for a period into rows, in
+    order, as dicts with the keys "period", "entries", "minutes", and
+    "worked" (as hours:minutes)."""
+    return [{
+        "period": period_label(period, key),
+        "entries": count,
+        "minutes": minutes,
+        "worked": format_minutes(minutes)
+    } for key, (count, minutes) in sorted(groups.items())]
+
+
+def period_label(period, key):
+    """Returns the text to display for a key of the given period."""
+    if period == "task":
+        return key
+    if key in (0, (0, 0)):
+        return "Unknown date"
+    if period == "day":
+        return date.fromordinal(key).strftime("%m/%d/%Y")
+    if period == "week":
+        return "{}-W{:02}".format(*key)
+    if period == "month":
+        return "{1:02}/{0}".format(*key)
+    return str(key)
+
+
+class Summary:
+    """Entry counts and minutes worked, grouped by period and by task.
+
+    totals maps each period name (see PERIODS) to a dict of
+    {key: [entries, minutes]}. The period keys for each date are worked out
+    once and cached, since many entries share the same day.
+    """
+    def __init__(self, entries=()):
+        self.totals = {period: {} for period in PERIODS}
+        self._keys = {}
+        for item in entries:
+            self.add(item)
+
+    def add(self, item):
+        """Counts one more entry in every group it belongs to."""
+        keys = self._keys.get(item.date_ordinal)
+        if keys is None:
+            keys = self._keys[item.date_ordinal] = \
+                period_keys(item.date_ordinal)
+        keys += (item.task_name,)
+        for period, key in zip(PERIODS, keys):
+            group = self.totals[period].get(key)
+            if group is None:
+                self.totals[period][key] = [1, item.mins_spent]
+            else:
+                group[0] += 1
+                group[1] += item.mins_spent
+
+    def day(self, ordinal):
+        """Returns the (entries, minutes) totals for one day."""
+        return tuple(self.totals["day"].get(ordinal, (0, 0)))
+
+    def rows(self, period):
+        """Returns the totals for a period, in order (see total_rows())."""
+        return total_rows(period, self.totals[period])
@@ -0,0 +1,514 @@
+"""A local HTTP server for the worklog, with a small JSON API.
+
+The server keeps one EntryStore in memory for every client, so searches
+and reports are answered from the loaded entries and indexes without
+reading the tasklog again. It only checks the tasklog's stamp before each
+request, to pick up changes made by other processes.
+
+Writes are batched. Adds, edits, and deletes wait in a queue for up to
+FLUSH_DELAY seconds, and then the whole queue is written under a single
+lock: the adds are appended, and the edits and deletes are saved as one
+ChangeSet. Each request gets its answer once its batch is on disk.
+
+Anything which touches the store (lookups, reports, and writes) runs in
+one worker thread, so the event loop keeps answering other connections
+while the tasklog is being read or an fsync is underway, and the store is
+never used by two threads at once. A search only uses that thread to pick
+out its candidates from the indexes. The regexes are then run on them in
+another thread, so a slow one doesn't hold up anything else. Searches get
+SEARCH_BUDGET seconds, like they do in the menus, and a search which runs
+out of time gets a 503.
+
+A CSV tasklog numbers its entries by their position in the file, so when
+another process rewrites the file (rather than appending to it), an ID a
+client already has might now belong to a different entry. When the server
+has had to reload the whole tasklog since an edit or delete was sent, or
+while it looks up an entry by ID, the request gets a 409 instead, and the
+client should search again for the entry's new ID.
+
+    GET    /entries?q=QUERY&limit=N   entries matching a query (see query.py)
+    POST   /entries                   add an entry
+    GET    /entries/ID                one entry
+    PATCH  /entries/ID                change some of an entry's fields
+    DELETE /entries/ID                delete an entry
+    GET    /report?by=PERIOD          totals by day, week, month, year or task
+
+Entries are sent and returned as JSON objects with the same keys as the
+"search --json" command ("entry_date", "task_name", "mins_spent", and
+"notes"), plus the "id" in responses. When adding an entry, the date
+defaults to today and the notes to nothing.
+
+The server only listens on 127.0.0.1 unless it's told otherwise. It has no
+authentication, so it's meant for the local machine.
+"""
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import json
+import signal
+import traceback
+from urllib.parse import parse_qs, urlsplit
+
+
+from entry import Entry, format_entry_date, parse_date
+from patterns import SEARCH_BUDGET, SearchAborted
+from query import QueryError, compile_query
+from report import PERIODS
+from store import ChangeSet, ConflictError, EntryStore, entry_row
+
+
+HOST = "127.0.0.1"
+PORT = 8631
+FLUSH_DELAY = 0.05
+SEARCH_LIMIT = 100
+MAX_BODY = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+FIELDS = ("entry_date", "task_name", "mins_spent", "notes")
+
+RENUMBERED = ("The tasklog was rewritten by another process, so entry IDs "
+              "may have changed. Search for the entry again.")
+
+
+class HttpError(Exception):
+    """Raised to answer a request with an error status.
+
+    :param status: the HTTP status code.
+    :param message: the error, which is sent back as {"error": message}.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def entry_json(item):
+    """Returns an entry as a dict for a JSON response."""
+    row = entry_row(item)
+    row["id"] = item.entry_ID
+    return row
+
+
+def find_entry(entries, entry_ID):
+    """Finds an entry by its ID.
+
+    The store's list is always in ID order, so this is a binary search.
+
+    :return: the Entry, or None if there's no entry with that ID.
+    """
+    low = 0
+    high = len(entries)
+    while low < high:
+        middle = (low + high) // 2
+        if entries[middle].entry_ID < entry_ID:
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(entries) and entries[low].entry_ID == entry_ID:
+        return entries[low]
+    return None
+
+
+def entry_fields(data, partial=False):
+    """Checks the fields of an entry sent as JSON.
+
+    :param data: the decoded JSON.
+    :param partial: True for an edit, where any fields can be left out.
+
+    :return: a dict of {field: value}, with the date in the tasklog's
+            MM/DD/YY form.
+    :raises HttpError: if a field is missing, unknown, or invalid.
+    """
+    if not isinstance(data, dict):
+        raise HttpError(400, "Send the entry as a JSON object.")
+    unknown = set(data) - set(FIELDS)
+    if unknown:
+        raise HttpError(400, "Unknown fields: {}. Use {}.".format(
+            ", ".join(sorted(unknown)), ", ".join(FIELDS)))
+
+    fields = {}
+    if "entry_date" in data:
+        parsed = parse_date(data["entry_date"])
+        if parsed is None:
+            raise HttpError(400, "entry_date must be a date (MM/DD/YYYY).")
+        fields["entry_date"] = format_entry_date(parsed)
+    elif not partial:
+        fields["entry_date"] = format_entry_date(date.today())
+    if "task_name" in data:
+        if not isinstance(data["task_name"], str) \
+                or not data["task_name"].strip():
+            raise HttpError(400, "task_name can't be blank.")
+        fields["task_name"] = data["task_name"]
+    elif not partial:
+        raise HttpError(400, "task_name is required.")
+    if "mins_spent" in data:
+        minutes = data["mins_spent"]
+        if type(minutes) is not int or minutes < 1:
+            raise HttpError(400, "mins_spent must be a whole number greater "
+                                 "than 0.")
+        fields["mins_spent"] = minutes
+    elif not partial:
+        raise HttpError(400, "mins_spent is required.")
+    if "notes" in data:
+        if not isinstance(data["notes"], str):
+            raise HttpError(400, "notes must be a string.")
+        fields["notes"] = data["notes"]
+    elif not partial:
+        fields["notes"] = ""
+    return fields
+
+
+def first_param(params, name, default=None):
+    """Returns the first value of a query string parameter."""
+    return params.get(name, [default])[0]
+
+
+class WorklogServer:
+    """Answers HTTP requests from an EntryStore.
+
+    :param store: the EntryStore to serve. It's loaded straight away, in
+            the store's thread.
+    :param flush_delay: how many seconds writes wait to be batched together.
+    :param search_budget: the most seconds a search may take.
+    """
+    def __init__(self, store, flush_delay=FLUSH_DELAY,
+                 search_budget=SEARCH_BUDGET):
+        self.store = store
+        self.flush_delay = flush_delay
+        self.search_budget = search_budget
+        # The one thread which uses the store
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # (kind, payload, reloads, future) for each write waiting to be
+        # flushed, where reloads is store.reloads when it was sent
+        self.pending = []
+        self.flush_handle = None
+        self.flush_task = None
+        self.executor.submit(store.refresh).result()
+
+    async def start(self, host=HOST, port=PORT):
+        """Starts listening, and returns the asyncio Server."""
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """Answers the requests on one connection, keeping it open between
+        them unless the client asks to close it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = \
+                        request_line.decode("latin-1").split()
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.send(writer, 400, {"error": "Bad request."},
+                                    False)
+                    break
+                if length > MAX_BODY:
+                    await self.send(writer, 413,
+                                    {"error": "The request is too large."},
+                                    False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.route(method, target, body)
+                except HttpError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except Exception as error:
+                    # A bug, or something wrong with the tasklog. The client
+                    # still gets an answer, and the details go to stderr.
+                    traceback.print_exc()
+                    status, payload = 500, {"error": str(error)}
+                keep_alive = version == "HTTP/1.1" \
+                    and headers.get("connection", "").lower() != "close"
+                await self.send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # The server is stopping. Anything this connection queued has
+            # already been flushed, so there's nothing left to clean up.
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, payload, keep_alive):
+        """Writes a JSON response."""
+        body = json.dumps(payload).encode()
+        writer.write("HTTP/1.1 {} {}\r\n"
+                     "Content-Type: application/json\r\n"
+                     "Content-Length: {}\r\n"
+                     "Connection: {}\r\n\r\n".format(
+                         status, STATUS_TEXT[status], len(body),
+                         "keep-alive" if keep_alive else "close").encode()
+                     + body)
+        await writer.drain()
+
+    async def route(self, method, target, body):
+        """Handles one request.
+
+        :return: (status, payload), where payload is turned into JSON.
+        :raises HttpError: for any error response.
+        """
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/")
+        params = parse_qs(parts.query)
+
+        if path == "/entries":
+            if method == "GET":
+                return 200, await self.search(params)
+            if method == "POST":
+                fields = entry_fields(self.read_json(body))
+                new_item = Entry(0, fields["entry_date"], fields["task_name"],
+                                 fields["mins_spent"], fields["notes"])
+                return 201, await self.write("add", new_item)
+            raise HttpError(405, "Use GET or POST.")
+
+        if path.startswith("/entries/"):
+            try:
+                entry_ID = int(path[len("/entries/"):])
+            except ValueError:
+                raise HttpError(404, "There is no such entry.")
+            if method == "GET":
+                return 200, await self.run(self.get_entry, entry_ID)
+            if method == "PATCH":
+                fields = entry_fields(self.read_json(body), partial=True)
+                return 200, await self.write("edit", (entry_ID, fields))
+            if method == "DELETE":
+                return 200, await self.write("delete", entry_ID)
+            raise HttpError(405, "Use GET, PATCH or DELETE.")
+
+        if path == "/report":
+            if method != "GET":
+                raise HttpError(405, "Use GET.")
+            period = first_param(params, "by", "day")
+            if period not in PERIODS:
+                raise HttpError(400, "by must be one of: {}.".format(
+                    ", ".join(PERIODS)))
+            return 200, await self.run(self.report, period)
+
+        raise HttpError(404, "Nothing is at {}.".format(parts.path))
+
+    def read_json(self, body):
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise HttpError(400, "The request body isn't valid JSON.")
+
+    def run(self, function, *args):
+        """Runs a function which uses the store in the store's thread.
+
+        :return: an awaitable for the function's result.
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args)
+
+    def renumbered(self, reloads):
+        """Returns True if an ID sent when store.reloads was `reloads` might
+        now point at a different entry."""
+        return self.store.backend.rewrites_on_apply \
+            and self.store.reloads != reloads
+
+    def get_entry(self, entry_ID):
+        """Looks up one entry. Runs in the store's thread."""
+        reloads = self.store.reloads
+        item = find_entry(self.store.refresh(), entry_ID)
+        if self.renumbered(reloads):
+            raise HttpError(409, RENUMBERED)
+        if item is None:
+            raise HttpError(404, "There is no entry {}.".format(entry_ID))
+        return entry_json(item)
+
+    def report(self, period):
+        """Totals the entries by a period. Runs in the store's thread."""
+        self.store.refresh()
+        return {"by": period, "rows": self.store.summary().rows(period)}
+
+    def candidates(self, query):
+        """Picks out a query's candidates with the store's indexes. Runs in
+        the store's thread.
+
+        :return: a new list, since when no index narrows the query, the
+                candidates are the store's own list, which a write may
+                change while they're being filtered in another thread.
+        """
+        store = self.store
+        return list(query.candidates(store.refresh(), store.date_index(),
+                                     store.minutes_index(),
+                                     store.text_index()))
+
+    async def search(self, params):
+        """Runs a query against the loaded entries and their indexes, within
+        the search budget.
+
+        :return: the number of matches, and the first `limit` of them.
+        """
+        try:
+            query = compile_query(first_param(params, "q", ""))
+            limit = int(first_param(params, "limit", SEARCH_LIMIT))
+        except QueryError as error:
+            raise HttpError(400, str(error))
+        except ValueError:
+            raise HttpError(400, "limit must be a number.")
+        candidates = await self.run(self.candidates, query)
+        try:
+            matches = await asyncio.get_running_loop().run_in_executor(
+                None, query.filter, candidates, self.search_budget)
+        except SearchAborted as error:
+            raise HttpError(503, str(error))
+        return {"count": len(matches),
+                "entries": [entry_json(item) for item in matches[:limit]]}
+
+    def write(self, kind, payload):
+        """Queues a write for the next flush.
+
+        :param kind: "add", "edit", or "delete".
+        :return: a future for the write's response payload.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((kind, payload, self.store.reloads, future))
+        if self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.flush_delay,
+                                                self.start_flush)
+        return future
+
+    def start_flush(self):
+        """Starts flushing the queue, once the flush delay is up."""
+        self.flush_handle = None
+        self.flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Writes every queued change in the store's thread, and answers
+        the requests which sent them."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        # Requests whose connections have gone are dropped
+        pending = [write for write in self.pending if not write[-1].done()]
+        self.pending = []
+        if not pending:
+            return
+        try:
+            results = await self.run(self.write_batch, pending)
+        except Exception as error:
+            for kind, payload, reloads, future in pending:
+                if not future.done():
+                    future.set_exception(HttpError(500, str(error)))
+            raise
+        for future, result in results:
+            if future.done():
+                continue
+            if isinstance(result, HttpError):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        """Writes anything still queued, and stops the store's thread."""
+        await self.flush()
+        if self.flush_task is not None:
+            await self.flush_task
+        self.executor.shutdown()
+
+    def write_batch(self, pending):
+        """Writes a batch of changes, holding the lock once for them all.
+        Runs in the store's thread.
+
+        Adds are appended one after another. Edits and deletes are gathered
+        into one ChangeSet, so the tasklog is saved once however many there
+        are. If the tasklog had to be reloaded since an edit or delete was
+        sent, it's refused with a 409, since its ID may be out of date. If
+        another process rewrote the tasklog while the changes were being
+        made, they're all refused with a 409, like save_changes() does in
+        the menus.
+
+        :param pending: (kind, payload, reloads, future) for each write.
+        :return: a list of (future, result), where the result is the
+                response payload or an HttpError.
+        """
+        store = self.store
+        changes = ChangeSet()
+        results = []
+        changed = []
+        with store.backend.lock():
+            # Catching up first means every add below gets its ID
+            entries = store.refresh()
+            for kind, payload, reloads, future in pending:
+                if kind == "add":
+                    store.add(payload)
+                    results.append((future, entry_json(payload)))
+                    continue
+                entry_ID = payload[0] if kind == "edit" else payload
+                item = find_entry(entries, entry_ID)
+                if self.renumbered(reloads):
+                    results.append((future, HttpError(409, RENUMBERED)))
+                elif item is None or item.entry_ID in changes.deleted:
+                    results.append((future, HttpError(
+                        404, "There is no entry {}.".format(entry_ID))))
+                elif kind == "edit":
+                    for field, value in payload[1].items():
+                        setattr(item, field, value)
+                    changes.edit(item)
+                    changed.append((future, entry_json(item)))
+                else:
+                    changes.delete(item)
+                    changed.append((future, {"deleted": entry_ID}))
+            try:
+                store.apply(changes)
+            except ConflictError as error:
+                changed = [(future, HttpError(409, str(error)))
+                           for future, result in changed]
+        return results + changed
+
+
+def serve(path, host=HOST, port=PORT):
+    """Serves a tasklog until Ctrl+C is pressed, writing anything still
+    queued before stopping."""
+    async def main():
+        server = WorklogServer(EntryStore(path))
+        listener = await server.start(host, port)
+        print("Serving {} at http://{}:{}/ (Ctrl+C to stop)".format(
+            path, host, port))
+        stopping = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT,
+                                                          stopping.set)
+        except NotImplementedError:
+            # Windows can't, so Ctrl+C interrupts the loop instead
+            pass
+        try:
+            async with listener:
+                await stopping.wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,204 @@
+"""Incremental backups of the tasklog, kept as timestamped snapshots.
+
+A snapshot splits the tasklog's CSV rows into chunks, and saves each chunk
+in a file named after the hash of its contents. Chunks which are already
+saved from an earlier snapshot aren't written again, so backing up a large
+tasklog only writes the parts which changed since the last one.
+
+Chunks end after any row whose checksum is a multiple of CHUNK_ROWS (or
+once a chunk gets too long), rather than every so many rows. That way an
+edit or deletion only changes the chunk it's in, and the chunks after it
+still line up with the saved ones.
+
+A tasklog kept in monthly shards (see store.ShardedBackend) uses each
+shard as a chunk instead, so shards which haven't changed aren't even read.
+
+Each snapshot itself is a small JSON file listing its chunks in order.
+Every file is written to a temporary name and then renamed into place, so
+a crash during a backup can't damage the tasklog or an earlier snapshot.
+"""
+
+
+from datetime import datetime
+import csv
+import hashlib
+import io
+import json
+import os
+import zlib
+
+
+from store import (CsvBackend, FIELDNAMES, csv_header, row_entries,
+                   write_text)
+
+
+BACKUP_DIR = "backups"
+CHUNK_ROWS = 256
+MAX_CHUNK_ROWS = CHUNK_ROWS * 4
+KEEP_SNAPSHOTS = 10
+
+
+def iter_chunks(entries):
+    """Splits entries into chunks of CSV rows.
+
+    :return: yields (hash, text, rows) for each chunk, where text is the
+            chunk's rows exactly as they appear in the tasklog, and rows is
+            how many there are.
+    """
+    row_buffer = io.StringIO()
+    csvwriter = csv.writer(row_buffer)
+    rows = []
+    for item in entries:
+        row_buffer.seek(0)
+        row_buffer.truncate()
+        # The same row csv.DictWriter writes for entry_row(item), but faster
+        csvwriter.writerow((item.entry_date, item.task_name, item.mins_spent,
+                            item.notes))
+        row = row_buffer.getvalue()
+        rows.append(row)
+        if zlib.crc32(row.encode()) % CHUNK_ROWS == 0 \
+                or len(rows) >= MAX_CHUNK_ROWS:
+            text = "".join(rows)
+            yield hashlib.sha1(text.encode()).hexdigest(), text, len(rows)
+            rows = []
+    if rows:
+        text = "".join(rows)
+        yield hashlib.sha1(text.encode()).hexdigest(), text, len(rows)
+
+
+class SnapshotStore:
+    """The snapshots and chunks kept in a backup directory.
+
+    Snapshots are named after the time they were taken (YYYYMMDD-HHMMSS),
+    so sorting the names puts them in order.
+
+    :param directory: where to keep the backups.
+    """
+    def __init__(self, directory=BACKUP_DIR):
+        self.directory = directory
+        self.chunk_dir = os.path.join(directory, "chunks")
+        self.snapshot_dir = os.path.join(directory, "snapshots")
+
+    def names(self):
+        """Returns the names of the snapshots, oldest first."""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.snapshot_dir)
+                      if name.endswith(".json"))
+
+    def _snapshot_path(self, name):
+        return os.path.join(self.snapshot_dir, name + ".json")
+
+    def _chunk_path(self, chunk_hash):
+        return os.path.join(self.chunk_dir, chunk_hash)
+
+    def manifest(self, name):
+        """Returns a snapshot's details as a dict, with the keys "name",
+        "created", "entries", and "chunks" (the hashes, in order)."""
+        with open(self._snapshot_path(name)) as file:
+            return json.load(file)
+
+    def create(self, entries, chunks=None):
+        """Takes a new snapshot of some entries.
+
+        Only chunks which aren't saved yet are written. The entries can be
+        any iterable, such as a backend's stream().
+
+        :param chunks: the backend's own chunks, from its snapshot_chunks(),
+                to use instead of splitting up the entries. Each is
+                (hash, rows, read), where read() returns its text.
+
+        :return: the new snapshot's manifest, plus "written", the number of
+                chunks which had to be written.
+        """
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        taken = set(self.names())
+        if name in taken:
+            suffix = 2
+            while "{}-{}".format(name, suffix) in taken:
+                suffix += 1
+            name = "{}-{}".format(name, suffix)
+
+        if chunks is None:
+            chunks = ((chunk_hash, rows, lambda text=text: text)
+                      for chunk_hash, text, rows in iter_chunks(entries))
+        hashes = []
+        count = 0
+        written = 0
+        for chunk_hash, rows, read in chunks:
+            hashes.append(chunk_hash)
+            count += rows
+            if not os.path.exists(self._chunk_path(chunk_hash)):
+                write_text(self._chunk_path(chunk_hash), read())
+                written += 1
+        manifest = {
+            "name": name,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "entries": count,
+            "chunks": hashes
+        }
+        write_text(self._snapshot_path(name), json.dumps(manifest))
+        manifest["written"] = written
+        return manifest
+
+    def chunk_texts(self, manifest):
+        """Yields the CSV text of each of a snapshot's chunks, in order."""
+        for chunk_hash in manifest["chunks"]:
+            with open(self._chunk_path(chunk_hash), newline="") as file:
+                yield file.read()
+
+    def entries(self, manifest):
+        """Yields the entries saved in a snapshot, numbered from 1."""
+        lines = (line for text in self.chunk_texts(manifest)
+                 for line in io.StringIO(text, newline=""))
+        yield from row_entries(csv.DictReader(lines, fieldnames=FIELDNAMES))
+
+    def restore(self, name, store):
+        """Puts a snapshot's entries back into an EntryStore.
+
+        If the store's entries already match the snapshot, nothing is
+        written. A CSV tasklog is put back together straight from the
+        chunks, without reading the entries in and writing them out again.
+        A sharded tasklog only has the shards which differ rewritten.
+
+        :return: True if the tasklog was changed, or False if it already
+                matched the snapshot.
+        """
+        manifest = self.manifest(name)
+        with store.backend.lock():
+            chunks = store.backend.snapshot_chunks()
+            if chunks is None:
+                chunks = iter_chunks(store.refresh())
+            current = [chunk[0] for chunk in chunks]
+            if current == manifest["chunks"]:
+                return False
+            if isinstance(store.backend, CsvBackend):
+                store.backend.save_text(csv_header() + "".join(
+                    self.chunk_texts(manifest)))
+                store.invalidate()
+            else:
+                store.replace(list(self.entries(manifest)))
+        return True
+
+    def prune(self, keep=KEEP_SNAPSHOTS):
+        """Deletes all but the newest snapshots, and any chunks which no
+        remaining snapshot uses. The newest one is always kept, even if
+        keep is less than 1.
+
+        :return: the number of snapshots deleted.
+        """
+        names = self.names()
+        old_names = names[:-max(keep, 1)]
+        for name in old_names:
+            os.remove(self._snapshot_path(name))
+        if not old_names:
+            return 0
+        in_use = set()
+        for name in self.names():
+            in_use.update(self.manifest(name)["chunks"])
+        for chunk_hash in os.listdir(self.chunk_dir):
+            if chunk_hash not in in_use:
+                os.remove(self._chunk_path(chunk_hash))
+        return len(old_names)
@@ -0,0 +1,269 @@
+"""A SQLite database backend for the worklog.
+
+Entries live in a single table, indexed on the date, the task name, and the
+minutes spent. When SQLite has FTS5, the task names and notes are also kept
+in a trigram full-text table, which can find any piece of text of three or
+more characters. Searches are run as SQL queries, so nothing has to be
+scanned or indexed in Python.
+
+An entry's ID is its rowid in the table.
+"""
+
+
+from contextlib import nullcontext
+import sqlite3
+
+
+from entry import Entry
+from index import TextIndex, required_words
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    entry_date TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    task_name TEXT NOT NULL,
+    mins_spent INTEGER NOT NULL,
+    notes TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_day ON entries (day);
+CREATE INDEX IF NOT EXISTS entries_task_name ON entries (task_name);
+CREATE INDEX IF NOT EXISTS entries_mins_spent ON entries (mins_spent);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    task_name, notes, content='entries', content_rowid='id',
+    tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, task_name, notes)
+        VALUES (new.id, new.task_name, new.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, task_name, notes)
+        VALUES ('delete', old.id, old.task_name, old.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_fts_update AFTER UPDATE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, task_name, notes)
+        VALUES ('delete', old.id, old.task_name, old.notes);
+    INSERT INTO entries_fts (rowid, task_name, notes)
+        VALUES (new.id, new.task_name, new.notes);
+END;
+"""
+
+COLUMNS = "id, entry_date, task_name, mins_spent, notes"
+
+# How many entries a paged stream reads at once (see open_stream())
+PAGE_ROWS = 1000
+
+
+class SqliteBackend:
+    """Keeps entries in a SQLite database, with the same methods as
+    store.CsvBackend.
+
+    The indexes it hands out run their lookups as queries against the
+    database, which keeps its own indexes up to date. SQLite also does its
+    own locking, and changes are saved row by row, so other processes'
+    changes to other rows are never written over.
+
+    The connection isn't tied to the thread which opened it, since the
+    server (see server.py) opens the tasklog before handing it to its store
+    thread. Only one thread may use a backend at a time.
+    """
+    rewrites_on_apply = False
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # This SQLite was built without FTS5 (or is older than 3.34)
+            self.has_fts = False
+
+    def stamp(self):
+        """Returns something which changes whenever another connection
+        writes to the database."""
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def lock(self, shared=False):
+        """Returns a context manager which does nothing, since SQLite locks
+        the database itself."""
+        return nullcontext()
+
+    def appended_at_end(self, stamp):
+        """Returns False, since data_version can't tell new rows apart from
+        other changes. IDs are rowids, though, so they never change."""
+        return False
+
+    def appended_since(self, stamp, first_id):
+        """Returns None, since data_version can't tell new rows apart from
+        other changes."""
+        return None
+
+    def query(self, clauses="ORDER BY id", parameters=()):
+        """Yields Entry objects for the rows picked out by some SQL clauses.
+
+        :param clauses: anything which can follow "SELECT ... FROM entries",
+                like a WHERE and an ORDER BY.
+        """
+        rows = self.connection.execute(
+            "SELECT {} FROM entries {}".format(COLUMNS, clauses), parameters)
+        for row in rows:
+            yield Entry(*row)
+
+    def load(self):
+        return list(self.query())
+
+    def stream(self):
+        return self.query()
+
+    def open_stream(self):
+        """Returns the entries to be read one page at a time, with a query
+        for each page, so no read is left open on the database between
+        them (which would hold up other connections' writes).
+
+        :return: (stamp, entries).
+        """
+        return self.stamp(), self._pages()
+
+    def _pages(self):
+        last_id = 0
+        while True:
+            page = list(self.query("WHERE id > ? ORDER BY id LIMIT ?",
+                                   (last_id, PAGE_ROWS)))
+            yield from page
+            if len(page) < PAGE_ROWS:
+                return
+            last_id = page[-1].entry_ID
+
+    def stream_between(self, first_date, last_date):
+        """Yields the entries dated from first_date to last_date, inclusive,
+        using the index on the day column."""
+        return self.query("WHERE day BETWEEN ? AND ? ORDER BY id",
+                          (first_date.toordinal(), last_date.toordinal()))
+
+    def snapshot_chunks(self):
+        """Returns None, since a database has no chunks for a snapshot to
+        reuse."""
+        return None
+
+    def append(self, new_item):
+        """Inserts a new entry, and sets its ID to the new rowid."""
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO entries (entry_date, day, task_name, mins_spent,"
+                " notes) VALUES (?, ?, ?, ?, ?)",
+                (new_item.entry_date, new_item.date_ordinal,
+                 new_item.task_name, new_item.mins_spent, new_item.notes))
+        new_item.entry_ID = cursor.lastrowid
+
+    def append_many(self, new_items):
+        """Inserts a stream of entries in one transaction, setting their IDs.
+
+        :return: the number of entries inserted.
+        """
+        count = 0
+        with self.connection:
+            for item in new_items:
+                cursor = self.connection.execute(
+                    "INSERT INTO entries (entry_date, day, task_name,"
+                    " mins_spent, notes) VALUES (?, ?, ?, ?, ?)",
+                    (item.entry_date, item.date_ordinal, item.task_name,
+                     item.mins_spent, item.notes))
+                item.entry_ID = cursor.lastrowid
+                count += 1
+        return count
+
+    def save(self, updated_list):
+        """Replaces every row with the given entries, in one transaction."""
+        with self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.executemany(
+                "INSERT INTO entries (id, entry_date, day, task_name,"
+                " mins_spent, notes) VALUES (?, ?, ?, ?, ?, ?)",
+                ((item.entry_ID, item.entry_date, item.date_ordinal,
+                  item.task_name, item.mins_spent, item.notes)
+                 for item in updated_list))
+
+    def apply(self, changes, updated_list):
+        """Saves a ChangeSet by updating and deleting just the changed rows."""
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM entries WHERE id = ?",
+                ((entry_ID,) for entry_ID in changes.deleted))
+            self.connection.executemany(
+                "UPDATE entries SET entry_date = ?, day = ?, task_name = ?,"
+                " mins_spent = ?, notes = ? WHERE id = ?",
+                ((item.entry_date, item.date_ordinal, item.task_name,
+                  item.mins_spent, item.notes, item.entry_ID)
+                 for item in changes.edited.values()))
+
+    def date_index(self, entries):
+        return SqliteDateIndex(self)
+
+    def minutes_index(self, entries):
+        return SqliteMinutesIndex(self)
+
+    def text_index(self, entries):
+        if self.has_fts:
+            return SqliteTextIndex(self)
+        return TextIndex(entries)
+
+
+class SqliteIndex:
+    """The base for indexes which look things up in the database."""
+    def __init__(self, backend):
+        self.backend = backend
+
+    def add(self, item):
+        """Does nothing, since the database indexes new rows itself."""
+
+    def apply(self, changes):
+        """Does nothing, since the database indexes changed rows itself."""
+
+
+class SqliteDateIndex(SqliteIndex):
+    """Works like index.DateIndex, using the database's date index."""
+    def between(self, first_date, last_date):
+        return list(self.backend.query(
+            "WHERE day BETWEEN ? AND ? ORDER BY day, id",
+            (first_date.toordinal(), last_date.toordinal())))
+
+    def on(self, ordinal):
+        return list(self.backend.query("WHERE day = ? ORDER BY id",
+                                       (ordinal,)))
+
+    def dates(self):
+        # SQLite takes entry_date from the row with the MIN(id)
+        rows = self.backend.connection.execute(
+            "SELECT entry_date, MIN(id) FROM entries GROUP BY day "
+            "ORDER BY day")
+        return [row[0] for row in rows]
+
+
+class SqliteMinutesIndex(SqliteIndex):
+    """Works like index.MinutesIndex, using the database's minutes index."""
+    def between(self, low, high):
+        return list(self.backend.query(
+            "WHERE mins_spent BETWEEN ? AND ? ORDER BY id", (low, high)))
+
+
+class SqliteTextIndex(SqliteIndex):
+    """Works like index.TextIndex, using the full-text table.
+
+    The trigram tokenizer matches any piece of text, but only pieces three
+    characters or longer, so shorter words from the pattern are left out.
+    """
+    def candidates(self, regex):
+        words = [word for word in required_words(regex) if len(word) >= 3]
+        if not words:
+            return None
+        match = " AND ".join('"{}"'.format(word) for word in words)
+        return list(self.backend.query(
+            "WHERE id IN (SELECT rowid FROM entries_fts "
+            "WHERE entries_fts MATCH ?) ORDER BY id", (match,)))
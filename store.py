@@ -0,0 +1,1043 @@
+"""Reading, writing, and caching the tasklog.
+
+The CSV helpers work on any path, so the same code handles "tasklog.csv"
+and "backup.csv". The EntryStore keeps a loaded tasklog in memory between
+menu actions, and only re-reads the file when it changes on disk. It can
+keep the tasklog in a CSV file, a SQLite database (see sqlite_store.py),
+or a folder of CSV files with one for each month (see ShardedBackend),
+depending on the name it is given.
+
+Several processes can share one tasklog. Writes to a CSV tasklog take an
+exclusive lock on a separate ".lock" file, and reads take a shared one, so
+reads still run side by side. Before the EntryStore writes, it checks
+whether anyone else has written since it last read the file. Entries other
+processes appended are merged into its list. Anything else is a conflict,
+and its changes are refused rather than written over someone else's.
+"""
+
+
+from contextlib import contextmanager
+import csv
+from itertools import chain, islice
+import hashlib
+import io
+import json
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so tasklogs aren't locked there
+    fcntl = None
+
+
+from analytics import Analytics
+from cache import csv_source, read_cache, write_cache
+from entry import Entry
+from index import DateIndex, MinutesIndex, TextIndex
+from profiling import stage
+from report import Summary
+from sqlite_store import PAGE_ROWS, SqliteBackend
+
+
+FIELDNAMES = ["entry_date", "task_name", "mins_spent", "notes"]
+
+
+class ConflictError(Exception):
+    """Raised when changes can't be saved because another process has
+    rewritten the tasklog since it was read."""
+
+
+class FileLock:
+    """A lock on a file which is shared between processes.
+
+    The lock is held on a separate file (the path plus ".lock"), since the
+    file itself gets replaced by atomic saves. Holding the lock again from
+    inside a hold() block reuses the lock already held.
+
+    :param path: the file to guard.
+    """
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self.depth = 0
+        self.lock_file = None
+
+    @contextmanager
+    def hold(self, shared=False):
+        """Holds the lock for a with block.
+
+        :param shared: if True, other shared holders are let in at the same
+                time. Use it for reads, and an exclusive lock for writes.
+        """
+        if self.depth or fcntl is None:
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+            return
+
+        self.lock_file = open(self.path, "a")
+        try:
+            fcntl.flock(self.lock_file,
+                        fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+        finally:
+            # The lock is released outright, rather than by closing the
+            # file, in case a forked search process has a copy of it open
+            if fcntl is not None:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def entry_row(item):
+    """Returns the CSV row (as a dict) for an Entry."""
+    return {
+        "entry_date": item.entry_date,
+        "task_name": item.task_name,
+        "mins_spent": item.mins_spent,
+        "notes": item.notes
+    }
+
+
+def row_entries(rows, first_id=1):
+    """Turns CSV rows (as dicts) into Entry objects, numbered from first_id.
+
+    A row whose minutes aren't a whole number (like a blank cell) is still
+    read, with 0 minutes, so the rest of it isn't lost the next time the
+    tasklog is saved. A warning is printed for it.
+    """
+    for count, row in enumerate(rows, first_id):
+        try:
+            mins_spent = int(row["mins_spent"])
+        except (TypeError, ValueError):
+            print("Warning: line {} of the tasklog has mins_spent {!r}, "
+                  "which isn't a whole number, so it's read as 0.".format(
+                      getattr(rows, "line_num", "?"), row["mins_spent"]),
+                  file=sys.stderr)
+            mins_spent = 0
+        yield Entry(
+            count,
+            row["entry_date"],
+            str(row["task_name"]),
+            mins_spent,
+            row["notes"]
+        )
+
+
+def iter_entries(path):
+    """Reads a CSV file one row at a time, yielding Entry objects.
+
+    Entries are numbered from 1, in the order they appear in the file. Only
+    the current row is held in memory, so this suits one-off passes over
+    very large files.
+
+    :param path: the CSV file to read. A missing file yields nothing.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path) as csvfile:
+        yield from row_entries(csv.DictReader(csvfile))
+
+
+def read_entries(path):
+    """Reads a CSV file and returns a list of Entry objects.
+
+    :param path: the CSV file to read.
+
+    :return: A list of Entry objects, or an empty list if there's no file.
+    """
+    return list(iter_entries(path))
+
+
+def locked_pages(lock, entries, files=()):
+    """Yields entries from an iterator, reading PAGE_ROWS at a time while
+    holding a shared lock, and none while they're being used.
+
+    :param lock: a backend's lock() method.
+    :param files: files the entries are read from, to close at the end.
+    """
+    try:
+        while True:
+            with lock(shared=True):
+                page = list(islice(entries, PAGE_ROWS))
+            yield from page
+            if len(page) < PAGE_ROWS:
+                return
+    finally:
+        for file in files:
+            file.close()
+
+
+def write_entries(path, updated_list):
+    """Writes a complete list of entries to a CSV file.
+
+    The list is written to a temporary file first, which then replaces the
+    file in one step. A crash part-way through the write leaves the old file
+    untouched instead of a half-written one.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as csvfile:
+        csvwriter = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+
+        csvwriter.writeheader()
+        for item in updated_list:
+            csvwriter.writerow(entry_row(item))
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+    os.replace(temp_path, path)
+
+
+def write_text(path, text):
+    """Writes text to a file through a temporary file and a rename, like
+    write_entries() does."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", newline="") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def csv_header():
+    """Returns the header line a tasklog CSV starts with."""
+    header = io.StringIO()
+    csv.DictWriter(header, fieldnames=FIELDNAMES).writeheader()
+    return header.getvalue()
+
+
+def csv_text(entries):
+    """Returns the CSV rows for some entries as text, without a header."""
+    text = io.StringIO()
+    csvwriter = csv.writer(text)
+    for item in entries:
+        # The same row csv.DictWriter writes for entry_row(item), but faster
+        csvwriter.writerow((item.entry_date, item.task_name, item.mins_spent,
+                            item.notes))
+    return text.getvalue()
+
+
+def append_entry(path, new_item):
+    """Adds a single entry to the end of a CSV file.
+
+    Only the new row is written, so adding an entry takes the same time no
+    matter how large the file has grown. The row is synced to disk before
+    returning. If an earlier crash left a partial last line, it is closed off
+    first so the new row doesn't get glued onto it.
+    """
+    append_entries(path, [new_item])
+
+
+def append_entries(path, new_items):
+    """Adds any number of entries to the end of a CSV file, like
+    append_entry(), but opening and syncing the file only once.
+
+    :param new_items: any iterable of entries. They're written as they
+            come, so a stream is never held in memory all at once.
+
+    :return: the number of entries written.
+    """
+    new_items = iter(new_items)
+    first = next(new_items, None)
+    if first is None:
+        return 0
+
+    needs_header = True
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path):
+        needs_header = False
+        with open(path, "rb") as csvfile:
+            csvfile.seek(-1, os.SEEK_END)
+            needs_newline = csvfile.read(1) != b"\n"
+
+    with open(path, "a") as csvfile:
+        if needs_newline:
+            csvfile.write("\r\n")
+        csvwriter = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        if needs_header:
+            csvwriter.writeheader()
+        count = 0
+        for item in chain((first,), new_items):
+            csvwriter.writerow(entry_row(item))
+            count += 1
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+    return count
+
+
+class ChangeSet:
+    """The edits and deletions made to entries while they're displayed.
+
+    Both are keyed by entry_ID: edited maps each ID to the edited Entry, and
+    deleted is a set of IDs. That lets the changes be applied to the full
+    list of entries in a single pass, however many of them there are.
+    """
+    def __init__(self):
+        self.edited = {}
+        self.deleted = set()
+
+    def __len__(self):
+        return len(self.edited) + len(self.deleted)
+
+    def edit(self, item):
+        """Records that an entry has been edited."""
+        self.edited[item.entry_ID] = item
+
+    def delete(self, item):
+        """Records that an entry has been deleted."""
+        self.edited.pop(item.entry_ID, None)
+        self.deleted.add(item.entry_ID)
+
+    def apply_to(self, complete_list):
+        """Applies the changes to a list of entries, in place.
+
+        Entries in the list which share an ID with an edited entry get its
+        fields copied over, in case they're separate objects (as they are
+        when a database search builds new entries).
+        """
+        kept = []
+        for item in complete_list:
+            if item.entry_ID in self.deleted:
+                continue
+            edited = self.edited.get(item.entry_ID)
+            if edited is not None and edited is not item:
+                item.entry_date = edited.entry_date
+                item.task_name = edited.task_name
+                item.mins_spent = edited.mins_spent
+                item.notes = edited.notes
+            kept.append(item)
+        complete_list[:] = kept
+
+
+class CsvBackend:
+    """Keeps entries in a CSV file, the way the worklog always has.
+
+    The file has no indexes of its own, so the EntryStore builds them in
+    memory from the loaded entries.
+
+    Every read and write holds the file's lock (see FileLock). Saves replace
+    the file with a new one, while appends add to the end of the same one.
+    The filesystem can hand a replaced file's inode to a later one, though,
+    so each save also adds a byte to the lock file, and its size counts the
+    rewrites. A stamp with the same inode, a larger size, and the same count
+    means entries were only appended.
+
+    Full loads go through a binary cache kept beside the file (see
+    cache.py), which is rebuilt whenever it no longer matches the CSV.
+
+    :param use_cache: False to always parse the CSV, without a cache.
+    """
+    rewrites_on_apply = True
+
+    def __init__(self, path, use_cache=True):
+        self.path = path
+        self.use_cache = use_cache
+        self.file_lock = FileLock(path)
+
+    def lock(self, shared=False):
+        """Returns a context manager holding the file's lock."""
+        return self.file_lock.hold(shared)
+
+    def stamp(self):
+        """Returns something which changes whenever the file is written: its
+        inode, modification time, and size, and the number of rewrites."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0, 0, 0, 0
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size, self._rewrites()
+
+    def _rewrites(self):
+        """Returns how many times the file has been rewritten, which is the
+        size of its lock file."""
+        try:
+            return os.path.getsize(self.file_lock.path)
+        except FileNotFoundError:
+            return 0
+
+    def _count_rewrite(self):
+        """Counts a rewrite. It's counted before the file is replaced, so a
+        crash in between can only cause an unneeded reload."""
+        with open(self.file_lock.path, "a") as lock_file:
+            lock_file.write("\n")
+
+    def load(self):
+        """Reads every entry, from the cache if it matches the file.
+
+        The file is read (and hashed) just once either way. When the cache
+        doesn't match, the entries are parsed from what was read, and the
+        cache is written again for next time.
+        """
+        if not self.use_cache:
+            with self.lock(shared=True), stage("parse csv") as timing:
+                entries = read_entries(self.path)
+                timing.rows = len(entries)
+            return entries
+        with self.lock(shared=True):
+            try:
+                with open(self.path, "rb") as csvfile:
+                    data = csvfile.read()
+                    source = csv_source(data, os.fstat(csvfile.fileno()))
+            except FileNotFoundError:
+                return []
+            with stage("read cache") as timing:
+                entries = read_cache(self.path, source)
+                timing.rows = len(entries or ())
+            if entries is None:
+                with stage("parse csv") as timing:
+                    # Decoded the same way open(self.path) would
+                    text = io.TextIOWrapper(io.BytesIO(data))
+                    entries = list(row_entries(csv.DictReader(text)))
+                    timing.rows = len(entries)
+                with stage("write cache", len(entries)):
+                    write_cache(self.path, entries, source)
+            return entries
+
+    def stream(self):
+        with self.lock(shared=True):
+            yield from iter_entries(self.path)
+
+    def open_stream(self):
+        """Opens the file to be read one page of entries at a time.
+
+        The lock is only held while a page is read, so the entries can be
+        read slowly (like when they're browsed) without holding up other
+        processes' writes. Saves replace the file rather than changing it,
+        so the open file is read as it was, plus any entries appended to it.
+
+        :return: (stamp, entries), where stamp is the file's stamp when it
+                was opened, and entries is an iterator of Entry objects.
+        """
+        with self.lock(shared=True):
+            stamp = self.stamp()
+            try:
+                csvfile = open(self.path, newline="")
+            except FileNotFoundError:
+                return stamp, iter(())
+        return stamp, locked_pages(
+            self.lock, row_entries(csv.DictReader(csvfile)), [csvfile])
+
+    def stream_between(self, first_date, last_date):
+        """Yields the entries dated from first_date to last_date, inclusive.
+        A CSV file has to be read all the way through to find them."""
+        low = first_date.toordinal()
+        high = last_date.toordinal()
+        return (item for item in self.stream()
+                if low <= item.date_ordinal <= high)
+
+    def snapshot_chunks(self):
+        """Returns None, since a single file has no chunks of its own for a
+        snapshot (see snapshots.py) to reuse."""
+        return None
+
+    def appended_at_end(self, stamp):
+        """Returns True if entries have only been appended since stamp, so
+        the entries there were then still have the same IDs."""
+        if stamp is None or not stamp[2]:
+            return False
+        inode, mtime, size, rewrites = stamp
+        current_inode, current_mtime, current_size, current_rewrites = \
+            self.stamp()
+        return current_inode == inode and current_size >= size \
+            and current_rewrites == rewrites
+
+    def appended_since(self, stamp, first_id):
+        """Reads the entries added to the end of the file since stamp.
+
+        :param first_id: the ID to number the new entries from.
+
+        :return: a list of the new entries, or None if the file was changed
+                some other way (or stamp is None).
+        """
+        if not self.appended_at_end(stamp):
+            return None
+        with self.lock(shared=True):
+            with open(self.path, newline="") as csvfile:
+                csvfile.seek(stamp[2])
+                rows = csv.DictReader(csvfile, fieldnames=FIELDNAMES)
+                return list(row_entries(rows, first_id))
+
+    def append(self, new_item):
+        with self.lock():
+            append_entry(self.path, new_item)
+
+    def append_many(self, new_items):
+        """Appends a stream of entries in one write.
+
+        :return: the number of entries appended.
+        """
+        with self.lock():
+            return append_entries(self.path, new_items)
+
+    def save(self, updated_list):
+        with self.lock():
+            self._count_rewrite()
+            write_entries(self.path, updated_list)
+
+    def save_text(self, text):
+        """Replaces the file with some CSV text, header and all."""
+        with self.lock():
+            self._count_rewrite()
+            write_text(self.path, text)
+
+    def apply(self, changes, updated_list):
+        """Saves a ChangeSet. A CSV file can only be rewritten as a whole,
+        so updated_list is the full list with the changes already made."""
+        self.save(updated_list)
+
+    def date_index(self, entries):
+        return DateIndex(entries)
+
+    def minutes_index(self, entries):
+        return MinutesIndex(entries)
+
+    def text_index(self, entries):
+        return TextIndex(entries)
+
+
+def shard_name(item):
+    """Returns the shard an entry belongs in: its month as "YYYY-MM", or
+    "undated" if it has no valid date."""
+    if item.parsed_date is None:
+        return "undated"
+    return "{:04}-{:02}".format(item.parsed_date.year, item.parsed_date.month)
+
+
+class ShardedBackend:
+    """Keeps entries in a folder of CSV files, one for each month.
+
+    Each shard (like "2017-02.csv") is an ordinary tasklog CSV holding one
+    month's entries, and entries without a valid date go in "undated.csv".
+    manifest.json lists each shard's rows, minutes, size in bytes, and a hash
+    of its rows, plus a generation number which goes up whenever the shard
+    is rewritten rather than appended to.
+
+    Entries are numbered in shard order (oldest month first), then in the
+    order they appear in each shard. Adding an entry only appends to its
+    month's shard, saving only rewrites the shards whose rows changed, and
+    date-range streams only open the shards for those months.
+
+    :param path: the folder. It's created if it doesn't exist.
+    """
+    rewrites_on_apply = True
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, "manifest.json")
+        os.makedirs(path, exist_ok=True)
+        self.file_lock = FileLock(self.manifest_path)
+        # The stamp and shards of the manifest last read or written here
+        self.known = (None, {})
+
+    def lock(self, shared=False):
+        """Returns a context manager holding the folder's lock."""
+        return self.file_lock.hold(shared)
+
+    def stamp(self):
+        """Returns something which changes whenever a shard is written, since
+        the manifest is replaced every time."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return 0, 0, 0
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def shards(self):
+        """Returns the manifest, as a dict of {shard name: details}."""
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)["shards"]
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, shards):
+        write_text(self.manifest_path,
+                   json.dumps({"shards": shards}, indent=1, sort_keys=True))
+        self.known = (self.stamp(), shards)
+
+    def _shard_path(self, name):
+        return os.path.join(self.path, name + ".csv")
+
+    def _shard_rows(self, name):
+        """Returns a shard's rows as text, without the header."""
+        with open(self._shard_path(name), newline="") as csvfile:
+            csvfile.readline()
+            return csvfile.read()
+
+    def _read_shard(self, name, first_id, offset=0):
+        """Yields a shard's entries, numbered from first_id.
+
+        :param offset: a position in the file to start reading rows from,
+                or 0 to read them all.
+        """
+        with open(self._shard_path(name), newline="") as csvfile:
+            if offset:
+                csvfile.seek(offset)
+                rows = csv.DictReader(csvfile, fieldnames=FIELDNAMES)
+            else:
+                rows = csv.DictReader(csvfile)
+            yield from row_entries(rows, first_id)
+
+    def load(self):
+        return list(self.stream())
+
+    def stream(self):
+        with self.lock(shared=True):
+            shards = self.shards()
+            self.known = (self.stamp(), shards)
+            entry_ID = 1
+            for name in sorted(shards):
+                yield from self._read_shard(name, entry_ID)
+                entry_ID += shards[name]["rows"]
+
+    def open_stream(self):
+        """Opens the shards to be read one page of entries at a time, like
+        CsvBackend.open_stream().
+
+        Every shard is opened straight away, and only as many rows as the
+        manifest lists are read from each, so the entries are numbered as
+        they were when the stream was opened.
+
+        :return: (stamp, entries).
+        """
+        with self.lock(shared=True):
+            stamp = self.stamp()
+            shards = self.shards()
+            self.known = (stamp, shards)
+            names = sorted(shards)
+            files = [open(self._shard_path(name), newline="")
+                     for name in names]
+
+        def entries():
+            entry_ID = 1
+            for name, csvfile in zip(names, files):
+                rows = shards[name]["rows"]
+                yield from islice(row_entries(csv.DictReader(csvfile),
+                                              entry_ID), rows)
+                entry_ID += rows
+        return stamp, locked_pages(self.lock, entries(), files)
+
+    def stream_between(self, first_date, last_date):
+        """Yields the entries dated from first_date to last_date, inclusive,
+        only opening the shards for those months."""
+        low = first_date.toordinal()
+        high = last_date.toordinal()
+        first_month = "{:04}-{:02}".format(first_date.year, first_date.month)
+        last_month = "{:04}-{:02}".format(last_date.year, last_date.month)
+        with self.lock(shared=True):
+            shards = self.shards()
+            entry_ID = 1
+            for name in sorted(shards):
+                if name != "undated" and first_month <= name <= last_month:
+                    for item in self._read_shard(name, entry_ID):
+                        if low <= item.date_ordinal <= high:
+                            yield item
+                entry_ID += shards[name]["rows"]
+
+    def snapshot_chunks(self):
+        """Returns each shard's rows as a chunk for a snapshot (see
+        snapshots.py), as (hash, rows, read) where read() returns the text.
+
+        The hashes come from the manifest, so shards which are already in a
+        snapshot aren't even read. Hold the lock while the chunks are used,
+        so the shards can't change in between.
+        """
+        shards = self.shards()
+        return [(shards[name]["sha1"], shards[name]["rows"],
+                 lambda name=name: self._shard_rows(name))
+                for name in sorted(shards)]
+
+    def appended_at_end(self, stamp):
+        """Returns True if the entries there were at stamp still have the
+        same IDs. That's only so if nothing was rewritten, and entries were
+        only appended to the last shard or to new shards after it, since an
+        entry added to an earlier month moves every later one along.
+
+        :param stamp: the last stamp seen here. For any other, it can't be
+                told, so this returns False.
+        """
+        known_stamp, known = self.known
+        if stamp is None or stamp != known_stamp:
+            return False
+        with self.lock(shared=True):
+            shards = self.shards()
+        last = max(known, default="")
+        if any(name not in shards for name in known):
+            return False
+        for name, shard in shards.items():
+            old = known.get(name)
+            if old is None:
+                if name < last:
+                    return False
+            elif shard["generation"] != old["generation"] \
+                    or shard["rows"] < old["rows"] \
+                    or (shard["rows"] > old["rows"] and name != last):
+                return False
+        return True
+
+    def appended_since(self, stamp, first_id):
+        """Reads the entries added to the ends of shards since stamp.
+
+        :param first_id: the ID to number the new entries from.
+
+        :return: a list of the new entries, or None if any shard was
+                rewritten or removed (or stamp isn't the last one seen).
+        """
+        known_stamp, known = self.known
+        if stamp is None or stamp != known_stamp:
+            return None
+        with self.lock(shared=True):
+            current_stamp = self.stamp()
+            shards = self.shards()
+            if any(name not in shards for name in known):
+                return None
+            added = []
+            for name in sorted(shards):
+                offset = 0
+                old = known.get(name)
+                if old is not None:
+                    if shards[name]["generation"] != old["generation"] \
+                            or shards[name]["rows"] < old["rows"]:
+                        return None
+                    if shards[name]["rows"] == old["rows"]:
+                        continue
+                    offset = old["bytes"]
+                added.extend(self._read_shard(name, first_id + len(added),
+                                              offset))
+        self.known = (current_stamp, shards)
+        return added
+
+    def append(self, new_item):
+        """Appends an entry to the shard for its month."""
+        self.append_many([new_item])
+
+    def append_many(self, new_items):
+        """Appends entries to the shards for their months, writing each
+        shard and the manifest once.
+
+        :return: the number of entries appended.
+        """
+        groups = self._group(new_items)
+        with self.lock():
+            shards = self.shards()
+            for name, entries in groups.items():
+                append_entries(self._shard_path(name), entries)
+                shard = shards.setdefault(name, {"rows": 0, "minutes": 0,
+                                                 "generation": 0})
+                shard["rows"] += len(entries)
+                shard["minutes"] += sum(item.mins_spent for item in entries)
+                shard["bytes"] = os.path.getsize(self._shard_path(name))
+                shard["sha1"] = hashlib.sha1(
+                    self._shard_rows(name).encode()).hexdigest()
+            if groups:
+                self._write_manifest(shards)
+        return sum(len(entries) for entries in groups.values())
+
+    def _write_shards(self, groups):
+        """Rewrites shards with new lists of entries.
+
+        Shards whose rows come out the same aren't written, and shards with
+        no entries left are removed.
+
+        :param groups: a dict of {shard name: entries}.
+        """
+        with self.lock():
+            shards = self.shards()
+            for name, entries in groups.items():
+                if not entries:
+                    if name in shards:
+                        os.remove(self._shard_path(name))
+                        del shards[name]
+                    continue
+                text = csv_text(entries)
+                digest = hashlib.sha1(text.encode()).hexdigest()
+                old = shards.get(name, {})
+                if old.get("sha1") == digest:
+                    continue
+                write_text(self._shard_path(name), csv_header() + text)
+                shards[name] = {
+                    "rows": len(entries),
+                    "minutes": sum(item.mins_spent for item in entries),
+                    "bytes": os.path.getsize(self._shard_path(name)),
+                    "sha1": digest,
+                    "generation": old.get("generation", 0) + 1
+                }
+            self._write_manifest(shards)
+
+    def _group(self, entries):
+        groups = {}
+        for item in entries:
+            groups.setdefault(shard_name(item), []).append(item)
+        return groups
+
+    def save(self, updated_list):
+        with self.lock():
+            groups = self._group(updated_list)
+            for name in self.shards():
+                groups.setdefault(name, [])
+            self._write_shards(groups)
+
+    def apply(self, changes, updated_list):
+        """Saves a ChangeSet by rewriting just the shards it touched.
+
+        Those are the shards edited entries now belong in, plus any whose
+        number of entries changed (from deletions, or from edited entries
+        moving to another month).
+        """
+        with self.lock():
+            shards = self.shards()
+            groups = self._group(updated_list)
+            touched = {shard_name(item) for item in changes.edited.values()}
+            touched.update(
+                name for name in set(shards) | set(groups)
+                if len(groups.get(name, ())) != shards.get(name, {}).get(
+                    "rows", 0))
+            self._write_shards({name: groups.get(name, [])
+                                for name in touched})
+
+    def date_index(self, entries):
+        return DateIndex(entries)
+
+    def minutes_index(self, entries):
+        return MinutesIndex(entries)
+
+    def text_index(self, entries):
+        return TextIndex(entries)
+
+
+def open_backend(path):
+    """Returns the storage backend for a tasklog, based on its name.
+
+    ".db", ".sqlite" and ".sqlite3" files are SQLite databases, a folder (or
+    a name ending in a slash) holds monthly shards, and anything else is
+    treated as a CSV file.
+    """
+    if os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3"):
+        return SqliteBackend(path)
+    if path.endswith(("/", os.sep)) or os.path.isdir(path):
+        return ShardedBackend(path)
+    return CsvBackend(path)
+
+
+class EntryStore:
+    """An in-memory copy of the tasklog which lasts between menu actions.
+
+    The entries are read and written through a backend (see open_backend()),
+    which also hands out a stamp that changes whenever its file does.
+    refresh() compares stamps, and only reloads the entries if something
+    else has changed the file.
+
+    Indexes come from the backend the first time they're asked for. They're
+    kept up to date as entries are added and as change sets are applied,
+    and thrown away whenever the whole list is reloaded or saved.
+
+    Writes hold the backend's lock from the stamp check to the write. If
+    other processes have only appended entries since the last read, those
+    are merged in rather than reloading everything.
+
+    reloads counts the times the whole list has been read. For backends
+    which number entries by their position (rewrites_on_apply), a change
+    in it means an ID might now point at a different entry.
+    """
+    def __init__(self, path="tasklog.csv"):
+        self.path = path
+        self.backend = open_backend(path)
+        self.entries = []
+        self.last_id = 0
+        self.reloads = 0
+        self._stamp = None
+        self._drop_indexes()
+
+    def refresh(self):
+        """Reloads the entries if the file has changed since the last read.
+
+        :return: the current list of entries.
+        """
+        with self.backend.lock(shared=True):
+            if self._catch_up():
+                return self.entries
+            stamp = self.backend.stamp()
+            with stage("load") as timing:
+                self.entries = self.backend.load()
+                timing.rows = len(self.entries)
+            self.reloads += 1
+        self.last_id = max((item.entry_ID for item in self.entries),
+                           default=0)
+        self._stamp = stamp
+        self._drop_indexes()
+        return self.entries
+
+    def _catch_up(self):
+        """Merges in entries which other processes have appended.
+
+        :return: True if the in-memory list is now up to date, or False if
+                the file has changed in some other way.
+        """
+        if self.backend.stamp() == self._stamp:
+            return True
+        added = self.backend.appended_since(self._stamp, self.next_id())
+        if added is None:
+            return False
+        for item in added:
+            self._add_loaded(item)
+        self._stamp = self.backend.stamp()
+        return True
+
+    def stream(self):
+        """Returns the entries to be read through once (like when they're
+        browsed), without loading the whole tasklog.
+
+        If the loaded list is up to date, that's returned. Otherwise the
+        backend's entries are read a page at a time as they're asked for,
+        numbered the same way refresh() would number them.
+
+        :return: (stamp, entries). Pass the stamp to apply() along with any
+                changes made to the entries.
+        """
+        with self.backend.lock(shared=True):
+            if self._stamp is not None and self._catch_up():
+                return self._stamp, self.entries
+            return self.backend.open_stream()
+
+    def _add_loaded(self, new_item):
+        """Adds an entry which is already in the file to the list and the
+        indexes."""
+        self.entries.append(new_item)
+        for index in (self._date_index, self._minutes_index,
+                      self._text_index, self._summary):
+            if index is not None:
+                index.add(new_item)
+        self._analytics = None
+        self.last_id = max(self.last_id, new_item.entry_ID)
+
+    def invalidate(self):
+        """Forces the next refresh() to read the file again."""
+        self._stamp = None
+
+    def next_id(self):
+        """Returns an ID which isn't used by any entry in the store."""
+        return self.last_id + 1
+
+    def add(self, new_item):
+        """Appends a new entry to the file and to the in-memory list.
+
+        Entries other processes have appended are merged in first, and the
+        new entry is numbered after them. If the file was changed some other
+        way, the in-memory list is left to be reloaded by the next refresh()
+        instead.
+        """
+        with self.backend.lock(), stage("append", 1):
+            if not self._catch_up():
+                self.backend.append(new_item)
+                self.invalidate()
+                return
+            new_item.entry_ID = self.next_id()
+            self.backend.append(new_item)
+            self._add_loaded(new_item)
+            self._stamp = self.backend.stamp()
+
+    def save(self):
+        """Writes the in-memory list back to the file."""
+        with self.backend.lock(), stage("save", len(self.entries)):
+            self.backend.save(self.entries)
+            self._stamp = self.backend.stamp()
+        self._drop_indexes()
+
+    def apply(self, changes, stamp=None):
+        """Applies a ChangeSet to the entries, the indexes, and the file.
+
+        Nothing is written if the change set is empty. Entries other
+        processes have appended are kept. If the tasklog was rewritten by
+        another process instead, and the backend would have to write the
+        whole list, a ConflictError is raised and nothing is saved, since
+        the entries' IDs might no longer point at the same rows.
+
+        :param stamp: the stamp stream() returned, if the changes were made
+                to entries from stream(). A backend which writes the whole
+                list has it loaded first, and a ConflictError is raised if
+                the streamed entries' IDs have changed since (see the
+                backend's appended_at_end()).
+        """
+        if not changes:
+            return
+        with self.backend.lock():
+            if stamp is not None and stamp != self._stamp \
+                    and self.backend.rewrites_on_apply:
+                if self.backend.stamp() != stamp and \
+                        not self.backend.appended_at_end(stamp):
+                    raise ConflictError("The tasklog was changed by another "
+                                        "process, so the changes weren't "
+                                        "saved.")
+                self.refresh()
+            up_to_date = self._catch_up()
+            if not up_to_date and self.backend.rewrites_on_apply:
+                self.invalidate()
+                raise ConflictError("The tasklog was changed by another "
+                                    "process, so the changes weren't saved.")
+            changes.apply_to(self.entries)
+            with stage("save", len(changes)):
+                self.backend.apply(changes, self.entries)
+            if up_to_date:
+                self._stamp = self.backend.stamp()
+            else:
+                self.invalidate()
+        for index in (self._date_index, self._minutes_index,
+                      self._text_index):
+            if index is not None:
+                index.apply(changes)
+        # Edited entries have lost their old values, so their old totals
+        # can't be taken back out. The summary is rebuilt instead.
+        self._summary = None
+        self._analytics = None
+
+    def replace(self, updated_list):
+        """Swaps in a whole new list of entries, and saves it."""
+        self.entries = updated_list
+        self.reloads += 1
+        self.last_id = max((item.entry_ID for item in self.entries),
+                           default=0)
+        self.save()
+
+    def _drop_indexes(self):
+        self._date_index = None
+        self._minutes_index = None
+        self._text_index = None
+        self._summary = None
+        self._analytics = None
+
+    def date_index(self):
+        """Returns a date index (like a DateIndex) of the loaded entries."""
+        if self._date_index is None:
+            self._date_index = self.backend.date_index(self.entries)
+        return self._date_index
+
+    def minutes_index(self):
+        """Returns a minutes index (like a MinutesIndex) of the entries."""
+        if self._minutes_index is None:
+            self._minutes_index = self.backend.minutes_index(self.entries)
+        return self._minutes_index
+
+    def text_index(self):
+        """Returns a text index (like a TextIndex) of the loaded entries."""
+        if self._text_index is None:
+            self._text_index = self.backend.text_index(self.entries)
+        return self._text_index
+
+    def summary(self):
+        """Returns a Summary of the loaded entries."""
+        if self._summary is None:
+            self._summary = Summary(self.entries)
+        return self._summary
+
+    def analytics(self):
+        """Returns an Analytics of the loaded entries, which is rebuilt after
+        any change."""
+        if self._analytics is None:
+            self._analytics = Analytics(self.entries)
+        return self._analytics
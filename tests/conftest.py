@@ -0,0 +1,80 @@
+"""Shared fixtures for the worklog's tests.
+
+The worklog's modules sit at the top of the repository rather than in a
+package, so that folder is put on sys.path here. Every test runs in its own
+temporary folder, since the worklog reads and writes files (like
+"tasklog.csv" and "time_markers.json") in the working directory.
+"""
+
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from entry import Entry
+from store import FIELDNAMES, EntryStore
+
+
+# (entry_date, task_name, mins_spent, notes) for the sample tasklog, which
+# spans three months
+SAMPLE_ROWS = [
+    ("02/01/17", "Accounts Payable", 30, "Paid invoice 1001"),
+    ("02/01/17", "Emails", 10, "Inbox zero"),
+    ("02/07/17", "Accounts Receivable", 45, "Chased invoice 2002"),
+    ("02/20/17", "Worklog", 120, "Wrote the report"),
+    ("03/02/17", "Emails", 5, "Invoice questions"),
+    ("04/03/17", "Accounts Payable", 25, "Paid invoice 1002"),
+]
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def sample_rows():
+    return list(SAMPLE_ROWS)
+
+
+@pytest.fixture
+def write_tasklog():
+    """Returns a function which writes a CSV tasklog from (entry_date,
+    task_name, mins_spent, notes) tuples, SAMPLE_ROWS by default."""
+    def write(path="tasklog.csv", rows=SAMPLE_ROWS):
+        with open(path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(FIELDNAMES)
+            writer.writerows(rows)
+        return path
+    return write
+
+
+@pytest.fixture
+def fill_store():
+    """Returns a function which adds (entry_date, task_name, mins_spent,
+    notes) tuples to any kind of tasklog through an EntryStore, SAMPLE_ROWS
+    by default, and returns the store."""
+    def fill(path="tasklog.csv", rows=SAMPLE_ROWS):
+        entry_store = EntryStore(path)
+        for row in rows:
+            entry_store.add(Entry(0, *row))
+        return entry_store
+    return fill
+
+
+def contents(entries):
+    """Returns entries as (entry_date, task_name, mins_spent, notes) tuples,
+    to compare with rows like SAMPLE_ROWS."""
+    return [(item.entry_date, item.task_name, item.mins_spent, item.notes)
+            for item in entries]
+
+
+@pytest.fixture
+def as_rows():
+    return contents
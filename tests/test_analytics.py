@@ -0,0 +1,66 @@
+import pytest
+
+import analytics
+from analytics import Analytics
+from entry import Entry
+from report import PERIODS, Summary
+
+
+@pytest.fixture(params=["numpy", "python"], autouse=True)
+def array_module(request, monkeypatch):
+    """Runs each test with NumPy (when it's installed) and without."""
+    if request.param == "numpy":
+        monkeypatch.setattr(analytics, "numpy", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(analytics, "numpy", None)
+    return request.param
+
+
+@pytest.fixture
+def entries(sample_rows):
+    rows = sample_rows + [("someday", "Emails", 7, "Undated")]
+    return [Entry(number, *row) for number, row in enumerate(rows, 1)]
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_period_rows_match_the_summary(entries, period):
+    assert Analytics(entries).period_rows(period) \
+        == Summary(entries).rows(period)
+
+
+def test_minutes_between(entries):
+    found = Analytics(entries).minutes_between(10, 30)
+    assert [item.entry_ID for item in found] == [1, 2, 6]
+    assert Analytics(entries).minutes_between(500, 600) == []
+
+
+def test_duration_histogram(entries):
+    assert Analytics(entries).duration_histogram() == [
+        {"minutes": "under 15", "entries": 3},
+        {"minutes": "15-29", "entries": 1},
+        {"minutes": "30-59", "entries": 2},
+        {"minutes": "60-119", "entries": 0},
+        {"minutes": "120-239", "entries": 1},
+        {"minutes": "240-479", "entries": 0},
+        {"minutes": "480+", "entries": 0},
+    ]
+
+
+def test_rolling_average(entries):
+    days = Analytics(entries).rolling_average()
+    # Every day from the first entry to the last, leaving out the undated one
+    assert (days[0]["date"], days[-1]["date"], len(days)) \
+        == ("02/01/2017", "04/03/2017", 62)
+    assert days[0] == {"date": "02/01/2017", "minutes": 40, "average": 40.0}
+    assert days[1] == {"date": "02/02/2017", "minutes": 0, "average": 20.0}
+    assert days[6] == {"date": "02/07/2017", "minutes": 45, "average": 12.1}
+    assert days[7] == {"date": "02/08/2017", "minutes": 0, "average": 6.4}
+    assert sum(day["minutes"] for day in days) == 235
+
+
+def test_no_entries():
+    empty = Analytics([])
+    assert empty.minutes_between(0, 100) == []
+    assert empty.period_rows("month") == []
+    assert empty.rolling_average() == []
+    assert sum(row["entries"] for row in empty.duration_histogram()) == 0
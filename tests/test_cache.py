@@ -0,0 +1,74 @@
+import os
+
+from cache import CachedEntry, cache_path, write_cache
+from entry import Entry
+from store import CsvBackend, EntryStore, append_entry
+
+
+def test_the_cache_matches_a_parse(write_tasklog, as_rows, sample_rows):
+    write_tasklog()
+    parsed = CsvBackend("tasklog.csv").load()
+    assert os.path.exists(cache_path("tasklog.csv"))
+    cached = CsvBackend("tasklog.csv").load()
+    assert all(isinstance(item, CachedEntry) for item in cached)
+    assert as_rows(cached) == as_rows(parsed) == sample_rows
+    assert [item.entry_ID for item in cached] == [1, 2, 3, 4, 5, 6]
+    assert [item.date_ordinal for item in cached] \
+        == [item.date_ordinal for item in parsed]
+
+
+def test_a_stale_cache_is_rebuilt(write_tasklog, as_rows, sample_rows):
+    write_tasklog()
+    CsvBackend("tasklog.csv").load()
+    append_entry("tasklog.csv", Entry(0, "05/01/17", "Late", 15, "Added"))
+    loaded = CsvBackend("tasklog.csv").load()
+    assert as_rows(loaded) == sample_rows + [("05/01/17", "Late", 15,
+                                              "Added")]
+    assert as_rows(CsvBackend("tasklog.csv").load()) == as_rows(loaded)
+
+
+def test_a_damaged_cache_is_ignored(write_tasklog, sample_rows, as_rows):
+    write_tasklog()
+    CsvBackend("tasklog.csv").load()
+    with open(cache_path("tasklog.csv"), "r+b") as file:
+        file.truncate(60)
+    assert as_rows(CsvBackend("tasklog.csv").load()) == sample_rows
+    with open(cache_path("tasklog.csv"), "wb"):
+        pass
+    assert as_rows(CsvBackend("tasklog.csv").load()) == sample_rows
+
+
+def test_cached_notes_can_be_edited(write_tasklog):
+    write_tasklog()
+    CsvBackend("tasklog.csv").load()
+    entry_store = EntryStore("tasklog.csv")
+    item = entry_store.refresh()[0]
+    assert item.notes == "Paid invoice 1001"
+    item.notes = "Paid twice"
+    assert "paid twice" in item.folded_text
+    entry_store.save()
+    assert EntryStore("tasklog.csv").refresh()[0].notes == "Paid twice"
+
+
+def test_an_older_cache_is_ignored(write_tasklog, sample_rows, as_rows):
+    write_tasklog()
+    CsvBackend("tasklog.csv").load()
+    with open(cache_path("tasklog.csv"), "r+b") as file:
+        file.write(b"WLC1")
+    loaded = CsvBackend("tasklog.csv").load()
+    assert not any(isinstance(item, CachedEntry) for item in loaded)
+    assert as_rows(loaded) == sample_rows
+    with open(cache_path("tasklog.csv"), "rb") as file:
+        assert file.read(4) == b"WLC2"
+
+
+def test_entries_too_big_for_the_cache_load_without_one(write_tasklog,
+                                                        sample_rows,
+                                                        as_rows):
+    rows = sample_rows + [("05/01/17", "Worklog", 2 ** 64, "Too long")]
+    write_tasklog(rows=rows)
+    assert as_rows(CsvBackend("tasklog.csv").load()) == rows
+    assert not os.path.exists(cache_path("tasklog.csv"))
+    write_cache("tasklog.csv", [Entry(1, "05/01/17", "Worklog", 2 ** 64)],
+                (0, 0, bytes(20)))
+    assert not os.path.exists(cache_path("tasklog.csv"))
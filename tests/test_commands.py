@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import worklog
+from store import CsvBackend, EntryStore
+
+
+def run(capsys, *argv):
+    """Runs a command, and returns (exit status, output lines)."""
+    status = worklog.run_command(list(argv))
+    return status, capsys.readouterr().out.splitlines()
+
+
+@pytest.mark.parametrize("path", ["tasklog.csv", "tasklog.db"])
+def test_search_by_minutes(path, fill_store, capsys):
+    fill_store(path)
+    status, lines = run(capsys, "--file", path, "search", "--minutes", "10",
+                        "30", "--json")
+    assert status == 0
+    assert [json.loads(line)["mins_spent"] for line in lines] == [30, 10, 25]
+
+
+def test_search_by_minutes_streams_the_tasklog(write_tasklog, capsys,
+                                               monkeypatch):
+    write_tasklog()
+    read = []
+    stream = CsvBackend.stream
+
+    def counted_stream(backend):
+        for item in stream(backend):
+            read.append(item)
+            yield item
+
+    def load(backend):
+        raise AssertionError("the whole tasklog was loaded")
+    monkeypatch.setattr(CsvBackend, "stream", counted_stream)
+    monkeypatch.setattr(CsvBackend, "load", load)
+    status, lines = run(capsys, "search", "--minutes", "10", "30",
+                        "--limit", "1", "--json")
+    assert [json.loads(line)["task_name"] for line in lines] \
+        == ["Accounts Payable"]
+    assert len(read) == 1
+
+
+@pytest.mark.parametrize("path", ["tasklog.csv", "tasklog.db"])
+def test_menu_search_by_minutes_uses_the_index(path, fill_store,
+                                               monkeypatch):
+    entry_store = fill_store(path)
+    entries = entry_store.refresh()
+    answers = iter(["10", "30"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    monkeypatch.setattr(worklog, "cls", lambda: None)
+    found = worklog.minutes_filter(entries, entry_store.minutes_index())
+    assert sorted(item.entry_ID for item in found) == [1, 2, 6]
+
+
+def test_add_keeps_dates_outside_the_2000s(capsys):
+    run(capsys, "add", "--task", "Emails", "--minutes", "10", "--date",
+        "12/31/1999")
+    run(capsys, "add", "--task", "Emails", "--minutes", "20", "--date",
+        "01/01/2000")
+    status, lines = run(capsys, "report", "--by", "year")
+    assert lines == ["period,entries,minutes,worked", "1999,1,10,0:10",
+                     "2000,1,20,0:20"]
+
+
+def test_search_limit(write_tasklog, capsys):
+    write_tasklog()
+    status, lines = run(capsys, "search", "--string", "invoice", "--limit",
+                        "2")
+    assert len(lines) == 3
+    status, lines = run(capsys, "search", "--limit", "0")
+    assert lines == ["entry_date,task_name,mins_spent,notes"]
+    with pytest.raises(SystemExit):
+        run(capsys, "search", "--limit", "-1")
+    assert "not a whole number of 0 or more" in capsys.readouterr().err
+
+
+def test_output_piped_into_head(write_tasklog):
+    write_tasklog(rows=[("02/07/17", "Emails", 10, "Note {}".format(number))
+                        for number in range(20000)])
+    command = subprocess.Popen(
+        [sys.executable, os.path.abspath(worklog.__file__), "search"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert command.stdout.readline() \
+        == b"entry_date,task_name,mins_spent,notes\n"
+    # Like head, stop reading after the first line
+    command.stdout.close()
+    errors = command.stderr.read()
+    command.wait(30)
+    assert errors == b""
+    assert command.returncode == 1
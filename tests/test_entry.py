@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+from entry import Entry, date_ordinal, format_entry_date, parse_date
+
+
+def test_entries_are_compact():
+    item = Entry(1, "02/07/17", "accounts payable", "45", "Notes")
+    assert not hasattr(item, "__dict__")
+    assert item.mins_spent == 45
+    assert item.task_name == "Accounts Payable"
+
+
+def test_dates_are_parsed_when_set():
+    item = Entry(1, "02/07/17")
+    assert item.parsed_date.isoformat() == "2017-02-07"
+    assert item.get_readable_date() == "02/07/2017"
+    item.entry_date = "not a date"
+    assert (item.parsed_date, item.date_ordinal) == (None, 0)
+    assert item.get_readable_date() == "not a date"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("02/07/17", date(2017, 2, 7)),
+    ("02/07/2017", date(2017, 2, 7)),
+    ("2/7/17", date(2017, 2, 7)),
+    ("2017-02-07", date(2017, 2, 7)),
+    ("02/30/17", None),
+    ("2017/02/07", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_date(text, expected):
+    assert parse_date(text) == expected
+
+
+def test_date_helpers():
+    assert date_ordinal("02/07/17") == date(2017, 2, 7).toordinal()
+    assert date_ordinal("never") == 0
+    assert format_entry_date(date(2017, 2, 7)) == "02/07/17"
+
+
+@pytest.mark.parametrize("day, text", [
+    (date(2000, 1, 1), "01/01/00"),
+    (date(2099, 12, 31), "12/31/99"),
+    (date(1999, 12, 31), "12/31/1999"),
+    (date(1998, 5, 4), "05/04/1998"),
+    (date(2100, 3, 1), "03/01/2100"),
+    (date(5, 6, 7), "06/07/0005"),
+])
+def test_formatted_dates_are_read_back(day, text):
+    assert format_entry_date(day) == text
+    assert parse_date(text) == day
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from importer import (import_entries, normalize_date, normalize_minutes,
+                      read_records)
+from store import EntryStore, open_backend
+
+
+@pytest.mark.parametrize("value, expected", [
+    (30, 30),
+    (29.6, 30),
+    ("45", 45),
+    (" 1:30 ", 90),
+    ("0:05", 5),
+    ("1:5", None),
+    ("1:60", None),
+    ("1:075", None),
+    (":30", None),
+    ("0", None),
+    (-5, None),
+    (True, None),
+    ("nan", None),
+    ("lots", None),
+    (None, None),
+])
+def test_normalize_minutes(value, expected):
+    assert normalize_minutes(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("02/07/17", "02/07/17"),
+    ("02/07/2017", "02/07/17"),
+    ("2017-02-07", "02/07/17"),
+    ("2017-02-07T09:30:00", "02/07/17"),
+    ("1998-05-04", "05/04/1998"),
+    ("12/31/1999", "12/31/1999"),
+    ("02/30/17", None),
+    ("", None),
+    (20170207, None),
+])
+def test_normalize_date(value, expected):
+    assert normalize_date(value) == expected
+
+
+def write_csv(path, text):
+    with open(path, "w", newline="") as file:
+        file.write(text)
+    return path
+
+
+def test_csv_import(write_tasklog):
+    write_tasklog()
+    path = write_csv("new.csv", "Date,Task,Minutes,Description\n"
+                                "02/01/17,Accounts Payable,30,"
+                                "Paid invoice 1001\n"
+                                "2017-04-03,Emails,1:15,Replies\n"
+                                "2017-04-03,Emails,1:15,Replies\n"
+                                "04/31/17,Emails,10,\n"
+                                "04/04/17,Emails,1:75,\n"
+                                "04/04/17,,10,\n")
+    result = import_entries(open_backend("tasklog.csv"), read_records(path))
+    assert (result.read, result.added, result.duplicates, result.invalid) \
+        == (6, 1, 2, 3)
+    assert [error.split(":")[0] for error in result.errors] \
+        == ["line 5", "line 6", "line 7"]
+
+    loaded = EntryStore("tasklog.csv").refresh()
+    assert len(loaded) == 7
+    added = loaded[-1]
+    assert (added.entry_ID, added.entry_date, added.task_name,
+            added.mins_spent, added.notes) \
+        == (7, "04/03/17", "Emails", 75, "Replies")
+
+
+def test_dry_run_writes_nothing(write_tasklog):
+    write_tasklog()
+    path = write_csv("new.csv", "date,task,mins,notes\n"
+                                "04/03/17,Emails,15,Replies\n")
+    with open("tasklog.csv") as file:
+        before = file.read()
+    result = import_entries(open_backend("tasklog.csv"), read_records(path),
+                            dry_run=True)
+    assert result.added == 1
+    with open("tasklog.csv") as file:
+        assert file.read() == before
+
+
+def test_json_lines_import():
+    with open("new.jsonl", "w") as file:
+        file.write(json.dumps({"date": "2017-04-03", "task": "Emails",
+                               "mins": 15}) + "\n\n")
+        file.write("not json\n")
+        file.write(json.dumps(["a", "list"]) + "\n")
+    result = import_entries(open_backend("tasklog.csv"),
+                            read_records("new.jsonl"))
+    assert (result.read, result.added, result.invalid) == (3, 1, 2)
+    assert [error.split(":")[0] for error in result.errors] \
+        == ["line 3", "line 4"]
+
+
+def test_json_array_import():
+    with open("new.json", "w") as file:
+        json.dump([{"date": "2017-04-03", "task": "Emails", "mins": 15},
+                   {"date": "2017-04-04", "task": "Emails", "mins": 0},
+                   {"date": "2017-04-05", "task": "Worklog", "mins": "2:00",
+                    "notes": 12}], file, indent=1)
+    result = import_entries(open_backend("tasklog.db"),
+                            read_records("new.json"))
+    assert (result.read, result.added, result.invalid) == (3, 2, 1)
+    assert result.errors[0].startswith("item 2:")
+    assert [(item.task_name, item.mins_spent, item.notes)
+            for item in EntryStore("tasklog.db").refresh()] \
+        == [("Emails", 15, ""), ("Worklog", 120, "12")]
+
+
+def test_json_file_of_lines_is_read_as_lines():
+    with open("new.json", "w") as file:
+        file.write(json.dumps({"date": "2017-04-03", "task": "Emails",
+                               "mins": 15}) + "\n")
+    assert [where for where, record in read_records("new.json")] \
+        == ["line 1"]
+
+
+def test_invalid_json_array_is_refused():
+    with open("new.json", "w") as file:
+        file.write('[{"date": "2017-04-03",')
+    with pytest.raises(ValueError):
+        list(read_records("new.json"))
@@ -0,0 +1,59 @@
+import os
+from datetime import datetime, timedelta
+
+from markers import (LEGACY_FILE, MarkerStore, elapsed_minutes, marker_label,
+                     timer_name)
+
+
+START = datetime(2017, 2, 7, 9, 30)
+
+
+def test_timer_names_match_task_names():
+    assert timer_name("  accounts payable ") == "Accounts Payable"
+
+
+def test_elapsed_minutes_and_label():
+    now = START + timedelta(minutes=45, seconds=59)
+    assert elapsed_minutes(START, now) == 45
+    assert marker_label("Emails", START, now) \
+        == "Emails since 02/07 09:30AM (45 minutes)"
+    assert marker_label("", START, now).startswith("Unnamed timer since")
+
+
+def test_timers_run_side_by_side():
+    markers = MarkerStore()
+    markers.start("emails", START + timedelta(minutes=10))
+    markers.start("accounts payable", START)
+    assert list(markers.timers()) == ["Accounts Payable", "Emails"]
+
+    assert markers.stop("Emails", START + timedelta(minutes=25)) == 15
+    assert list(markers.timers()) == ["Accounts Payable"]
+    assert markers.stop("Emails") is None
+
+
+def test_stop_across_midnight():
+    markers = MarkerStore()
+    markers.start("Worklog", datetime(2017, 2, 7, 23, 50))
+    assert markers.stop("Worklog", datetime(2017, 2, 8, 0, 20)) == 30
+
+
+def test_other_stores_see_changes():
+    first = MarkerStore()
+    second = MarkerStore()
+    assert second.timers() == {}
+    first.start("Emails", START)
+    assert second.timers() == {"Emails": START}
+    assert second.stop("Emails", START + timedelta(minutes=5)) == 5
+    # The first store stopped nothing, since the second one got there first
+    assert first.stop("Emails") is None
+
+
+def test_legacy_marker_is_converted_once():
+    with open(LEGACY_FILE, "w") as file:
+        file.write("09:30AM")
+    started = MarkerStore().timers()[""]
+    assert (started.hour, started.minute) == (9, 30)
+    assert started <= datetime.now()
+    assert not os.path.exists(LEGACY_FILE)
+    # Later reads get the same start time from the new file
+    assert MarkerStore().timers() == {"": started}
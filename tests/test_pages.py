@@ -0,0 +1,143 @@
+import pytest
+
+from entry import Entry
+from pages import EntryCursor
+
+
+def make_entries(count):
+    return [Entry(number, "02/{:02}/17".format(number % 28 + 1), "Task",
+                  number) for number in range(1, count + 1)]
+
+
+class CountingStream:
+    """An iterator over entries which counts how many were read."""
+    def __init__(self, entries):
+        self.entries = iter(entries)
+        self.read = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self.entries)
+        self.read += 1
+        return item
+
+
+@pytest.fixture(params=["list", "stream", "reopened stream"])
+def cursor(request):
+    entries = make_entries(25)
+    if request.param == "list":
+        return EntryCursor(entries)
+    if request.param == "stream":
+        return EntryCursor(iter(entries), page_size=4)
+    return EntryCursor(iter(entries), page_size=4,
+                       reopen=lambda: iter(entries), window=1)
+
+
+def test_moving_around(cursor):
+    assert (cursor.current().entry_ID, cursor.number()) == (1, 1)
+    cursor.next()
+    assert cursor.current().entry_ID == 2
+    cursor.previous()
+    cursor.previous()
+    # Going back from the first entry wraps round to the last
+    assert (cursor.current().entry_ID, cursor.number()) == (25, 25)
+    assert cursor.total() == "25"
+    cursor.next()
+    assert cursor.current().entry_ID == 1
+
+
+def test_jumps(cursor):
+    assert cursor.jump(12)
+    assert cursor.current().entry_ID == 12
+    assert not cursor.jump(26)
+    assert not cursor.jump(0)
+    assert cursor.current().entry_ID == 12
+
+    assert cursor.jump_to_date(Entry(0, "02/20/17").date_ordinal)
+    assert cursor.current().entry_ID == 19
+    assert not cursor.jump_to_date(Entry(0, "03/20/17").date_ordinal)
+    assert cursor.current().entry_ID == 19
+
+
+def test_deleting(cursor):
+    cursor.jump(3)
+    cursor.delete()
+    assert (cursor.current().entry_ID, cursor.number()) == (2, 2)
+    cursor.next()
+    assert (cursor.current().entry_ID, cursor.number()) == (4, 3)
+    assert cursor.jump(3)
+    assert cursor.current().entry_ID == 4
+    cursor.jump(1)
+    cursor.previous()
+    assert (cursor.current().entry_ID, cursor.number()) == (25, 24)
+    assert cursor.total() == "24"
+
+
+def test_deleting_everything():
+    cursor = EntryCursor(make_entries(2))
+    cursor.delete()
+    assert cursor.current().entry_ID == 2
+    cursor.delete()
+    assert cursor.is_empty()
+    assert cursor.current() is None
+    cursor.next()
+    cursor.previous()
+    assert cursor.is_empty()
+
+
+def test_streams_are_read_a_page_at_a_time():
+    stream = CountingStream(make_entries(25))
+    cursor = EntryCursor(stream, page_size=4)
+    assert stream.read == 4
+    assert cursor.total() == "4+"
+    for step in range(5):
+        cursor.next()
+    assert cursor.current().entry_ID == 6
+    assert stream.read == 8
+
+
+def test_empty_stream():
+    cursor = EntryCursor(iter(()))
+    assert cursor.is_empty()
+    assert cursor.total() == "0"
+
+
+def test_pages_far_from_the_cursor_are_dropped():
+    entries = make_entries(1000)
+    cursor = EntryCursor(iter(entries), page_size=10,
+                         reopen=lambda: iter(entries), window=1)
+    held = []
+
+    def move(step):
+        step()
+        held.append(sum(len(page) for page in cursor.pages.values()))
+
+    # Going back from the first entry wraps round to the last
+    move(cursor.previous)
+    assert (cursor.current().entry_ID, cursor.total()) == (1000, "1000")
+    move(cursor.next)
+    assert cursor.current().entry_ID == 1
+    for step in range(50):
+        move(cursor.next)
+    assert cursor.current().entry_ID == 51
+    assert cursor.jump_to_date(Entry(0, "02/28/17").date_ordinal)
+    assert cursor.current().entry_ID == 27
+    assert not cursor.jump_to_date(Entry(0, "03/20/17").date_ordinal)
+    move(cursor.current)
+    assert cursor.current().entry_ID == 27
+    assert max(held) <= 30
+
+
+def test_kept_entries_survive_their_page_being_dropped():
+    entries = make_entries(100)
+    cursor = EntryCursor(iter(entries), page_size=10,
+                         reopen=lambda: iter(make_entries(100)), window=1)
+    cursor.keep()
+    cursor.current().notes = "Edited"
+    cursor.previous()
+    cursor.next()
+    assert cursor.current().notes == "Edited"
+    cursor.next()
+    assert cursor.current().notes == ""
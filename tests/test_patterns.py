@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from entry import Entry
+from patterns import (SearchAborted, compile_regex, filter_until,
+                      parallel_filter, partition, phrase_matcher,
+                      phrase_regex, timed_filter)
+
+
+def make_entries(count):
+    return [Entry(number, "02/07/17", "Task {}".format(number % 10),
+                  number, "Note {}".format(number))
+            for number in range(1, count + 1)]
+
+
+def test_regexes_are_cached_and_ignore_case():
+    assert compile_regex("invoice") is compile_regex("invoice")
+    assert compile_regex("invoice").search("INVOICE 1001")
+    assert phrase_regex("a.b").search("A.B")
+    assert not phrase_regex("a.b").search("axb")
+
+
+def test_phrase_matcher():
+    test = phrase_matcher("TASK 3")
+    assert [item.entry_ID for item in make_entries(15) if test(item)] \
+        == [3, 13]
+
+
+def test_timed_filter():
+    entries = make_entries(100)
+    test = compile_regex(r"note \d*7$").search
+    found = timed_filter(lambda item: test(item.notes), entries, budget=5)
+    assert [item.entry_ID for item in found] == [7, 17, 27, 37, 47, 57, 67,
+                                                 77, 87, 97]
+
+
+def test_slow_regexes_run_out_of_time():
+    item = Entry(1, "02/07/17", "Task", 5, "a" * 30 + "b")
+    test = compile_regex("(a+)+$").search
+    started = time.monotonic()
+    with pytest.raises(SearchAborted):
+        timed_filter(lambda item: test(item.notes), [item], budget=0.5)
+    assert time.monotonic() - started < 5
+
+
+def test_filter_until_checks_the_deadline():
+    with pytest.raises(SearchAborted):
+        filter_until(bool, make_entries(10), time.monotonic() - 1)
+    assert len(filter_until(bool, make_entries(10),
+                            time.monotonic() + 5)) == 10
+
+
+def test_partition():
+    assert partition(10, 4) == [(0, 3), (3, 6), (6, 9), (9, 10)]
+    assert partition(2, 8) == [(0, 1), (1, 2)]
+    assert partition(0, 4) == []
+
+
+@pytest.mark.parametrize("budget", [None, 5])
+def test_parallel_filter_matches_a_plain_filter(budget):
+    entries = make_entries(1000)
+    test = phrase_matcher("task 3")
+    found = parallel_filter(test, entries, workers=3, budget=budget,
+                            min_entries=0)
+    assert found == list(filter(test, entries))
+
+
+def test_parallel_filter_runs_out_of_time():
+    entries = [Entry(number, "02/07/17", "Task", 5, "a" * 30 + "b")
+               for number in range(4)]
+    test = compile_regex("(a+)+$").search
+    with pytest.raises(SearchAborted):
+        parallel_filter(lambda item: test(item.notes), entries, workers=2,
+                        budget=0.5, min_entries=0)
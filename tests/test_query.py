@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+from query import QueryError, compile_query
+
+
+def test_terms_are_parsed():
+    query = compile_query('date:02/01/2017..02/28/2017 task:"accounts '
+                          'payable" mins:>=20 notes:/invoice \\d+/ zero')
+    assert query.days == [date(2017, 2, 1).toordinal(),
+                          date(2017, 2, 28).toordinal()]
+    assert query.minutes == [20, None]
+    fields = [field for field, regex in query.texts]
+    assert fields == ["task_name", "notes", None]
+
+
+def test_terms_narrow_each_other():
+    query = compile_query("mins:10..60 mins:<30 date:>=2017-02-07")
+    assert query.minutes == [10, 29]
+    assert query.days[0] == date(2017, 2, 7).toordinal()
+
+
+@pytest.mark.parametrize("text", [
+    "size:10",
+    "notes:/(unclosed/",
+    "date:02/30/2017",
+    "date:yesterday",
+    "mins:lots",
+])
+def test_invalid_queries_are_refused(text):
+    with pytest.raises(QueryError):
+        compile_query(text)
+
+
+@pytest.fixture
+def entry_store(fill_store):
+    entry_store = fill_store()
+    entry_store.refresh()
+    return entry_store
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("date:02/01/2017", [1, 2]),
+    ("date:02/01/2017..02/28/2017 mins:>=20", [1, 3, 4]),
+    ('task:"accounts payable"', [1, 6]),
+    ("notes:/invoice \\d+/", [1, 3, 6]),
+    ("invoice mins:<30", [5, 6]),
+    ("task:/^acc/ date:>2017-02-01", [3, 6]),
+    ("date:03/01/2017..02/01/2017", []),
+    ("", [1, 2, 3, 4, 5, 6]),
+])
+def test_search(entry_store, text, expected):
+    query = compile_query(text)
+    found = query.search(entry_store.entries)
+    assert [item.entry_ID for item in found] == expected
+    # The indexes only narrow down the candidates
+    indexed = query.search(entry_store.entries, entry_store.date_index(),
+                           entry_store.minutes_index(),
+                           entry_store.text_index())
+    assert [item.entry_ID for item in indexed] == expected
+
+
+def test_search_with_a_budget(entry_store):
+    found = compile_query("task:emails").search(entry_store.entries,
+                                                budget=5)
+    assert [item.entry_ID for item in found] == [2, 5]
@@ -0,0 +1,52 @@
+import pytest
+
+from entry import Entry
+from report import Summary, format_minutes, totals_line
+
+
+@pytest.fixture
+def entries(sample_rows):
+    return [Entry(number, *row) for number, row in enumerate(sample_rows, 1)]
+
+
+def totals(rows):
+    return [(row["period"], row["entries"], row["minutes"]) for row in rows]
+
+
+@pytest.mark.parametrize("period, expected", [
+    ("day", [("02/01/2017", 2, 40), ("02/07/2017", 1, 45),
+             ("02/20/2017", 1, 120), ("03/02/2017", 1, 5),
+             ("04/03/2017", 1, 25)]),
+    ("week", [("2017-W05", 2, 40), ("2017-W06", 1, 45), ("2017-W08", 1, 120),
+              ("2017-W09", 1, 5), ("2017-W14", 1, 25)]),
+    ("month", [("02/2017", 4, 205), ("03/2017", 1, 5), ("04/2017", 1, 25)]),
+    ("year", [("2017", 6, 235)]),
+    ("task", [("Accounts Payable", 2, 55), ("Accounts Receivable", 1, 45),
+              ("Emails", 2, 15), ("Worklog", 1, 120)]),
+])
+def test_rows(entries, period, expected):
+    assert totals(Summary(entries).rows(period)) == expected
+
+
+def test_entries_can_be_added_later(entries):
+    summary = Summary(entries[:2])
+    for item in entries[2:]:
+        summary.add(item)
+    assert summary.totals == Summary(entries).totals
+    assert summary.day(entries[0].date_ordinal) == (2, 40)
+    assert summary.day(1) == (0, 0)
+
+
+def test_undated_entries_come_first():
+    summary = Summary([Entry(1, "02/01/17", "Emails", 10),
+                       Entry(2, "someday", "Emails", 20)])
+    assert totals(summary.rows("month")) == [("Unknown date", 1, 20),
+                                             ("02/2017", 1, 10)]
+
+
+def test_formatting():
+    assert format_minutes(144) == "2:24"
+    assert format_minutes(5) == "0:05"
+    assert totals_line("02/14/17", 3, 144) \
+        == "02/14/17 (3 entries, 2:24 worked)"
+    assert totals_line("02/14/17", 1, 5) == "02/14/17 (1 entry, 0:05 worked)"
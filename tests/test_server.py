@@ -0,0 +1,244 @@
+import asyncio
+from http.client import HTTPConnection
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from query import compile_query
+from server import WorklogServer
+from store import EntryStore
+
+
+class RunningServer:
+    """Runs a WorklogServer on a free localhost port, with its event loop in
+    a background thread."""
+    def __init__(self, path):
+        self.server = WorklogServer(EntryStore(path), flush_delay=0.01,
+                                    search_budget=1)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.listener = self.call(self.server.start("127.0.0.1", 0))
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine,
+                                                self.loop).result(10)
+
+    def request(self, method, target, data=None, body=None):
+        """Sends a request, and returns (status, the decoded JSON)."""
+        if data is not None:
+            body = json.dumps(data)
+        connection = HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            connection.request(method, target, body)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    def stop(self):
+        async def close():
+            self.listener.close()
+            await self.listener.wait_closed()
+            await self.server.close()
+        self.call(close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def server(write_tasklog):
+    running = RunningServer(write_tasklog())
+    yield running
+    running.stop()
+
+
+def test_search(server):
+    status, found = server.request("GET", "/entries?q=task:emails")
+    assert status == 200
+    assert found["count"] == 2
+    assert [item["id"] for item in found["entries"]] == [2, 5]
+    assert found["entries"][0] == {
+        "id": 2, "entry_date": "02/01/17", "task_name": "Emails",
+        "mins_spent": 10, "notes": "Inbox zero"}
+
+    status, found = server.request(
+        "GET", "/entries?q=date:02/01/2017..02/28/2017+mins:>=30&limit=1")
+    assert (status, found["count"], len(found["entries"])) == (200, 3, 1)
+
+
+def test_invalid_search(server):
+    status, answer = server.request("GET", "/entries?q=size:10")
+    assert status == 400
+    assert "Unknown field" in answer["error"]
+    status, answer = server.request("GET", "/entries?limit=lots")
+    assert status == 400
+
+
+def test_add_get_edit_and_delete(server):
+    status, added = server.request("POST", "/entries", {
+        "entry_date": "04/03/2017", "task_name": "code review",
+        "mins_spent": 25})
+    assert status == 201
+    assert added == {"id": 7, "entry_date": "04/03/17",
+                     "task_name": "Code Review", "mins_spent": 25,
+                     "notes": ""}
+    assert server.request("GET", "/entries/7") == (200, added)
+
+    status, edited = server.request("PATCH", "/entries/7",
+                                    {"mins_spent": 40, "notes": "Server"})
+    assert status == 200
+    assert (edited["mins_spent"], edited["notes"]) == (40, "Server")
+
+    assert server.request("DELETE", "/entries/2") == (200, {"deleted": 2})
+    assert server.request("GET", "/entries/2")[0] == 404
+
+    # Everything is on disk, where other processes see it
+    loaded = EntryStore("tasklog.csv").refresh()
+    assert [(item.task_name, item.mins_spent, item.notes)
+            for item in loaded][-1] == ("Code Review", 40, "Server")
+    assert len(loaded) == 6
+
+
+def test_writes_are_batched(server):
+    async def add_many():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(None, server.request, "POST", "/entries",
+                                 {"task_name": "Task {}".format(number),
+                                  "mins_spent": number})
+            for number in range(1, 11)))
+    answers = asyncio.run(add_many())
+    assert sorted(answer["id"] for status, answer in answers) \
+        == list(range(7, 17))
+    assert len(EntryStore("tasklog.csv").refresh()) == 16
+
+
+@pytest.mark.parametrize("method, target, data, body, status", [
+    ("GET", "/entries/99", None, None, 404),
+    ("GET", "/entries/abc", None, None, 404),
+    ("GET", "/nowhere", None, None, 404),
+    ("PUT", "/entries", None, None, 405),
+    ("POST", "/entries/1", None, None, 405),
+    ("POST", "/report", None, None, 405),
+    ("POST", "/entries", None, "{not json", 400),
+    ("POST", "/entries", {"task_name": "Emails"}, None, 400),
+    ("POST", "/entries", {"task_name": "Emails", "mins_spent": 0}, None,
+     400),
+    ("PATCH", "/entries/1", {"colour": "red"}, None, 400),
+    ("PATCH", "/entries/1", {"entry_date": "02/30/2017"}, None, 400),
+    ("DELETE", "/entries/99", None, None, 404),
+    ("GET", "/report?by=decade", None, None, 400),
+])
+def test_errors(server, method, target, data, body, status):
+    answer_status, answer = server.request(method, target, data, body)
+    assert answer_status == status
+    assert "error" in answer
+
+
+def test_errors_in_the_server_get_a_500(server, monkeypatch):
+    def report(period):
+        raise RuntimeError("Something broke")
+    monkeypatch.setattr(server.server, "report", report)
+    assert server.request("GET", "/report") \
+        == (500, {"error": "Something broke"})
+    # The server carries on
+    assert server.request("GET", "/entries/1")[0] == 200
+
+
+def test_negative_content_length_is_refused(server):
+    with socket.create_connection(("127.0.0.1", server.port)) as connection:
+        connection.sendall(b"POST /entries HTTP/1.1\r\n"
+                           b"Content-Length: -1\r\n\r\n")
+        answer = connection.makefile("rb").readline()
+    assert answer.startswith(b"HTTP/1.1 400 ")
+
+
+def test_sqlite_tasklog(fill_store):
+    fill_store("tasklog.db")
+    running = RunningServer("tasklog.db")
+    try:
+        status, found = running.request("GET", "/entries?q=task:emails")
+        assert (status, found["count"]) == (200, 2)
+        status, added = running.request("POST", "/entries", {
+            "task_name": "Code Review", "mins_spent": 25})
+        assert (status, added["id"]) == (201, 7)
+        assert running.request("PATCH", "/entries/7", {"notes": "SQL"})[0] \
+            == 200
+        assert running.request("DELETE", "/entries/1") \
+            == (200, {"deleted": 1})
+        assert running.request("GET", "/report?by=year")[0] == 200
+    finally:
+        running.stop()
+    assert [item.notes for item in EntryStore("tasklog.db").refresh()][-1] \
+        == "SQL"
+
+
+def test_report(server):
+    status, report = server.request("GET", "/report?by=task")
+    assert status == 200
+    assert report["by"] == "task"
+    assert {row["period"]: (row["entries"], row["minutes"])
+            for row in report["rows"]}["Emails"] == (2, 15)
+
+    status, report = server.request("GET", "/report?by=month")
+    assert [(row["period"], row["minutes"]) for row in report["rows"]] \
+        == [("02/2017", 205), ("03/2017", 5), ("04/2017", 25)]
+
+
+def test_ids_after_another_process_rewrites(server):
+    assert server.request("GET", "/entries/5")[0] == 200
+    # Another process deletes the first entry, renumbering the rest
+    other = EntryStore("tasklog.csv")
+    other.replace(other.refresh()[1:])
+
+    assert server.request("GET", "/entries/2")[0] == 409
+    # Once the client has looked again, the new IDs work
+    status, entry = server.request("GET", "/entries/1")
+    assert (status, entry["task_name"]) == (200, "Emails")
+    assert server.request("GET", "/entries/6")[0] == 404
+
+
+def test_stale_delete_is_refused(server):
+    assert server.request("GET", "/entries/1")[0] == 200
+    other = EntryStore("tasklog.csv")
+    other.replace(other.refresh()[1:])
+
+    status, answer = server.request("DELETE", "/entries/2")
+    assert status == 409
+    assert len(EntryStore("tasklog.csv").refresh()) == 5
+
+
+def test_slow_search_runs_out_of_budget(server):
+    status, added = server.request("POST", "/entries", {
+        "task_name": "Regex", "mins_spent": 5, "notes": "a" * 30 + "b"})
+    assert status == 201
+
+    answers = {}
+
+    def slow_search():
+        answers["search"] = server.request(
+            "GET", "/entries?q=notes:/(a%2B)%2B$/")
+    searching = threading.Thread(target=slow_search)
+    searching.start()
+    time.sleep(0.2)
+    # Other requests are answered while the search runs
+    started = time.monotonic()
+    assert server.request("GET", "/report?by=day")[0] == 200
+    assert server.request("GET", "/entries/1")[0] == 200
+    assert time.monotonic() - started < 0.9
+    searching.join()
+    assert answers["search"][0] == 503
+
+
+def test_searches_get_their_own_list_of_candidates(server):
+    store = server.server.store
+    for text in ("", "notes:/(a+)+$/"):
+        candidates = server.server.candidates(compile_query(text))
+        assert candidates == store.entries
+        assert candidates is not store.entries
@@ -0,0 +1,78 @@
+import os
+
+from entry import Entry
+from snapshots import SnapshotStore, iter_chunks
+from store import ChangeSet, EntryStore
+
+
+def many_entries(count=3000):
+    return [Entry(number, "02/{:02}/17".format(number % 28 + 1),
+                  "Task {}".format(number % 7), number % 90 + 1,
+                  "Note {}".format(number))
+            for number in range(1, count + 1)]
+
+
+def test_chunks_cover_every_row():
+    entries = many_entries()
+    chunks = list(iter_chunks(entries))
+    assert len(chunks) > 1
+    assert sum(rows for chunk_hash, text, rows in chunks) == len(entries)
+
+
+def test_unchanged_chunks_are_not_written_again(as_rows):
+    entries = many_entries()
+    snapshots = SnapshotStore()
+    first = snapshots.create(entries)
+    assert first["written"] == len(first["chunks"])
+    assert snapshots.create(entries)["written"] == 0
+
+    entries[1500].notes = "Edited"
+    third = snapshots.create(entries)
+    assert third["written"] == 1
+    assert len(snapshots.names()) == 3
+    assert as_rows(snapshots.entries(third)) == as_rows(entries)
+
+
+def test_restore(write_tasklog, as_rows, sample_rows):
+    write_tasklog()
+    entry_store = EntryStore("tasklog.csv")
+    snapshots = SnapshotStore()
+    name = snapshots.create(entry_store.refresh())["name"]
+    assert not snapshots.restore(name, entry_store)
+
+    changes = ChangeSet()
+    changes.delete(entry_store.entries[0])
+    entry_store.apply(changes)
+    assert snapshots.restore(name, entry_store)
+    assert as_rows(entry_store.refresh()) == sample_rows
+
+
+def test_sharded_snapshots_reuse_the_shards(fill_store, as_rows,
+                                            sample_rows):
+    entry_store = fill_store("tasklog/")
+    snapshots = SnapshotStore()
+    manifest = snapshots.create(None, entry_store.backend.snapshot_chunks())
+    assert len(manifest["chunks"]) == 3
+    assert as_rows(snapshots.entries(manifest)) == sample_rows
+
+    entry_store.replace(entry_store.refresh()[:-1])
+    assert snapshots.restore(manifest["name"], entry_store)
+    assert as_rows(EntryStore("tasklog/").refresh()) == sample_rows
+
+
+def test_prune(as_rows):
+    entries = many_entries(500)
+    snapshots = SnapshotStore()
+    for number in range(3):
+        entries[0].notes = "Version {}".format(number)
+        snapshots.create(entries)
+    newest = snapshots.names()[-1]
+
+    assert snapshots.prune(keep=0) == 2
+    assert snapshots.names() == [newest]
+    # Only the chunks the newest snapshot uses are left
+    manifest = snapshots.manifest(newest)
+    assert sorted(os.listdir(snapshots.chunk_dir)) \
+        == sorted(manifest["chunks"])
+    assert as_rows(snapshots.entries(manifest)) == as_rows(entries)
+    assert snapshots.prune() == 0
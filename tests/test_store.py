@@ -0,0 +1,212 @@
+from datetime import date
+
+import pytest
+
+import sqlite_store
+import store
+from entry import Entry
+from store import ChangeSet, ConflictError, EntryStore, open_backend
+
+
+BACKENDS = ["tasklog.csv", "tasklog.db", "tasklog/"]
+
+
+@pytest.mark.parametrize("path", BACKENDS)
+def test_added_entries_are_read_back(path, fill_store, sample_rows, as_rows):
+    fill_store(path)
+    loaded = EntryStore(path).refresh()
+    assert as_rows(loaded) == sample_rows
+    assert [item.entry_ID for item in loaded] == [1, 2, 3, 4, 5, 6]
+
+
+@pytest.mark.parametrize("path", BACKENDS)
+def test_apply_edits_and_deletes(path, fill_store, sample_rows, as_rows):
+    entry_store = fill_store(path)
+    entries = entry_store.refresh()
+    changes = ChangeSet()
+    entries[0].mins_spent = 35
+    changes.edit(entries[0])
+    # Moves an entry to another month, which matters for the shards
+    entries[2].entry_date = "04/09/17"
+    changes.edit(entries[2])
+    changes.delete(entries[1])
+    entry_store.apply(changes)
+
+    expected = sample_rows
+    expected[0] = expected[0][:2] + (35,) + expected[0][3:]
+    expected[2] = ("04/09/17",) + expected[2][1:]
+    del expected[1]
+    assert sorted(as_rows(EntryStore(path).refresh())) == sorted(expected)
+
+
+@pytest.mark.parametrize("path", BACKENDS)
+def test_stream_between(path, fill_store):
+    fill_store(path)
+    found = open_backend(path).stream_between(date(2017, 2, 1),
+                                              date(2017, 2, 28))
+    assert [item.entry_ID for item in found] == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("path", BACKENDS)
+def test_indexes_match_the_entries(path, fill_store):
+    entry_store = fill_store(path)
+    entry_store.refresh()
+    found = entry_store.date_index().between(date(2017, 2, 7),
+                                             date(2017, 3, 31))
+    assert sorted(item.entry_ID for item in found) == [3, 4, 5]
+    found = entry_store.minutes_index().between(10, 30)
+    assert sorted(item.entry_ID for item in found) == [1, 2, 6]
+
+
+def test_refresh_keeps_the_loaded_list_until_the_file_changes(
+        write_tasklog):
+    write_tasklog()
+    entry_store = EntryStore("tasklog.csv")
+    loaded = entry_store.refresh()
+    assert entry_store.refresh() is loaded
+
+    other = EntryStore("tasklog.csv")
+    other.replace(other.refresh()[1:])
+    assert len(entry_store.refresh()) == 5
+
+
+def test_bad_minutes_are_read_as_zero(write_tasklog, capsys):
+    write_tasklog(rows=[("02/01/17", "Emails", "", "blank"),
+                        ("02/02/17", "Emails", "abc", "text"),
+                        ("02/03/17", "Emails", 15, "fine")])
+    loaded = EntryStore("tasklog.csv").refresh()
+    assert [item.mins_spent for item in loaded] == [0, 0, 15]
+    assert [item.notes for item in loaded] == ["blank", "text", "fine"]
+    warnings = capsys.readouterr().err
+    assert "line 2" in warnings and "line 3" in warnings
+
+
+def test_other_processes_appends_are_merged(fill_store, sample_rows,
+                                            as_rows):
+    first = fill_store(rows=sample_rows[:2])
+    first.refresh()
+    EntryStore("tasklog.csv").add(Entry(0, *sample_rows[2]))
+    loaded = first.entries
+    first.add(Entry(0, *sample_rows[3]))
+    # The other entry was read from the end of the file, not reloaded
+    assert first.entries is loaded
+    assert as_rows(first.entries) == sample_rows[:4]
+    assert [item.entry_ID for item in first.entries] == [1, 2, 3, 4]
+
+
+def test_apply_after_a_rewrite_is_refused(write_tasklog):
+    write_tasklog()
+    entry_store = EntryStore("tasklog.csv")
+    item = entry_store.refresh()[0]
+    # Another process rewrites the file, dropping the first row
+    other = EntryStore("tasklog.csv")
+    other.replace(other.refresh()[1:])
+
+    changes = ChangeSet()
+    changes.delete(item)
+    with pytest.raises(ConflictError):
+        entry_store.apply(changes)
+    assert len(EntryStore("tasklog.csv").refresh()) == 5
+
+
+def test_a_rewrite_is_told_apart_from_an_append(write_tasklog,
+                                                sample_rows):
+    write_tasklog()
+    backend = open_backend("tasklog.csv")
+    stamp = backend.stamp()
+    other = EntryStore("tasklog.csv")
+    other.replace(other.refresh()[1:] + [Entry(0, *sample_rows[0])] * 2)
+    # The new file is larger. Even if it got the old file's inode, the
+    # count of rewrites gives it away.
+    current = backend.stamp()
+    assert current[2] > stamp[2]
+    reused = (current[0],) + stamp[1:]
+    assert backend.appended_since(reused, 7) is None
+
+    stamp = current
+    EntryStore("tasklog.csv").add(Entry(0, *sample_rows[1]))
+    added = backend.appended_since(stamp, 8)
+    assert [(item.entry_ID, item.task_name) for item in added] \
+        == [(8, "Emails")]
+
+
+@pytest.mark.parametrize("path", BACKENDS)
+def test_open_stream_reads_pages(path, fill_store, monkeypatch, as_rows):
+    monkeypatch.setattr(store, "PAGE_ROWS", 4)
+    monkeypatch.setattr(sqlite_store, "PAGE_ROWS", 4)
+    fill_store(path)
+    stamp, entries = open_backend(path).open_stream()
+    streamed = list(entries)
+    loaded = EntryStore(path).refresh()
+    assert sorted(as_rows(streamed)) == sorted(as_rows(loaded))
+    assert sorted(item.entry_ID for item in streamed) == [1, 2, 3, 4, 5, 6]
+
+
+@pytest.mark.parametrize("path", BACKENDS)
+def test_changes_to_streamed_entries_are_saved(path, fill_store):
+    fill_store(path)
+    entry_store = EntryStore(path)
+    stamp, entries = entry_store.stream()
+    item = list(entries)[3]
+    item.notes = "Edited while browsing"
+    changes = ChangeSet()
+    changes.edit(item)
+    # Another process adds an entry after all the others in the meantime
+    EntryStore(path).add(Entry(0, "05/01/17", "Late", 15, ""))
+    entry_store.apply(changes, stamp)
+
+    loaded = EntryStore(path).refresh()
+    assert len(loaded) == 7
+    assert [item.task_name for item in loaded
+            if item.notes == "Edited while browsing"] == ["Worklog"]
+
+
+def test_streamed_changes_after_a_rewrite_are_refused(write_tasklog):
+    write_tasklog()
+    entry_store = EntryStore("tasklog.csv")
+    stamp, entries = entry_store.stream()
+    item = next(iter(entries))
+    other = EntryStore("tasklog.csv")
+    other.replace(other.refresh()[1:])
+
+    changes = ChangeSet()
+    changes.delete(item)
+    with pytest.raises(ConflictError):
+        entry_store.apply(changes, stamp)
+
+
+def test_sharded_apply_only_rewrites_touched_shards(fill_store):
+    entry_store = fill_store("tasklog/")
+    shards = entry_store.backend.shards()
+    assert sorted(shards) == ["2017-02", "2017-03", "2017-04"]
+    before = {name: shard["generation"] for name, shard in shards.items()}
+    entries = entry_store.refresh()
+    changes = ChangeSet()
+    entries[4].notes = "Edited"
+    changes.edit(entries[4])
+    entry_store.apply(changes)
+
+    after = {name: shard["generation"]
+             for name, shard in entry_store.backend.shards().items()}
+    assert [name for name in after if after[name] != before[name]] \
+        == ["2017-03"]
+
+
+def test_streamed_changes_after_an_earlier_month_grew_are_refused(
+        fill_store, sample_rows, as_rows):
+    fill_store("tasklog/")
+    entry_store = EntryStore("tasklog/")
+    stamp, entries = entry_store.stream()
+    item = list(entries)[4]
+    assert item.entry_date == "03/02/17"
+    # An entry for February moves every later entry's ID along
+    EntryStore("tasklog/").add(Entry(0, "02/21/17", "Late", 15, ""))
+
+    item.notes = "Edited while browsing"
+    changes = ChangeSet()
+    changes.edit(item)
+    with pytest.raises(ConflictError):
+        entry_store.apply(changes, stamp)
+    expected = sample_rows[:4] + [("02/21/17", "Late", 15, "")] \
+        + sample_rows[4:]
+    assert as_rows(EntryStore("tasklog/").refresh()) == expected
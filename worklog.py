@@ -6,24 +6,59 @@ worklog for the user. Each entry can hold a date, a taskname, the number
 of minutes spent working on it, and some notes about what was accomplished.
 
 Entries are stored in a CSV file named "tasklog.csv", and can be displayed
-through a text menu.
-
-Ideas for future updates:
-1) Date list:
-    - If the list of worklog dates spans more than a month, add a layer
-      to the list which summarizes by month. (And again for the year).
-    - For each date entry, display something like
-      "MM/DD/YYYY (3 entries, 2:24 worked)"
+through a text menu. Setting $WORKLOG_FILE to a ".db" file keeps entries
+in a SQLite database instead (see sqlite_store.py), and setting it to a
+folder (like "tasklog/") keeps a CSV file for each month there (see
+store.ShardedBackend). The "migrate" command copies an existing tasklog
+into either one. Running the program with a
+command (add, search, report, analytics, timer, backup, restore, migrate,
+import, or serve) skips the menu, so it can be used from scripts:
+
+    python worklog.py add --task "Accounts Payable" --minutes 20
+    python worklog.py search --date-range 02/01/2017 02/28/2017 --json
+    python worklog.py search --regex "invoice" --minutes 10 60
+    python worklog.py search --query 'task:"accounts payable" mins:>=20'
+    python worklog.py import export.jsonl --dry-run
+    python worklog.py timer start "Accounts Payable"
+    python worklog.py timer stop "Accounts Payable" --notes "March bills"
+
+"serve" runs a local HTTP server with a JSON API instead (see server.py),
+so several clients can share one copy of the tasklog in memory.
+
+Timers (the menu's [M]arker, or the "timer" command) can run for several
+tasks at once, and are kept in "time_markers.json" (see markers.py).
+
+The list of dates shows the number of entries and time worked on each day
+(grouped by month when there's more than one), and the report screen
+totals them by day, week, month, year, or task.
 """
 
 
 from datetime import date, time, timedelta, datetime
+from itertools import islice
+import argparse
+import csv
+import json
 import os
 import re
-import csv
-
-
-from entry import Entry
+import sys
+
+
+from analytics import ROLLING_DAYS, Analytics
+from entry import Entry, date_ordinal, format_entry_date, parse_date
+from importer import import_entries, read_records
+from markers import MarkerStore, elapsed_minutes, marker_label, timer_name
+from index import DateIndex
+from pages import EntryCursor
+from patterns import (SEARCH_BUDGET, SearchAborted, compile_regex,
+                      parallel_filter, phrase_matcher, phrase_regex)
+from profiling import enable, enable_from_env, stage, stream_stage
+from query import QueryError, compile_query
+from report import PERIODS, Summary, period_keys, period_label, totals_line
+from server import HOST, PORT, serve
+from snapshots import BACKUP_DIR, KEEP_SNAPSHOTS, SnapshotStore
+from store import (ChangeSet, ConflictError, EntryStore, FIELDNAMES,
+                   entry_row, open_backend, write_entries, append_entry)
 
 
 def cls():
@@ -50,19 +85,34 @@ def edit_text(text):
     return new_text
 
 
-def search_menu(complete_list):
+def save_changes(store, changes, stamp=None):
+    """Saves the edits and deletions made to displayed entries.
+
+    If another process rewrote the tasklog in the meantime, the changes
+    aren't saved, and the user is told so.
+
+    :param stamp: the stamp from store.stream(), if the entries came from
+            it.
+    """
+    try:
+        store.apply(changes, stamp)
+    except ConflictError as error:
+        input("[Press Enter] {} Please make them again.".format(error))
+
+
+def search_menu(store):
     """The menu which appears to let users choose a search method.
 
     Allows the user to select a search method, then searches through the
     complete list and passes only matching entries to the display function.
-    Any edited or deleted entries are fixed, and returned.
+    Any edited or deleted entries are fixed, saved, and returned.
 
-    :param complete_list: The complete list from the "tasklog.csv" file.
+    :param store: The EntryStore holding the "tasklog.csv" entries.
 
     :return: An updated version of the list, which omits deleted entries
             and updates edited entries.
     """
-
+    complete_list = store.refresh()
     while True:
         cls()
         print("---------------------")
@@ -72,6 +122,7 @@ def search_menu(complete_list):
         print("[R]egex - Search for a specific Regex pattern")
         print("[S]tring - Search for a specific string keyword or phrase")
         print("[T]ime Spent - Search by the amount of time spent")
+        print("[Q]uery - Search by date, task, minutes and notes at once")
         print("[B]ack to the main menu")
         print("---------------------")
         try:
@@ -79,41 +130,38 @@ def search_menu(complete_list):
         except:
             continue
 
-        SEARCH_TYPES = ["D", "R", "S", "T"]
+        SEARCH_TYPES = ["D", "R", "S", "T", "Q"]
         filtered_list = []
-        deleted_ids = []
 
         if read_input == "B":
             return complete_list
         elif read_input not in SEARCH_TYPES:
-            input("[Press Enter] and then please type D, R, S, T or B")
+            input("[Press Enter] and then please type D, R, S, T, Q or B")
             continue
 
         # Gets a filtered list, based on date, string, regex, or minutes
         if read_input == "D":
-            filtered_list = date_filter(complete_list)
+            filtered_list = date_filter(complete_list, store.date_index(),
+                                        store.summary())
         elif read_input == "R":
-            filtered_list = regex_filter(complete_list)
+            filtered_list = regex_filter(complete_list,
+                                         store.text_index())
         elif read_input == "S":
-            filtered_list = string_filter(complete_list)
+            filtered_list = string_filter(complete_list,
+                                          store.text_index())
         elif read_input == "T":
-            filtered_list = minutes_filter(complete_list)
+            filtered_list = minutes_filter(complete_list,
+                                           store.minutes_index())
+        elif read_input == "Q":
+            filtered_list = query_filter(complete_list, store.date_index(),
+                                         store.minutes_index(),
+                                         store.text_index())
 
         # Passes the filtered list to the display function
         if len(filtered_list):
-            filtered_list, deleted_ids = display_list(filtered_list)
-            for item in complete_list:
-                # Removes deleted items, and updates edited items
-                if item.entry_ID in deleted_ids:
-                    complete_list.remove(item)
-                    continue
-                for inner_item in filtered_list:
-                    if item.entry_ID == inner_item.entry_ID:
-                        item.entry_date = inner_item.entry_date
-                        item.task_name = inner_item.task_name.capitalize()
-                        item.mins_spent = inner_item.mins_spent
-                        item.notes = inner_item.notes
-                        continue
+            changes = display_list(filtered_list)
+            # Removes deleted items, updates edited items, and saves them
+            save_changes(store, changes)
         else:
             print("There is nothing to display.")
             input("[Press Enter]")
@@ -122,7 +170,7 @@ def search_menu(complete_list):
     return complete_list
 
 
-def date_filter(complete_list):
+def date_filter(complete_list, date_index=None, summary=None):
     """Takes a list and filters it based on date.
 
     Receives a list of Entry objects, then prompts users to either choose a
@@ -130,9 +178,17 @@ def date_filter(complete_list):
     finds all corresponding entries, and returns the filtered list.
 
     :param complete_list: an unfiltered list of all entries.
+    :param date_index: a DateIndex of complete_list. One is built if it
+            isn't given.
+    :param summary: a Summary of complete_list, for the totals shown in
+            the list of dates. One is built if it isn't given.
 
-    :returns: a list of relevant entries
+    :returns: a list of relevant entries, sorted by date
     """
+    if date_index is None:
+        date_index = DateIndex(complete_list)
+    if summary is None:
+        summary = Summary(complete_list)
     filtered_list = []
     date1 = ""
     date2 = ""
@@ -149,14 +205,9 @@ def date_filter(complete_list):
             while True:
                 # Display a list of dates, and have them pick one
                 cls()
-                dates_to_display = []
-                for item in complete_list:
-                    add_date = item.entry_date
-                    if add_date not in dates_to_display:
-                        dates_to_display.append(add_date)
+                dates_to_display = date_index.dates()
                 print("Available Dates:")
-                for display_date in dates_to_display:
-                    print(display_date)
+                print_date_list(dates_to_display, summary)
                 print("[C]ancel")
                 print("============")
 
@@ -167,6 +218,8 @@ def date_filter(complete_list):
                     if chosen_date[0].upper() == "C":
                         break
                     elif chosen_date in dates_to_display:
+                        filtered_list = date_index.on(
+                            date_ordinal(chosen_date))
                         break
                     else:
                         input("[Press Enter] then please type a date above")
@@ -174,29 +227,93 @@ def date_filter(complete_list):
                 except:
                     input("[Press Enter] then please type a date above")
                     continue
-            for item in complete_list:
-                if item.entry_date == chosen_date:
-                    filtered_list.append(item)
             break
         elif read_input == "R":
             # Get 2 dates to search between
             date1, date2 = get_date_range()
-            for item in complete_list:
-                entry_date = item.get_readable_date()
-                temp_date = date(
-                    int(entry_date[6:10]),
-                    int(entry_date[0:2]),
-                    int(entry_date[3:5])
-                )
-                if date1 <= temp_date <= date2:
-                    filtered_list.append(item)
+            with stage("filter: date", len(complete_list)):
+                filtered_list = date_index.between(date1, date2)
             break
         else:
             input("[Press Enter] and then please type L or R")
     return filtered_list
 
 
-def regex_filter(complete_list):
+def report_menu(store):
+    """Shows the totals for each day, week, month, year, or task.
+
+    :param store: The EntryStore holding the "tasklog.csv" entries.
+    """
+    while True:
+        cls()
+        print("---------------------")
+        print("|   Report Menu:    |")
+        print("---------------------")
+        print("Total the entries and time worked for each...")
+        print("[D]ay | [W]eek | [M]onth | [Y]ear | [T]ask")
+        print("[H]istogram of how long tasks take")
+        print("[A]verage minutes per day (over {} days)".format(ROLLING_DAYS))
+        print("[B]ack to the main menu")
+        print("---------------------")
+        try:
+            read_input = input("> ")[0].upper()
+        except:
+            continue
+        if read_input == "B":
+            break
+        if read_input == "H":
+            cls()
+            for row in store.analytics().duration_histogram():
+                print("{:>10} minutes: {}".format(row["minutes"],
+                                                  row["entries"]))
+            input("[Press Enter]")
+            continue
+        if read_input == "A":
+            cls()
+            # The last month is plenty for a screen
+            for row in store.analytics().rolling_average()[-30:]:
+                print("{}: {:>4} minutes (average {:.1f})".format(
+                    row["date"], row["minutes"], row["average"]))
+            input("[Press Enter]")
+            continue
+        period = {"D": "day", "W": "week", "M": "month", "Y": "year",
+                  "T": "task"}.get(read_input)
+        if period is None:
+            input("[Press Enter] and then please type D, W, M, Y, T, H, A "
+                  "or B")
+            continue
+        cls()
+        for row in store.summary().rows(period):
+            print(totals_line(row["period"], row["entries"], row["minutes"]))
+        input("[Press Enter]")
+
+
+def print_date_list(dates_to_display, summary):
+    """Prints each date with its number of entries and time worked.
+
+    If the dates cover more than one month, each month's dates are grouped
+    under a line with the month's totals.
+
+    :param dates_to_display: entry_date strings, in date order.
+    :param summary: a Summary of the entries.
+    """
+    months = {period_keys(date_ordinal(display_date))[2]
+              for display_date in dates_to_display}
+    last_month = None
+    for display_date in dates_to_display:
+        ordinal = date_ordinal(display_date)
+        indent = ""
+        if len(months) > 1:
+            indent = "    "
+            month = period_keys(ordinal)[2]
+            if month != last_month:
+                print(totals_line(period_label("month", month),
+                                  *summary.totals["month"][month]))
+                last_month = month
+        print(indent + totals_line(display_date, *summary.day(ordinal)))
+
+
+def regex_filter(complete_list, text_index=None):
     """Takes a list and filters it based on a regex pattern.
 
     Receives a list of Entry objects, then prompts users to provide a
@@ -204,6 +321,8 @@ def regex_filter(complete_list):
     the filtered list.
 
     :param complete_list: an unfiltered list of all entries.
+    :param text_index: an optional TextIndex of complete_list, used to
+            skip entries which can't match.
 
     :returns: a list of relevant entries
     """
@@ -217,20 +336,24 @@ def regex_filter(complete_list):
         read_input = input("> ")
         if read_input.upper() == "C":
             break
-        regex = re.compile(read_input, re.IGNORECASE)
-        for item in complete_list:
-            try:
-                if regex.search(item.task_name) is not None \
-                        or regex.search(item.notes) is not None:
-                    filtered_list.append(item)
-            except:
-                input("Improper Regex format. [Press Enter]")
+        try:
+            regex = compile_regex(read_input)
+        except re.error:
+            input("Improper Regex format. [Press Enter]")
+            continue
+        print("Searching... (Ctrl+C to stop)")
+        try:
+            filtered_list = text_search(complete_list, regex, text_index,
+                                        SEARCH_BUDGET)
+        except SearchAborted as error:
+            input("{} Try a simpler pattern. [Press Enter]".format(error))
+            continue
         break
 
     return filtered_list
 
 
-def string_filter(complete_list):
+def string_filter(complete_list, text_index=None):
     """Takes a list and filters it based on a string.
 
     Receives a list of Entry objects, then prompts users to provide a
@@ -238,6 +361,8 @@ def string_filter(complete_list):
     the filtered list.
 
     :param complete_list: an unfiltered list of all entries.
+    :param text_index: an optional TextIndex of complete_list, used to
+            skip entries which can't match.
 
     :returns: a list of relevant entries
     """
@@ -252,47 +377,124 @@ def string_filter(complete_list):
         elif not read_input:
             continue
         else:
-            read_input = re.compile(read_input, re.IGNORECASE)
-            for item in complete_list:
-                if read_input.search(item.task_name) is not None \
-                        or read_input.search(item.notes) is not None:
-                    filtered_list.append(item)
+            filtered_list = phrase_search(complete_list, read_input,
+                                          text_index)
             break
     return filtered_list
 
 
+def query_filter(complete_list, date_index=None, minutes_index=None,
+                 text_index=None):
+    """Takes a list and filters it with a query (see query.py).
+
+    Receives a list of Entry objects, then prompts users to type a query
+    combining dates, task names, minutes, and notes. Then it finds all
+    entries matching every part of it, and returns the filtered list.
+
+    :param complete_list: an unfiltered list of all entries.
+    :param date_index: an optional DateIndex of complete_list.
+    :param minutes_index: an optional MinutesIndex of complete_list.
+    :param text_index: an optional TextIndex of complete_list.
+
+    :returns: a list of relevant entries
+    """
+    filtered_list = []
+    while True:
+        cls()
+        print("Please type a query. For example:")
+        print('date:02/01/2017..02/28/2017 task:"accounts payable" mins:>=20 '
+              'notes:/invoice/')
+        print("Use date:, mins:, task: or notes:, or plain text to find in "
+              "any of them.")
+        print("[C]ancel")
+        read_input = input("> ")
+        if read_input.upper() == "C":
+            break
+        elif not read_input.strip():
+            continue
+        try:
+            query = compile_query(read_input)
+        except QueryError as error:
+            input("{} [Press Enter]".format(error))
+            continue
+        print("Searching... (Ctrl+C to stop)")
+        try:
+            filtered_list = query.search(complete_list, date_index,
+                                         minutes_index, text_index,
+                                         SEARCH_BUDGET)
+        except SearchAborted as error:
+            input("{} [Press Enter]".format(error))
+            continue
+        break
+    return filtered_list
+
+
+def text_search(complete_list, regex, text_index=None, budget=None):
+    """Finds the entries whose task name or notes match a compiled regex.
+
+    If a TextIndex is given, only the entries it picks out as candidates
+    are checked against the regex.
+
+    :param budget: the most seconds the search may take, or None for no
+            limit. With a budget, a large search is spread across the CPUs
+            (see patterns.parallel_filter()).
+
+    :returns: a list of matching entries, in their original order
+    :raises SearchAborted: if the budget runs out.
+    """
+    candidates = None
+    if text_index is not None:
+        candidates = text_index.candidates(regex)
+    if candidates is None:
+        candidates = complete_list
+
+    with stage("filter: regex", len(candidates)):
+        if budget is not None:
+            return parallel_filter(text_matcher(regex), candidates,
+                                   budget=budget)
+        return list(filter(text_matcher(regex), candidates))
+
+
+def phrase_search(complete_list, phrase, text_index=None):
+    """Finds the entries whose task name or notes contain a phrase, ignoring
+    case. The phrase is matched exactly, without any regex.
+
+    :returns: a list of matching entries, in their original order
+    """
+    candidates = None
+    if text_index is not None:
+        candidates = text_index.candidates(phrase_regex(phrase))
+    if candidates is None:
+        candidates = complete_list
+
+    with stage("filter: string", len(candidates)):
+        return list(filter(phrase_matcher(phrase), candidates))
+
+
 def get_date_range():
     """Prompts the user to provide a range of two formatted dates.
 
     :return date1, date2: Two dates which can be searched between.
     """
-    date1 = date(1900, 1, 1)
-    date2 = date(1900, 1, 1)
     while True:
         cls()
         print("Using MM/DD/YYYY format, please enter the start date:")
         raw_date = input("> ")
         if re.match(r"\d{2}/\d{2}/\d{4}", raw_date) is not None:
-            try:
-                date1 = date(int(raw_date[6:10]),
-                             int(raw_date[0:2]),
-                             int(raw_date[3:5]))
+            date1 = parse_date(raw_date)
+            if date1 is not None:
                 break
-            except:
-                input("[Press Enter] That was not a valid format. Use MM/DD/YYYY")
-                continue
-        else:
-            input("[Press Enter] That was not a valid format. Use MM/DD/YYYY")
-            continue
+        input("[Press Enter] That was not a valid format. Use MM/DD/YYYY")
     while True:
         cls()
         print("Using MM/DD/YYYY format, please enter the ending date:")
         raw_date = input("> ")
         if re.match(r"\d{2}/\d{2}/\d{4}", raw_date) is not None:
-            date2 = date(int(raw_date[6:10]),
-                         int(raw_date[0:2]),
-                         int(raw_date[3:5]))
-            if date2 >= date1:
+            date2 = parse_date(raw_date)
+            if date2 is None:
+                input("[Press Enter] That was not a valid format. "
+                      "Use MM/DD/YYYY")
+            elif date2 >= date1:
                 break
             else:
                 input("[Press Enter] This date must"
@@ -305,7 +507,7 @@ def get_date_range():
     return date1, date2
 
 
-def minutes_filter(complete_list):
+def minutes_filter(complete_list, minutes_index=None):
     """Takes a list and filters it based on minutes worked.
 
     Receives a list of Entry objects, then prompts users to choose a range
@@ -313,10 +515,11 @@ def minutes_filter(complete_list):
     filtered list.
 
     :param complete_list: an unfiltered list of all entries.
+    :param minutes_index: an optional MinutesIndex of complete_list, used
+            instead of checking every entry.
 
     :returns: a list of relevant entries
     """
-    filtered_list = []
     first_num = 0
     second_num = 0
     while True:
@@ -353,22 +556,80 @@ def minutes_filter(complete_list):
         finally:
             break
 
-    for item in complete_list:
-        if int(item.mins_spent) >= first_num and int(item.mins_spent) <= second_num:
-            filtered_list.append(item)
-    return filtered_list
+    if minutes_index is not None:
+        with stage("filter: minutes", len(complete_list)):
+            return minutes_index.between(first_num, second_num)
+    return minutes_search(complete_list, first_num, second_num)
+
 
+def minutes_search(complete_list, low, high):
+    """Finds the entries which took between low and high minutes, inclusive.
 
-def new_entry(count):
+    :returns: a list of matching entries, in their original order
+    """
+    with stage("filter: minutes", len(complete_list)):
+        return list(filter(minutes_matcher(low, high), complete_list))
+
+
+def date_search(complete_list, date1, date2):
+    """Finds the entries dated between date1 and date2, inclusive.
+
+    This checks every entry, which is quicker than building a DateIndex for
+    a single search.
+
+    :returns: a list of matching entries, in their original order
+    """
+    with stage("filter: date", len(complete_list)):
+        return list(filter(date_matcher(date1, date2), complete_list))
+
+
+def date_matcher(date1, date2):
+    """Returns a test for entries dated between date1 and date2, inclusive."""
+    low = date1.toordinal()
+    high = date2.toordinal()
+    return lambda item: low <= item.date_ordinal <= high
+
+
+def minutes_matcher(low, high):
+    """Returns a test for entries which took between low and high minutes."""
+    return lambda item: low <= item.mins_spent <= high
+
+
+def text_matcher(regex):
+    """Returns a test for entries whose task name or notes match a regex."""
+    return lambda item: regex.search(item.task_name) is not None \
+        or regex.search(item.notes) is not None
+
+
+def filter_entries(entries, matchers, limit=None):
+    """Lazily yields the entries which pass every test.
+
+    Nothing is read until the results are iterated over, so with a streamed
+    input (like iter_entries()) only one entry is held in memory at a time,
+    and reading stops as soon as the limit is reached.
+
+    :param entries: any iterable of Entry objects.
+    :param matchers: a list of tests, from date_matcher(), minutes_matcher()
+            or text_matcher(). Put the cheapest first, since later ones are
+            skipped for entries which already failed.
+    :param limit: the most entries to yield, or None for all of them.
+    """
+    matches = (item for item in entries
+               if all(matcher(item) for matcher in matchers))
+    return islice(matches, limit)
+
+
+def new_entry(count, markers):
     """Prompts for a new entry to the existing list of Entry objects.
 
+    :param markers: the MarkerStore, whose timers can supply the minutes
+            (and the task name).
+
     :return: the new Entry to be appended to the list.
     """
-    new_date = str(date.today())
-    new_date = "{}/{}/{}".format(new_date[5:7], new_date[8:10], new_date[2:4])
+    new_date = format_entry_date(date.today())
 
-    task_name = ""
-    mins = use_time_marker()
+    mins, task_name = use_time_marker(markers)
 
     while not task_name:
         cls()
@@ -402,159 +663,149 @@ def new_entry(count):
     return add_entry
 
 
-def new_time_marker():
-    overwrite = True
-    if os.path.exists("time_marker.txt"):
-        with open("time_marker.txt","r") as file:
-            marker = file.read()
-        if input("There is already a marker at {}. "
-                 "Would you like to replace it? Y/N\n> ".format(
-                 marker
-                 ))[0].upper() == "N":
-            overwrite = False
+def new_time_marker(markers):
+    """Starts a timer for a task, which a new entry can use later.
 
-    if overwrite:
-        print_time = datetime.now().strftime("%I:%M%p")
-        with open("time_marker.txt", "w") as file:
-            file.write(print_time)
+    :param markers: the MarkerStore holding the timers.
+    """
+    cls()
+    name = timer_name(input("Which task is the timer for? (Leave blank for "
+                            "an unnamed timer)\n> "))
+    started = markers.timers().get(name)
+    if started is not None:
+        if input("{} already. Would you like to restart it? Y/N\n> ".format(
+                marker_label(name, started)))[:1].upper() != "Y":
+            return
+    markers.start(name)
 
 
-def use_time_marker():
+def use_time_marker(markers):
+    """Offers the running timers as a new entry's start time, and stops the
+    one picked.
 
-    try:
-        mins = timedelta()
-        with open("time_marker.txt", "r") as file:
-            marker = datetime.strptime(file.read(), "%I:%M%p")
-            mins = datetime.now() - datetime(year=datetime.now().year,
-                                             month=datetime.now().month,
-                                             day=datetime.now().day,
-                                             hour=marker.hour,
-                                             minute=marker.minute,
-                                             second=0
-                                             )
-        read_input = ""
-        while not read_input:
-            cls()
-            read_input = input("There is a marker at {}. Would you like to use "
-                               "this as your start time? Y/N\n> ".format(
-                                marker.strftime("%I:%M%p")
-                                ))[0].upper()
-            if read_input == "Y":
-                try:
-                    os.system("rm -Rf time_marker.txt")
-                except:
-                    pass
-                return int(mins.seconds/60)
-            elif read_input == "N":
-                return 0
-            else:
-                input("[Press Enter] Then please type Y or N.")
+    :param markers: the MarkerStore holding the timers.
 
-    except:
-        return 0
+    :return: (minutes, task name) from the timer, or (0, "") if none was
+            used. The task name is blank for an unnamed timer.
+    """
+    timers = list(markers.timers().items())
+    while timers:
+        cls()
+        print("Running timers:")
+        for number, (name, started) in enumerate(timers, 1):
+            print("{}: {}".format(number, marker_label(name, started)))
+        read_input = input("Type a timer's number to use it as your start "
+                           "time, or N not to.\n> ").strip().upper()
+        if read_input == "N":
+            break
+        try:
+            number = int(read_input)
+            if number < 1:
+                raise ValueError(number)
+            name, started = timers[number - 1]
+        except (ValueError, IndexError):
+            input("[Press Enter] Then please type a number from the list, "
+                  "or N.")
+            continue
+        mins = markers.stop(name)
+        if mins is None:
+            input("[Press Enter] That timer was already used by another "
+                  "worklog.")
+            break
+        return mins, name
+    return 0, ""
 
 
 def load_csv():
-    """Loads the CSV file and returns a list of Entry objects.
+    """Loads the CSV file and returns a list of Entry objects, through its
+    binary cache (see cache.py).
 
     :return: A list of Entry objects.
     """
-    complete_list = []
-    count = 0
-
-    if os.path.exists("tasklog.csv"):
-        with open("tasklog.csv") as csvfile:
-            rows = list(csv.DictReader(csvfile))
-            for row in rows:
-                count += 1
-                add_entry = Entry(
-                    count,
-                    row["entry_date"],
-                    str(row["task_name"]),
-                    row["mins_spent"],
-                    row["notes"]
-                )
-
-                complete_list.append(add_entry)
-
-    return complete_list
+    return open_backend("tasklog.csv").load()
 
 
 def save_csv(updated_list):
-    """Saves the CSV file."""
-    with open("tasklog.csv", "w") as csvfile:
-        fieldnames = ["entry_date", "task_name", "mins_spent", "notes"]
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    """Saves the CSV file, replacing it in one step."""
+    with stage("save", len(updated_list)):
+        open_backend("tasklog.csv").save(updated_list)
 
-        csvwriter.writeheader()
-        for item in updated_list:
-            csvwriter.writerow({
-                "entry_date": item.entry_date,
-                "task_name": item.task_name,
-                "mins_spent": item.mins_spent,
-                "notes": item.notes
-            })
 
+def append_csv(new_item):
+    """Adds a single entry to the end of the CSV file.
 
-def backup_csv(updated_list):
-    """Saves the CSV file in a second location in case something goes wrong."""
-    cls()
-    print("This creates a backup of the current tasklog, and overrides"
-          " any existing backup.")
-    if input("Type \"BACKUP\" in all caps to continue:\n> ") == "BACKUP":
-
-
-        with open("backup.csv", "w") as csvfile:
-            fieldnames = ["entry_date", "task_name", "mins_spent", "notes"]
-            csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-            csvwriter.writeheader()
-            for item in updated_list:
-                csvwriter.writerow({
-                    "entry_date": item.entry_date,
-                    "task_name": item.task_name,
-                    "mins_spent": item.mins_spent,
-                    "notes": item.notes
-                })
-        cls()
-        input("[Press Enter] Backup created!")
-    else:
-        input("[Press Enter] Backup cancelled -- \"BACKUP\" required as input.")
+    :param new_item: the Entry to be added.
+    """
+    append_entry("tasklog.csv", new_item)
+
+
+def backup_csv(updated_list, backend=None):
+    """Saves a snapshot of the tasklog in case something goes wrong.
 
+    Snapshots are incremental (see snapshots.py), so only the parts of the
+    tasklog which changed since the last one are written. The newest
+    KEEP_SNAPSHOTS snapshots are kept.
 
-def load_backup(current_list):
+    :param backend: the tasklog's backend, whose own chunks are used if it
+            has any (see snapshot_chunks()).
+    """
     cls()
-    backup_list = []
-    count = 0
-    if os.path.exists("backup.csv"):
-        with open("backup.csv") as csvfile:
-            rows = list(csv.DictReader(csvfile))
-            for row in rows:
-                count += 1
-                add_entry = Entry(
-                    count,
-                    row["entry_date"],
-                    str(row["task_name"]),
-                    int(row["mins_spent"]),
-                    row["notes"]
-                )
-
-                backup_list.append(add_entry)
+    snapshots = SnapshotStore()
+    if backend is None:
+        manifest = snapshots.create(updated_list)
     else:
-        input("[Press Enter] There is no backup file yet.")
+        with backend.lock(shared=True):
+            manifest = snapshots.create(updated_list,
+                                        backend.snapshot_chunks())
+    snapshots.prune()
+    input("[Press Enter] Backup {} created! ({} of {} chunks written)".format(
+        manifest["name"], manifest["written"], len(manifest["chunks"])))
+
+
+def load_backup(store):
+    """Replaces the tasklog with one of the saved snapshots.
+
+    :param store: the EntryStore to load the backup into.
+    """
+    snapshots = SnapshotStore()
+    names = snapshots.names()[::-1]
+    if not names:
+        input("[Press Enter] There is no backup yet.")
         return
 
-    backup = True
-    if len(current_list) > len(backup_list):
+    while True:
+        cls()
+        print("Backups, newest first:")
+        manifests = [snapshots.manifest(name) for name in names]
+        for number, manifest in enumerate(manifests, 1):
+            print("[{}] {} ({} entries)".format(
+                number, manifest["created"].replace("T", " "),
+                manifest["entries"]))
+        print("Type the number of a backup to load, or [B] to go back:")
+        read_input = input("> ").strip()
+        if read_input.upper() == "B":
+            return
+        try:
+            manifest = manifests[int(read_input) - 1]
+            if int(read_input) < 1:
+                raise ValueError
+            break
+        except (IndexError, ValueError):
+            input("[Press Enter] and then type a number from 1 to {}".format(
+                len(manifests)))
+
+    current_list = store.refresh()
+    if len(current_list) > manifest["entries"]:
         print("This will override {} new entries.".format(
-                len(current_list) - len(backup_list)
+                len(current_list) - manifest["entries"]
                 ))
         print("To override, type \"CONTINUE\" in all caps:")
-        if input("> ") == "CONTINUE":
-            backup = False
-    if backup:
-        save_csv(backup_list)
+        if input("> ") != "CONTINUE":
+            return
+    if snapshots.restore(manifest["name"], store):
         input("[Press Enter] Backup loaded into current list!")
+    else:
+        input("[Press Enter] The tasklog already matches that backup.")
 
 
 def display_list(entries):
@@ -566,25 +817,32 @@ def display_list(entries):
     entries -- a list of entries which can be edited, deleted, or iterated.
     This list of entries should be filtered beforehand. For example, if
     searching by "task_name", this would be a list of only valid entries.
+    It can also be a stream of entries, which is only read as far as the
+    user browses (see pages.py), or an EntryCursor already made from them.
+    A list is browsed in place, not copied.
 
-    :returns: the edited list of entries, and a list of any deleted entries.
+    :returns: a ChangeSet of the entries which were edited or deleted.
     """
-    count = 0
-    deleted_ids = []
+    cursor = entries
+    if not isinstance(cursor, EntryCursor):
+        cursor = EntryCursor(entries)
+    changes = ChangeSet()
     while True:
-        if not len(entries):
+        if cursor.is_empty():
             input("This list is now empty. [Press Enter]")
             break
+        item = cursor.current()
         cls()
         print("==============================")
-        print("Task No.:    {}/{}".format(count + 1, len(entries)))
-        print("Task Name:   {}".format(entries[count].task_name))
-        print("Timestamp:   {}".format(entries[count].get_readable_date()))
-        print("Time (Mins): {}".format(entries[count].mins_spent))
-        print("Task Notes:  {}".format(entries[count].notes))
+        print("Task No.:    {}/{}".format(cursor.number(), cursor.total()))
+        print("Task Name:   {}".format(item.task_name))
+        print("Timestamp:   {}".format(item.get_readable_date()))
+        print("Time (Mins): {}".format(item.mins_spent))
+        print("Task Notes:  {}".format(item.notes))
         print("==============================")
 
-        menu_options = "[P]revious | [N]ext | [E]dit | [D]elete | [B]ack"
+        menu_options = ("[P]revious | [N]ext | [J]ump | [E]dit | [D]elete | "
+                        "[B]ack")
         print(menu_options)
         try:
             choice = input("> ").upper()
@@ -593,33 +851,38 @@ def display_list(entries):
         if choice == "B":
             break
         elif choice == "N":
-            if count < len(entries) - 1:
-                count += 1
-            else:
-                count = 0
+            cursor.next()
         elif choice == "P":
-            if count > 0:
-                count -= 1
+            cursor.previous()
+        elif choice == "J":
+            target = input("Jump to a task number, or a date (MM/DD/YYYY)\n> ")
+            if target.strip().isdigit():
+                if not cursor.jump(int(target)):
+                    input("[Press Enter] There is no task {}.".format(
+                        target.strip()))
+            elif parse_date(target.strip()) is not None:
+                if not cursor.jump_to_date(
+                        parse_date(target.strip()).toordinal()):
+                    input("[Press Enter] There are no tasks on {}.".format(
+                        target.strip()))
             else:
-                count = len(entries) - 1
+                input("[Press Enter] Type a number, or a date in MM/DD/YYYY")
         elif choice == "D":
             try:
                 if input("Are you sure? (y/n)\n> ")[0].lower() == "y":
-                    deleted_ids.append(entries[count].entry_ID)
-                    del (entries[count])
-                    count -= 1
-                    if count < 0:
-                        count = 0
+                    changes.delete(item)
+                    cursor.delete()
             except:
                 continue
         elif choice == "E":
+            cursor.keep()
             while True:
                 cls()
                 print("\nWhich field would you like to edit?")
-                print("[D]ate ({})".format(entries[count].get_readable_date()))
-                print("[T]ask Name ({})".format(entries[count].task_name))
-                print("[M]inutes Spent ({})".format(entries[count].mins_spent))
-                print("[N]otes ({})".format(entries[count].notes))
+                print("[D]ate ({})".format(item.get_readable_date()))
+                print("[T]ask Name ({})".format(item.task_name))
+                print("[M]inutes Spent ({})".format(item.mins_spent))
+                print("[N]otes ({})".format(item.notes))
                 print("[F]inished")
                 try:
                     read_input = input("> ")[0].upper()
@@ -629,8 +892,9 @@ def display_list(entries):
                     while True:
                         new_task_name = input("New name: (Cannot be blank)\n> ")
                         if new_task_name != "":
-                            entries[count].task_name = new_task_name
+                            item.task_name = new_task_name.title()
                             break
+                    changes.edit(item)
                 elif read_input == "M":
                     while True:
                         try:
@@ -638,58 +902,432 @@ def display_list(entries):
                         except:
                             continue
                         if new_mins > 0:
-                            entries[count].mins_spent = new_mins
+                            item.mins_spent = new_mins
                             break
+                    changes.edit(item)
                 elif read_input == "N":
                     while True:
                         try:
-                            new_notes = edit_text(entries[count].notes)
+                            new_notes = edit_text(item.notes)
                             if new_notes != "":
-                                entries[count].notes = new_notes
+                                item.notes = new_notes
                                 break
                             elif input("It's blank? y/n\n> ")[0].upper() == "Y":
-                                entries[count].notes = ""
+                                item.notes = ""
                                 break
                         except:
                             continue
+                    changes.edit(item)
                 elif read_input == "D":
                     while True:
                         new_date = input("New date (MM/DD/YYYY)\n> ")
+                        parsed_date = None
                         if re.match(r'\d{2}/\d{2}/\d{4}', new_date) is not None:
-                            entries[count].entry_date = "{}/{}/{}".format(
-                                str(new_date[0:2]),
-                                str(new_date[3:5]),
-                                str(new_date[8:10]))
+                            parsed_date = parse_date(new_date)
+                        if parsed_date is not None:
+                            item.entry_date = format_entry_date(
+                                parsed_date)
                             break
                         else:
                             input("[Press Enter] format date in MM/DD/YYYY")
+                    changes.edit(item)
                 elif read_input == "F":
                     break
                 else:
                     input("[Press Enter] and then please type T, M, N, or C")
         else:
-            input("[Press Enter] and then please type P, N, D, E, or B")
-    return entries, deleted_ids
+            input("[Press Enter] and then please type P, N, J, D, E, or B")
+    return changes
+
+
+def command_date(text):
+    """Reads an MM/DD/YYYY date given on the command line."""
+    parsed = parse_date(text)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(
+            "{!r} is not a date in MM/DD/YYYY format".format(text))
+    return parsed
+
+
+def command_regex(text):
+    """Compiles a regex given on the command line."""
+    try:
+        return compile_regex(text)
+    except re.error as error:
+        raise argparse.ArgumentTypeError(
+            "{!r} is not a valid regex ({})".format(text, error))
+
+
+def command_count(text):
+    """Reads a whole number of at least 1 given on the command line."""
+    try:
+        number = int(text)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "{!r} is not a whole number of at least 1".format(text))
+    return number
+
+
+def command_limit(text):
+    """Reads a whole number of 0 or more given on the command line."""
+    try:
+        number = int(text)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(
+            "{!r} is not a whole number of 0 or more".format(text))
+    return number
+
+
+def command_query(text):
+    """Compiles a query given on the command line."""
+    try:
+        return compile_query(text)
+    except QueryError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def build_parser():
+    """Builds the parser for running the worklog without the menus."""
+    parser = argparse.ArgumentParser(
+        description="Command-line Worklog program. Run without a command "
+                    "to use the menus.")
+    parser.add_argument("--file",
+                        default=os.environ.get("WORKLOG_FILE", "tasklog.csv"),
+                        help="the tasklog to use, a CSV file, a .db SQLite "
+                             "database, or a folder of monthly CSV files "
+                             "(default: $WORKLOG_FILE, or tasklog.csv)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time, rows and peak memory of each "
+                             "stage when done (see profiling.py; also "
+                             "turned on by $WORKLOG_PROFILE)")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="also run cProfile, and write its stats to FILE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a new entry")
+    add.add_argument("--task", required=True, help="the task name")
+    add.add_argument("--minutes", required=True, type=int,
+                     help="the minutes spent")
+    add.add_argument("--notes", default="", help="any additional notes")
+    add.add_argument("--date", type=command_date,
+                     help="the entry date, MM/DD/YYYY (default: today)")
+
+    search = commands.add_parser(
+        "search", help="print the entries matching every filter given")
+    search.add_argument("--date-range", nargs=2, type=command_date,
+                        metavar=("START", "END"),
+                        help="dates between START and END (MM/DD/YYYY)")
+    search.add_argument("--regex", type=command_regex,
+                        help="a regex to find in the task name or notes")
+    search.add_argument("--string",
+                        help="a phrase to find in the task name or notes")
+    search.add_argument("--minutes", nargs="+", type=int,
+                        metavar=("LOW", "HIGH"),
+                        help="minutes spent, exactly LOW or LOW to HIGH")
+    search.add_argument("--query", type=command_query,
+                        help='a query, like \'date:02/01/2017..02/28/2017 '
+                             'task:"accounts payable" mins:>=20 '
+                             'notes:/invoice/\'')
+    search.add_argument("--workers", type=int, default=1,
+                        help="search with this many processes (loads the "
+                             "whole tasklog first; default: 1)")
+    search.add_argument("--limit", type=command_limit,
+                        help="stop after this many matching entries")
+    search.add_argument("--json", action="store_true",
+                        help="print JSON lines instead of CSV")
+
+    report = commands.add_parser(
+        "report", help="print the entries and minutes worked for each "
+                       "period or task")
+    report.add_argument("--by", choices=PERIODS, default="day",
+                        help="how to group the totals (default: day)")
+    report.add_argument("--json", action="store_true",
+                        help="print JSON lines instead of CSV")
+
+    backup = commands.add_parser(
+        "backup", help="save an incremental snapshot of the tasklog")
+    backup.add_argument("--dir", default=BACKUP_DIR,
+                        help="where to keep snapshots (default: {})".format(
+                            BACKUP_DIR))
+    backup.add_argument("--keep", type=command_count, default=KEEP_SNAPSHOTS,
+                        help="how many snapshots to keep (default: "
+                             "{})".format(KEEP_SNAPSHOTS))
+    backup.add_argument("--output",
+                        help="write a full copy to this CSV file instead of "
+                             "taking a snapshot")
+
+    restore = commands.add_parser(
+        "restore", help="replace the tasklog with a snapshot")
+    restore.add_argument("snapshot", nargs="?",
+                         help="the snapshot to restore (default: the newest)")
+    restore.add_argument("--dir", default=BACKUP_DIR,
+                         help="where snapshots are kept (default: {})".format(
+                             BACKUP_DIR))
+    restore.add_argument("--list", action="store_true",
+                         help="list the snapshots instead")
+
+    migrate = commands.add_parser(
+        "migrate", help="copy every entry into another tasklog, such as a "
+                        "new SQLite database")
+    migrate.add_argument("destination",
+                         help="the tasklog to create or overwrite")
+
+    timer = commands.add_parser(
+        "timer", help="start, stop, or list timers. Stopping one adds an "
+                      "entry for the time it ran.")
+    timer.add_argument("action", choices=("start", "stop", "list"))
+    timer.add_argument("task", nargs="?", default="",
+                       help="the task the timer is for")
+    timer.add_argument("--unnamed", action="store_true",
+                       help="stop the unnamed timer (like one started from "
+                            "the menu without a task name), and log it "
+                            "under the task")
+    timer.add_argument("--notes", default="",
+                       help="notes for the entry added when the timer stops")
+    timer.add_argument("--json", action="store_true",
+                       help="list the timers as JSON lines instead of CSV")
+
+    analytics = commands.add_parser(
+        "analytics", help="print totals, a histogram of task durations, or "
+                          "rolling averages (faster with NumPy installed)")
+    view = analytics.add_mutually_exclusive_group()
+    view.add_argument("--by", choices=PERIODS, default="month",
+                      help="total the entries and minutes for each period "
+                           "(the default, by month)")
+    view.add_argument("--histogram", action="store_true",
+                      help="count the entries by how many minutes they took")
+    view.add_argument("--rolling", type=int, metavar="DAYS",
+                      help="average the minutes worked per day over DAYS")
+    analytics.add_argument("--json", action="store_true",
+                           help="print JSON lines instead of CSV")
+
+    importer = commands.add_parser(
+        "import", help="add the entries from a CSV, JSON lines, or JSON "
+                       "array file, skipping invalid rows and entries "
+                       "already logged")
+    importer.add_argument("source", help="the file to import")
+    importer.add_argument("--format", choices=("csv", "jsonl", "json"),
+                          help="the file's format (default: by extension, "
+                               "with .jsonl and .ndjson read as JSON lines, "
+                               "and .json as an array or JSON lines)")
+    importer.add_argument("--dry-run", action="store_true",
+                          help="check the file without adding anything")
+
+    server = commands.add_parser(
+        "serve", help="serve the tasklog over a local HTTP/JSON API")
+    server.add_argument("--host", default=HOST,
+                        help="the address to listen on (default: {})".format(
+                            HOST))
+    server.add_argument("--port", type=int, default=PORT,
+                        help="the port to listen on (default: {})".format(
+                            PORT))
+    return parser
+
+
+def write_rows(rows, fieldnames, as_json=False, output=None):
+    """Prints rows (dicts) one at a time as CSV or as JSON lines.
+
+    :param output: the file to write to, or None for sys.stdout.
+    """
+    if output is None:
+        output = sys.stdout
+    if as_json:
+        for row in rows:
+            output.write(json.dumps(row) + "\n")
+    else:
+        csvwriter = csv.DictWriter(output, fieldnames=fieldnames,
+                                   lineterminator="\n")
+        csvwriter.writeheader()
+        for row in rows:
+            csvwriter.writerow(row)
+
+
+def run_command(argv):
+    """Runs a single command without any of the menus.
+
+    :param argv: the command-line arguments, without the program name.
+
+    :return: the exit status.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile or args.profile_output:
+        enable(args.profile_output)
+
+    if args.command == "add":
+        if args.minutes < 1:
+            parser.error("--minutes must be greater than 0")
+        entry_date = args.date or date.today()
+        open_backend(args.file).append(Entry(0, format_entry_date(entry_date),
+                                             args.task, args.minutes,
+                                             args.notes))
+    elif args.command == "search":
+        matchers = []
+        backend = open_backend(args.file)
+        if args.minutes and len(args.minutes) > 2:
+            parser.error("--minutes takes LOW or LOW HIGH")
+        if args.date_range:
+            # Only the part of the tasklog in the range is read, where the
+            # backend can pick it out
+            entries = backend.stream_between(*args.date_range)
+        else:
+            entries = backend.stream()
+        if args.minutes:
+            matchers.append(minutes_matcher(args.minutes[0],
+                                            args.minutes[-1]))
+        # Reading the stream is timed apart from the tests and the output
+        entries = stream_stage("stream", entries)
+        if args.string:
+            matchers.append(phrase_matcher(args.string))
+        if args.regex:
+            matchers.append(text_matcher(args.regex))
+        if args.query:
+            matchers.append(args.query.matcher())
+        if args.workers > 1:
+            filtered = islice(parallel_filter(
+                lambda item: all(matcher(item) for matcher in matchers),
+                list(entries), args.workers), args.limit)
+        else:
+            # The tasklog is streamed, so even a huge one uses little memory
+            filtered = filter_entries(entries, matchers, args.limit)
+        with stage("filter: command") as timing:
+            write_rows((entry_row(item) for item in filtered), FIELDNAMES,
+                       args.json)
+            timing.rows = getattr(entries, "rows", None)
+    elif args.command == "report":
+        summary = Summary(open_backend(args.file).stream())
+        write_rows(summary.rows(args.by),
+                   ["period", "entries", "minutes", "worked"], args.json)
+    elif args.command == "backup":
+        if args.output:
+            write_entries(args.output, open_backend(args.file).stream())
+        else:
+            backend = open_backend(args.file)
+            snapshots = SnapshotStore(args.dir)
+            with backend.lock(shared=True):
+                manifest = snapshots.create(backend.stream(),
+                                            backend.snapshot_chunks())
+            snapshots.prune(args.keep)
+            print(manifest["name"])
+    elif args.command == "restore":
+        snapshots = SnapshotStore(args.dir)
+        names = snapshots.names()
+        if args.list:
+            write_rows(({key: snapshots.manifest(name)[key]
+                         for key in ("name", "created", "entries")}
+                        for name in names),
+                       ["name", "created", "entries"])
+            return 0
+        if not names:
+            parser.error("there are no snapshots in {}".format(args.dir))
+        name = args.snapshot or names[-1]
+        if name not in names:
+            parser.error("there is no snapshot named {!r}".format(name))
+        snapshots.restore(name, EntryStore(args.file))
+    elif args.command == "migrate":
+        open_backend(args.destination).save(open_backend(args.file).stream())
+    elif args.command == "timer":
+        markers = MarkerStore()
+        if args.action == "start":
+            markers.start(args.task)
+        elif args.action == "list":
+            write_rows(({"task": name,
+                         "started": started.isoformat(timespec="seconds"),
+                         "minutes": elapsed_minutes(started)}
+                        for name, started in markers.timers().items()),
+                       ["task", "started", "minutes"], args.json)
+        else:
+            if not args.task.strip():
+                parser.error("timer stop needs the task name for the entry")
+            name = "" if args.unnamed else timer_name(args.task)
+            started = markers.timers().get(name)
+            mins = markers.stop(name) if started is not None else None
+            if mins is None:
+                if args.unnamed:
+                    print("No unnamed timer is running.", file=sys.stderr)
+                else:
+                    print("No timer is running for {}.".format(name),
+                          file=sys.stderr)
+                return 1
+            mins = max(mins, 1)
+            notes = "({} - {}) {}".format(
+                started.strftime("%I:%M%p"),
+                (started + timedelta(minutes=mins)).strftime("%I:%M%p"),
+                args.notes).rstrip()
+            open_backend(args.file).append(Entry(
+                0, format_entry_date(date.today()), args.task, mins, notes))
+    elif args.command == "analytics":
+        results = Analytics(open_backend(args.file).load())
+        if args.histogram:
+            write_rows(results.duration_histogram(), ["minutes", "entries"],
+                       args.json)
+        elif args.rolling:
+            if args.rolling < 1:
+                parser.error("--rolling must be at least 1")
+            write_rows(results.rolling_average(args.rolling),
+                       ["date", "minutes", "average"], args.json)
+        else:
+            write_rows(results.period_rows(args.by),
+                       ["period", "entries", "minutes", "worked"], args.json)
+    elif args.command == "import":
+        try:
+            result = import_entries(open_backend(args.file),
+                                    read_records(args.source, args.format),
+                                    args.dry_run)
+        except json.JSONDecodeError as error:
+            print("{} isn't valid JSON ({})".format(args.source, error),
+                  file=sys.stderr)
+            return 1
+        for error in result.errors:
+            print(error, file=sys.stderr)
+        if result.invalid > len(result.errors):
+            print("... and {} more invalid rows".format(
+                result.invalid - len(result.errors)), file=sys.stderr)
+        print("{} {} of {} rows ({} duplicates, {} invalid)".format(
+            "Would import" if args.dry_run else "Imported", result.added,
+            result.read, result.duplicates, result.invalid))
+        if result.invalid:
+            return 1
+    elif args.command == "serve":
+        serve(args.file, args.host, args.port)
+    return 0
 
 
 if __name__ == "__main__":
 
+    enable_from_env()
+    if len(sys.argv) > 1:
+        try:
+            sys.exit(run_command(sys.argv[1:]))
+        except BrokenPipeError:
+            # The output was piped into something like head, which stopped
+            # reading. stdout is pointed at devnull so Python doesn't
+            # complain again when it's flushed on the way out.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+
+    store = EntryStore(os.environ.get("WORKLOG_FILE", "tasklog.csv"))
+    markers = MarkerStore()
     while True:
         cls()
         marker = ""
-        if os.path.exists("time_marker.txt"):
-            with open("time_marker.txt", "r") as file:
-                marker = "\n   -Currently set to: " + file.read()
+        for name, started in markers.timers().items():
+            marker += "\n   -" + marker_label(name, started)
 
         print("--------------------------------")
         print("|  Project Tracklog Main Menu  |")
         print("--------------------------------")
         print("[N]ew entry")
-        print("[M]arker (Logs the current time){}".format(
+        print("[M]arker (Starts a timer for a task){}".format(
             marker
         ))
         print("[B]rowse entries")
         print("[S]earch entries")
+        print("[R]eport of time worked")
         print("[C]reate backup")
         print("[L]oad backup")
         print("[Q]uit the program")
@@ -699,36 +1337,42 @@ if __name__ == "__main__":
         except:
             continue
         if read_input == "N":
-            save_list = load_csv()
-            count = len(save_list) + 1
-            save_list.append(new_entry(count))
-            save_csv(save_list)
+            store.add(new_entry(store.next_id(), markers))
         elif read_input == "M":
-            new_time_marker()
+            new_time_marker(markers)
         elif read_input == "B":
-            save_list = load_csv()
-            if len(save_list):
-                save_list, ignore_list = display_list(save_list)
-                save_csv(save_list)
+            # The tasklog is only read as far as the user browses, unless
+            # it's already loaded. Pages the user has browsed away from are
+            # dropped, and read again from the file if they go back.
+            stamp, entries = store.stream()
+            cursor = EntryCursor(
+                entries, reopen=lambda: store.backend.open_stream()[1])
+            if not cursor.is_empty():
+                save_changes(store, display_list(cursor), stamp)
             else:
                 input("There are no entries to display. [Press Enter]")
         elif read_input == "S":
-            save_list = load_csv()
-            if len(save_list):
-                save_list = search_menu(save_list)
+            if len(store.refresh()):
+                search_menu(store)
+            else:
+                input("There are no entries to display. [Press Enter]")
+        elif read_input == "R":
+            if len(store.refresh()):
+                report_menu(store)
             else:
                 input("There are no entries to display. [Press Enter]")
         elif read_input == "C":
-            save_list = load_csv()
+            save_list = store.refresh()
             if len(save_list):
-                backup_csv(save_list)
+                backup_csv(save_list, store.backend)
             else:
                 input("[Press Enter] Cannot save a blank tasklog.")
         elif read_input == "L":
-            load_backup(load_csv())
+            load_backup(store)
         elif read_input == "Q":
             cls()
             print("Exiting program.")
             exit()
         else:
-            input("[Press Enter] and then please type N, M, B, S, C, L, or Q")
+            input("[Press Enter] and then please type N, M, B, S, R, C, L, "
+                  "or Q")